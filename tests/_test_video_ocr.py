@@ -1,13 +1,10 @@
+# downloads a video from youtube, so it is not collected by default
 from pathlib import Path
 
 from click.testing import CliRunner
 
-from video_ocr import config
 from video_ocr.cli import cli
-from video_ocr.execute import (
-    func_to_frames_if_not_exists,
-    run_ocr_if_not_exists,
-)
+from video_ocr.execute import BatchRunner
 from video_ocr.video import Video
 
 
@@ -19,21 +16,18 @@ def test_version():
         assert result.output.startswith("cli, version ")
 
 
-def set_data_dir():
-    config.DATA_DIR = Path(__file__).parent / "data_dir"
-
-
-def test_run_ocr_sync():
+def test_run_ocr_batch():
     runner = CliRunner()
     with runner.isolated_filesystem() as td:
-        video_ids = ["_nmWquZTOMI"]
-        config.DATA_DIR = Path(td)
-
-        func_to_frames_if_not_exists(load=False)(video_ids[0])
-        run_ocr_if_not_exists(video_ids[0])
+        video_id = "_nmWquZTOMI"
+        video = Video(
+            output_file=Path(td) / video_id / "video.json",
+            video_file=Path(td) / f"{video_id}.mp4",
+        )
+        video.download_video(video_id)
 
-        video = Video.from_json(video_ids[0])
+        [video] = BatchRunner(backend=video.backend, workers=2).run([video])
+        video.to_json()
 
-        assert video.video_id == "_nmWquZTOMI"
         results = [frame.results for frame in video.frames]
         assert any(results)
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import pytest
+
+from video_ocr.bench import make_synthetic_video
+
+
+@pytest.fixture
+def synthetic_video(tmp_path) -> Path:
+    """3 seconds of 30fps video showing the current second as text"""
+    return make_synthetic_video(
+        tmp_path / "synthetic.mp4",
+        seconds=3,
+        fps=30,
+        width=320,
+        height=240,
+        scene_seconds=1,
+        texts=["0", "1", "2"],
+    )
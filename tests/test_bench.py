@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.bench import (
+    TRANSPORTS,
+    bench_decode,
+    bench_dedup,
+    bench_ocr,
+    bench_sampling,
+    bench_serialization,
+    bench_transport,
+    make_synthetic_video,
+    measure_observation_bytes,
+)
+from video_ocr.cli import cli
+from video_ocr.manifest import package_version
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def bench_video(tmp_path_factory):
+    path = tmp_path_factory.mktemp("bench") / "bench.mp4"
+    return make_synthetic_video(path, seconds=4)
+
+
+@pytest.fixture(scope="module")
+def sampled_images(bench_video):
+    _, images = bench_sampling(bench_video, step=10)
+    return images
+
+
+def test_decode(benchmark, bench_video):
+    result = benchmark.pedantic(bench_decode, args=(bench_video,), rounds=3)
+    assert result.frames == 120
+
+
+@pytest.mark.parametrize("strategy", ["grab", "seek"])
+def test_sampling(benchmark, bench_video, strategy):
+    result, images = benchmark.pedantic(
+        bench_sampling, args=(bench_video, 10, strategy), rounds=3
+    )
+    assert len(images) == 12
+
+
+def test_dedup(benchmark, sampled_images):
+    _, skip_ratio = benchmark(bench_dedup, sampled_images)
+    # text changes every 2 seconds
+    assert skip_ratio == pytest.approx(10 / 12)
+
+
+def test_ocr_stub(benchmark, sampled_images):
+    _, frames = benchmark(bench_ocr, sampled_images, "stub")
+    assert all(frame.results for frame in frames)
+
+
+def test_serialization(benchmark, sampled_images):
+    _, frames = bench_ocr(sampled_images, "stub")
+    result = benchmark(bench_serialization, frames)
+    assert result.frames == 12
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_transport(benchmark, sampled_images, transport):
+    result = benchmark.pedantic(
+        bench_transport, args=(sampled_images, transport), kwargs={"rounds": 1}
+    )
+    assert result.frames == 12
+
+
+def test_observation_bytes():
+    # an OCRResult with a __dict__ takes about 280 bytes
+    assert measure_observation_bytes() < 220
+
+
+def test_bench_command(tmp_path):
+    output = tmp_path / "bench.json"
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "bench",
+            "--seconds",
+            "1",
+            "--width",
+            "320",
+            "--height",
+            "240",
+            "-o",
+            str(output),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    results = json.loads(output.read_text())
+    # decode_pyav is only run if PyAV is installed
+    assert set(results["stages"]) - {"decode_pyav"} == {
+        "decode",
+        "sampling",
+        "dedup",
+        "ocr",
+        "ocr_auto_roi",
+        "ocr_per_call",
+        "serialization",
+    }
+    assert set(results["ocr_batch_sizes"]) == {"1", "4", "16"}
+    assert results["stages"]["decode"]["frames"] == 30
+    assert results["stages"]["ocr"]["fps"] > 0
+    assert set(results["transport"]) == set(TRANSPORTS)
+    assert results["environment"]["video-ocr"] == package_version()
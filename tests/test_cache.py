@@ -0,0 +1,100 @@
+import numpy as np
+
+from video_ocr.cache import OCRCache, frame_key
+from video_ocr.ocr import OCRResult, get_backend
+from video_ocr.video import Video
+
+
+class CountingBackend:
+    def __init__(self, version=""):
+        self.backend = get_backend("stub")
+        self.version = version
+        self.calls = 0
+
+    def settings_key(self):
+        return self.backend.settings_key()
+
+    def engine_version(self):
+        return self.version
+
+    def detect_batch(self, images):
+        self.calls += len(images)
+        return self.backend.detect_batch(images)
+
+
+def image(value):
+    image = np.zeros((32, 32, 3), np.uint8)
+    image[8:16, 8:24] = value
+    return image
+
+
+def test_cache_hit_and_miss(tmp_path):
+    cache = OCRCache(tmp_path / "cache.sqlite")
+    engine = CountingBackend()
+
+    first = cache.detect_batch(engine, [image(255), image(128)])
+    second = cache.detect_batch(engine, [image(128), image(255), image(200)])
+
+    assert second[:2] == first[::-1]
+    assert engine.calls == 3
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_cache_key_includes_engine_version(tmp_path):
+    cache = OCRCache(tmp_path / "cache.sqlite")
+    cache.detect_batch(CountingBackend("5.3.0"), [image(255)])
+
+    upgraded = CountingBackend("5.4.0")
+    cache.detect_batch(upgraded, [image(255)])
+    assert upgraded.calls == 1
+
+
+def test_cache_key_includes_settings(tmp_path):
+    cache = OCRCache(tmp_path / "cache.sqlite")
+    result = [OCRResult(text="a", confidence=1.0, bbox=(0.0, 0.0, 1.0, 1.0))]
+
+    cache.put_many([(frame_key(image(255), "stub:accurate:ja:None"), result)])
+    assert cache.get_many([frame_key(image(255), "stub:accurate:ja:None")]) == [result]
+    assert cache.get_many([frame_key(image(255), "stub:fast:ja:None")]) == [None]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    result = [OCRResult(text="a" * 100, confidence=1.0, bbox=(0.0, 0.0, 1.0, 1.0))]
+    cache = OCRCache(tmp_path / "cache.sqlite", max_bytes=350)
+
+    cache.put_many([("old", result), ("new", result)])
+    cache.get_many(["old"])  # makes "new" the least recently used
+    cache.put_many([("newest", result)])
+
+    assert cache.size() <= 350
+    assert cache.get_many(["old", "new", "newest"]) == [result, None, result]
+
+
+def test_cache_counts_stored_bytes(tmp_path):
+    result = [OCRResult(text="a" * 100, confidence=1.0, bbox=(0.0, 0.0, 1.0, 1.0))]
+    cache = OCRCache(tmp_path / "cache.sqlite", max_bytes=350)
+
+    cache.put_many([("a", result), ("b", result)])
+    assert cache.stored == cache.size()
+    # replaced results are not counted twice
+    cache.put_many([("a", []), ("b", result)])
+    assert cache.stored == cache.size()
+    cache.put_many([("c", result), ("d", result)])
+    assert cache.stored == cache.size() <= 350
+    cache.close()
+
+    assert OCRCache(tmp_path / "cache.sqlite").stored == cache.stored
+
+
+def test_run_ocr_with_cache(synthetic_video, tmp_path):
+    cache = OCRCache(tmp_path / "cache.sqlite")
+    expected = Video(video_file=synthetic_video, frame_rate=15, backend="stub").run_ocr(
+        cache=cache
+    )
+
+    frames = Video(video_file=synthetic_video, frame_rate=15, backend="stub").run_ocr(
+        cache=cache
+    )
+
+    assert frames == expected
+    assert cache.hits == len(frames)
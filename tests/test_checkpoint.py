@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from video_ocr.backends.stub import StubBackend
+from video_ocr.ocr import get_backend, register_backend
+from video_ocr.video import Video
+
+
+class CrashingBackend(StubBackend):
+    """stub backend that crashes after `limit` frames"""
+
+    name = "crashing"
+    limit = 3
+    calls = 0
+
+    def detect(self, image):
+        CrashingBackend.calls += 1
+        if CrashingBackend.calls > self.limit:
+            raise RuntimeError("out of memory")
+        return super().detect(image)
+
+
+register_backend("crashing", CrashingBackend)
+
+
+def make_video(video_file, output_file, backend="crashing"):
+    return Video(
+        output_file=output_file,
+        video_file=video_file,
+        frame_rate=10,
+        backend=backend,
+    )
+
+
+def test_resume_after_crash(synthetic_video, tmp_path):
+    expected = Video(video_file=synthetic_video, frame_rate=10, backend="stub")
+    expected.run_ocr()
+
+    output_file = tmp_path / "video.json"
+    CrashingBackend.calls = 0
+    with pytest.raises(RuntimeError):
+        make_video(synthetic_video, output_file).run_ocr(batch_size=1)
+
+    # frames done before the crash are kept
+    lines = (tmp_path / "video.jsonl").read_text().splitlines()
+    assert len(lines) == 1 + CrashingBackend.limit
+
+    CrashingBackend.calls = -100
+    video = make_video(synthetic_video, output_file)
+    frames = video.run_ocr(batch_size=1)
+
+    assert CrashingBackend.calls == -100 + 9 - CrashingBackend.limit
+    assert frames == expected.frames
+
+    video.to_json()
+    loaded = Video.from_json(output_file)
+    assert loaded.frames == expected.frames
+    assert loaded.backend == "crashing"
+
+
+def test_stop_before_batch_and_resume(synthetic_video, tmp_path):
+    expected = Video(video_file=synthetic_video, frame_rate=10, backend="stub")
+    expected.run_ocr()
+
+    output_file = tmp_path / "video.json"
+    batches = []
+
+    def stop_after_two_batches():
+        if len(batches) == 2:
+            raise KeyboardInterrupt
+        batches.append(None)
+
+    CrashingBackend.calls = -100
+    with pytest.raises(KeyboardInterrupt):
+        make_video(synthetic_video, output_file).run_ocr(
+            batch_size=2, before_batch=stop_after_two_batches
+        )
+    lines = (tmp_path / "video.jsonl").read_text().splitlines()
+    assert len(lines) == 1 + 4
+    assert CrashingBackend.calls == -100 + 4
+
+    # the engine given runs ocr instead of a backend of the video
+    frames = make_video(synthetic_video, output_file).run_ocr(
+        batch_size=2, engine=get_backend("stub", languages=["ja"])
+    )
+    assert CrashingBackend.calls == -100 + 4
+    assert frames == expected.frames
+
+
+def test_checkpoint_drops_cut_off_line(synthetic_video, tmp_path):
+    video = make_video(synthetic_video, tmp_path / "video.json", backend="stub")
+    video.run_ocr()
+
+    checkpoint = tmp_path / "video.jsonl"
+    lines = checkpoint.read_text().splitlines(keepends=True)
+    checkpoint.write_text("".join(lines[:-1]) + lines[-1][:10])
+
+    video = make_video(synthetic_video, tmp_path / "video.json", backend="stub")
+    assert video.open_checkpoint("ja") == {index for index in range(0, 80, 10)}
+    video.checkpoint.close()
+    assert checkpoint.read_text() == "".join(lines[:-1])
+
+
+@pytest.mark.parametrize("corrupt", ["{not json\n", '{"frame": 1}\n', "[]\n"])
+def test_checkpoint_drops_corrupt_line(synthetic_video, tmp_path, corrupt):
+    video = make_video(synthetic_video, tmp_path / "video.json", backend="stub")
+    video.run_ocr()
+
+    checkpoint = tmp_path / "video.jsonl"
+    lines = checkpoint.read_text().splitlines(keepends=True)
+    checkpoint.write_text("".join(lines[:4]) + corrupt + "".join(lines[5:]))
+
+    video = make_video(synthetic_video, tmp_path / "video.json", backend="stub")
+    assert video.open_checkpoint("ja") == {0, 10, 20}
+    video.checkpoint.close()
+    assert checkpoint.read_text() == "".join(lines[:4])
+
+    # the frames dropped run again
+    video = make_video(synthetic_video, tmp_path / "video.json", backend="stub")
+    video.run_ocr()
+    assert checkpoint.read_text() == "".join(lines)
+
+
+def test_checkpoint_starts_over_when_settings_change(synthetic_video, tmp_path):
+    video = make_video(synthetic_video, tmp_path / "video.json", backend="stub")
+    video.run_ocr()
+
+    video.frame_rate = 30
+    assert video.open_checkpoint("ja") == set()
+    video.checkpoint.close()
+
+    header = json.loads((tmp_path / "video.jsonl").read_text().splitlines()[0])
+    assert header["settings"]["frame_rate"] == 30
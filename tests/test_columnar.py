@@ -0,0 +1,55 @@
+import pytest
+
+from video_ocr.ocr import OCRResult
+from video_ocr.video import Frame, Video
+
+pytest.importorskip("pyarrow")
+
+from video_ocr.columnar import iter_frames, read_parquet, write_parquet  # noqa: E402
+
+
+def make_frames(n: int):
+    return [
+        Frame(
+            index=i,
+            timestamp=i / 10,
+            results=[
+                OCRResult(text=f"{i}-{j}", confidence=0.5, bbox=(0.0, 0.25, 0.5, 0.75))
+                for j in range(i % 3)
+            ],
+        )
+        for i in range(n)
+    ]
+
+
+def test_parquet_round_trip(tmp_path):
+    frames = make_frames(100)
+    path = tmp_path / "video.parquet"
+
+    # small row groups, so frames are split over many of them
+    rows = write_parquet(frames, path, row_group_size=7)
+    assert rows == sum(len(frame.results) for frame in frames)
+
+    table = read_parquet(path, columns=["frame_index", "text"])
+    assert table.column_names == ["frame_index", "text"]
+    assert table.num_rows == rows
+
+    assert list(iter_frames(path)) == [frame for frame in frames if frame.results]
+
+
+def test_run_ocr_to_parquet(synthetic_video, tmp_path):
+    video = Video(
+        output_file=tmp_path / "video.json",
+        video_file=synthetic_video,
+        frame_rate=15,
+        backend="stub",
+    )
+    frames = video.run_ocr()
+    path = video.to_parquet()
+
+    assert path == tmp_path / "video.parquet"
+    table = read_parquet(path)
+    assert table.column("frame_index").to_pylist() == [frame.index for frame in frames]
+    assert table.column("text").to_pylist() == [
+        frame.results[0].text for frame in frames
+    ]
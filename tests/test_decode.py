@@ -0,0 +1,84 @@
+import importlib.util
+
+import numpy as np
+import pytest
+
+from video_ocr.decode import open_video
+from video_ocr.sampling import FrameSampler
+
+DECODERS = [
+    "cv2",
+    pytest.param(
+        "pyav",
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec("av") is None, reason="PyAV is not installed"
+        ),
+    ),
+]
+
+
+def read_all(video_file, decoder, **kwargs):
+    vid = open_video(video_file, decoder, **kwargs)
+    frames = []
+    while vid.grab():
+        frames.append((vid.timestamp(), vid.retrieve()))
+    vid.release()
+    return frames
+
+
+@pytest.mark.parametrize("decoder", DECODERS)
+def test_decoders_read_every_frame(synthetic_video, decoder):
+    frames = read_all(synthetic_video, decoder)
+
+    assert len(frames) == 90
+    assert [timestamp for timestamp, _ in frames[:3]] == pytest.approx(
+        [0, 1 / 30, 2 / 30]
+    )
+    assert frames[0][1].shape == (240, 320, 3)
+
+
+@pytest.mark.parametrize("decoder", DECODERS)
+def test_decode_to_gray_and_lower_resolution(synthetic_video, decoder):
+    (_, image), *_ = read_all(synthetic_video, decoder, gray=True, width=160)
+
+    assert image.shape == (120, 160)
+
+
+@pytest.mark.parametrize("strategy", ["grab", "seek"])
+def test_pyav_sampling_matches_cv2(synthetic_video, strategy):
+    pytest.importorskip("av")
+
+    expected = list(FrameSampler(synthetic_video, step=20, strategy=strategy))
+    frames = list(
+        FrameSampler(synthetic_video, step=20, strategy=strategy, decoder="pyav")
+    )
+
+    assert [f.index for f in frames] == [f.index for f in expected]
+    assert [f.timestamp for f in frames] == pytest.approx(
+        [f.timestamp for f in expected]
+    )
+    for frame, expected_frame in zip(frames, expected):
+        # color conversion of the decoders may differ slightly
+        assert np.abs(frame.image.astype(int) - expected_frame.image).mean() < 2
+
+
+def test_pyav_timestamps_of_variable_frame_rate(tmp_path):
+    av = pytest.importorskip("av")
+
+    path = tmp_path / "vfr.mp4"
+    pts = [0, 1, 2, 10, 11, 30]  # in 1/10 seconds
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream("mpeg4", rate=10)
+        stream.width, stream.height = 64, 48
+        for p in pts:
+            frame = av.VideoFrame.from_ndarray(
+                np.full((48, 64, 3), p * 8, np.uint8), format="bgr24"
+            ).reformat(format="yuv420p")
+            frame.pts = p
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+    timestamps = [timestamp for timestamp, _ in read_all(path, "pyav")]
+    assert timestamps == pytest.approx([p / 10 for p in pts])
@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+
+from video_ocr.dedup import FrameDeduplicator
+from video_ocr.video import Video
+
+
+def subtitle(text):
+    image = np.full((360, 640, 3), 40, np.uint8)
+    cv2.putText(
+        image, text, (20, 300), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2
+    )
+    return image
+
+
+def test_deduplicator():
+    deduplicator = FrameDeduplicator()
+    first = subtitle("Hello world this is a subtitle")
+    noisy = np.clip(
+        first.astype(np.int16) + np.random.randint(-8, 8, first.shape), 0, 255
+    ).astype(np.uint8)
+
+    assert not deduplicator.is_duplicate(first)
+    assert deduplicator.is_duplicate(noisy)
+    # a single changed character is not a duplicate
+    assert not deduplicator.is_duplicate(subtitle("Hello world this is a subtitlf"))
+
+    assert deduplicator.stats.frames == 3
+    assert deduplicator.stats.skip_ratio == 1 / 3
+
+
+def test_run_ocr_reuses_results_of_duplicates(synthetic_video):
+    video = Video(video_file=synthetic_video, frame_rate=5, backend="stub")
+    expected = video.run_ocr()
+
+    video = Video(
+        video_file=synthetic_video, frame_rate=5, backend="stub", dedup_threshold=2
+    )
+    frames = video.run_ocr(batch_size=4)
+
+    assert frames == expected
+    # the text changes once a second, so 3 of 18 frames need ocr
+    assert video.dedup_stats.skipped == 15
@@ -0,0 +1,78 @@
+import json
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.cli import cli
+from video_ocr.execute import BatchRunner
+from video_ocr.video import Video
+
+
+# frames pickled, sent through shared memory, and pickled as they do not fit a slot
+@pytest.mark.parametrize("slot_bytes", [None, 2**20, 2**16])
+def test_batch_runner_matches_run_ocr(synthetic_video, tmp_path, slot_bytes):
+    video_files = []
+    for i in range(3):
+        video_file = tmp_path / f"video-{i}.mp4"
+        shutil.copy(synthetic_video, video_file)
+        video_files.append(video_file)
+    video_files.insert(1, tmp_path / "missing.mp4")
+
+    expected = Video(
+        video_file=synthetic_video, frame_rate=10, backend="stub"
+    ).run_ocr()
+
+    runner = BatchRunner(
+        backend="stub", workers=2, chunk_size=2, max_in_flight=2, slot_bytes=slot_bytes
+    )
+    videos = runner.run(
+        Video(video_file=video_file, frame_rate=10, dedup_threshold=2)
+        for video_file in video_files
+    )
+
+    finished = list(videos)
+    # the missing video is skipped
+    assert [video.video_file for video in finished] == video_files[:1] + video_files[2:]
+    for video in finished:
+        assert video.backend == "stub"
+        assert video.frames == expected
+
+
+def test_batch_command(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "batch",
+            str(synthetic_video),
+            "-d",
+            str(tmp_path / "out"),
+            "--workers",
+            "2",
+            "--interval",
+            "1",
+            "--backend",
+            "stub",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    output = json.loads((tmp_path / "out" / "synthetic" / "video.json").read_text())
+    assert [frame["index"] for frame in output["frames"]] == [0, 30, 60]
+
+
+def test_batch_command_rejects_videos_of_the_same_name(synthetic_video, tmp_path):
+    other = tmp_path / "other" / synthetic_video.name
+    other.parent.mkdir()
+    shutil.copy(synthetic_video, other)
+
+    result = CliRunner().invoke(
+        cli,
+        ["batch", str(synthetic_video), str(other), "-d", str(tmp_path / "out")]
+        + ["--backend", "stub"],
+    )
+    assert result.exit_code == 2
+    assert "synthetic" in result.output
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,183 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from video_ocr.fetch import MAX_RESULTS, ConnectionPool, PageCache, PlaylistFetcher
+from video_ocr.playlist import Playlist
+
+PLAYLISTS = {"a": 120, "b": 30}  # items of each playlist
+
+
+class MockAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        self.server.requests.append(
+            (url.path, params, self.headers.get("If-None-Match"))
+        )
+        self.server.clients.add(self.client_address)
+
+        playlist_id = params["playlistId"]
+        if url.path != "/v3/playlistItems" or playlist_id not in PLAYLISTS:
+            self.send(404, {"error": {"message": "playlist not found"}})
+            return
+
+        size = min(int(params["maxResults"]), 50)
+        start = int(params.get("pageToken", 0))
+        end = min(start + size, PLAYLISTS[playlist_id])
+        page = {
+            "items": [
+                {"contentDetails": {"videoId": f"{playlist_id}{i}"}}
+                for i in range(start, end)
+            ]
+        }
+        if end < PLAYLISTS[playlist_id]:
+            page["nextPageToken"] = str(end)
+
+        etag = f'"{playlist_id}-{start}-{self.server.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send(304)
+        else:
+            self.send(200, page, etag)
+
+    def send(self, status, body=None, etag=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAPI)
+    server.requests = []
+    server.clients = set()
+    server.version = 1
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_fetcher(server, tmp_path):
+    fetchers = []
+
+    def make_fetcher(**kwargs):
+        fetcher = PlaylistFetcher(
+            api_key="key",
+            cache=PageCache(tmp_path / "cache.sqlite"),
+            base_url=f"http://127.0.0.1:{server.server_port}/v3",
+            **kwargs,
+        )
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield make_fetcher
+    for fetcher in fetchers:
+        fetcher.close()
+
+
+def video_ids(items):
+    return [item["contentDetails"]["videoId"] for item in items]
+
+
+def test_fetch_many_paginates(server, make_fetcher):
+    items = make_fetcher(connections=2).run(["a", "b"])
+
+    assert video_ids(items["a"]) == [f"a{i}" for i in range(120)]
+    assert video_ids(items["b"]) == [f"b{i}" for i in range(30)]
+    assert len(server.requests) == 4
+    assert all(p["maxResults"] == str(MAX_RESULTS) for _, p, _ in server.requests)
+    # requests reuse the pooled connections
+    assert len(server.clients) <= 2
+
+
+def test_cached_pages_are_used_and_revalidated(server, make_fetcher):
+    expected = make_fetcher().run(["a"])
+    server.requests.clear()
+
+    # fresh pages are not requested again
+    assert make_fetcher().run(["a"]) == expected
+    assert server.requests == []
+
+    # stale pages are revalidated by etag, and not sent again if unchanged
+    assert make_fetcher(ttl=0).run(["a"]) == expected
+    assert len(server.requests) == 3
+    assert all(etag for _, _, etag in server.requests)
+
+    # changed pages are sent again
+    server.version = 2
+    server.requests.clear()
+    assert make_fetcher().run(["a"], refresh=True) == expected
+    assert len(server.requests) == 3
+
+
+def test_failed_playlists(make_fetcher):
+    items = make_fetcher().run(["missing", "b"])
+
+    assert items["missing"] is None
+    assert len(items["b"]) == 30
+
+    playlists = Playlist.get_playlists(["missing", "b"], make_fetcher())
+    assert [p.playlist_id for p in playlists] == ["b"]
+    assert Playlist("missing").get_playlist(make_fetcher()) is None
+
+
+class DroppingServer(BaseHTTPRequestHandler):
+    """echoes request bodies, but drops the first connection without a response"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.requests == 1:
+            self.close_connection = True
+            return
+
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_POST = do_PUT = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.parametrize(
+    "method, retried", [("GET", True), ("PUT", True), ("POST", False)]
+)
+def test_only_idempotent_requests_are_retried(method, retried):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DroppingServer)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    pool = ConnectionPool(f"http://127.0.0.1:{server.server_port}")
+    try:
+        if retried:
+            response = pool.request(method, "/", {}, {}, b"body")
+            assert (response.status, response.body) == (200, b"body")
+            assert server.requests == 2
+        else:
+            with pytest.raises(OSError):
+                pool.request(method, "/", {}, {}, b"body")
+            assert server.requests == 1
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY = {"cv2", "numpy", "serde", "pytube", "pyarrow", "av", "Vision"}
+
+# the cli starts in tens of milliseconds, with headroom for slow machines
+CLI_BUDGET_US = 150_000
+
+
+def import_times(module):
+    """cumulative microseconds of each module imported by a fresh interpreter"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_imports_no_heavy_dependencies():
+    times = import_times("video_ocr.cli")
+
+    assert not HEAVY & set(times)
+    assert times["video_ocr.cli"] < CLI_BUDGET_US
+
+
+@pytest.mark.parametrize("module", ["video_ocr.worker", "video_ocr.parallel"])
+def test_worker_modules_import_no_pipeline(module):
+    times = import_times(module)
+
+    assert not {"serde", "pytube", "video_ocr.video", "video_ocr.cache"} & set(times)
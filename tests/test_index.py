@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.cli import cli
+from video_ocr.index import TRIGRAM_VERSION, SearchIndex
+from video_ocr.ocr import OCRResult
+from video_ocr.video import Frame, Video
+
+BBOX = (0.1, 0.1, 0.8, 0.1)
+
+
+def write_video(path, texts):
+    """video.json with one text per second, each shown for 2 frames"""
+    frames = [
+        Frame(
+            index=i,
+            timestamp=i * 0.5,
+            results=[OCRResult(text=texts[i // 2], confidence=1.0, bbox=BBOX)],
+        )
+        for i in range(2 * len(texts))
+    ]
+    return Video(output_file=path, frames=frames, backend="stub").to_json()
+
+
+@pytest.mark.parametrize("sqlite_version", [sqlite3.sqlite_version_info, (3, 31, 1)])
+def test_search(tmp_path, monkeypatch, sqlite_version):
+    if sqlite_version < TRIGRAM_VERSION:
+        monkeypatch.setattr(sqlite3, "sqlite_version_info", sqlite_version)
+    a = write_video(tmp_path / "a" / "video.json", ["東京タワーへ行く", "hello world"])
+    b = write_video(tmp_path / "b" / "video.json", ["東京駅に着いた"])
+
+    index = SearchIndex(tmp_path / "index.sqlite")
+    assert index.trigram == (sqlite_version >= TRIGRAM_VERSION)
+    assert index.add("a", a)
+    assert index.add("b", b)
+    assert index.video_ids() == ["a", "b"]
+
+    hits = index.search("タワー")
+    assert [(hit.video_id, hit.text, hit.start, hit.end) for hit in hits] == [
+        ("a", "東京タワーへ行く", 0.0, 1.0)
+    ]
+    assert hits[0].bbox == BBOX
+
+    # terms shorter than a trigram
+    assert [hit.video_id for hit in index.search("東京")] == ["a", "b"]
+    assert [hit.video_id for hit in index.search("東京 駅")] == ["b"]
+    assert [hit.text for hit in index.search("HELLO wor")] == ["hello world"]
+    assert index.search("東京", video_id="b")[0].text == "東京駅に着いた"
+    assert index.search("大阪") == []
+
+
+def test_reindex_touches_only_its_video(tmp_path):
+    a = write_video(tmp_path / "a" / "video.json", ["first text"])
+    b = write_video(tmp_path / "b" / "video.json", ["other text"])
+
+    index = SearchIndex(tmp_path / "index.sqlite")
+    index.add("a", a)
+    index.add("b", b)
+    rows_of_b = index.conn.execute(
+        "SELECT tracks.* FROM tracks JOIN videos ON videos.id = tracks.video WHERE video_id = 'b'"
+    ).fetchall()
+
+    # unchanged files are skipped
+    assert not index.add("a", a)
+
+    write_video(a, ["second text"])
+    os.utime(a, ns=(0, 0))
+    assert index.add("a", a)
+
+    assert index.search("first") == []
+    assert sorted(hit.video_id for hit in index.search("text")) == ["a", "b"]
+    assert (
+        index.conn.execute(
+            "SELECT tracks.* FROM tracks JOIN videos ON videos.id = tracks.video WHERE video_id = 'b'"
+        ).fetchall()
+        == rows_of_b
+    )
+
+    index.remove("a")
+    assert [hit.video_id for hit in index.search("text")] == ["b"]
+    # raises if the index is out of sync with the tracks
+    index.conn.execute("INSERT INTO tracks_fts (tracks_fts) VALUES ('integrity-check')")
+
+
+def test_index_command(tmp_path):
+    write_video(tmp_path / "videos" / "abc" / "video.json", ["東京タワーへ行く"])
+    index_file = str(tmp_path / "index.sqlite")
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, ["index", str(tmp_path / "videos"), "--index", index_file]
+    )
+    assert result.exit_code == 0, result.output
+    assert "indexed 1 videos" in result.output
+
+    result = runner.invoke(cli, ["search", "タワー", "--index", index_file, "--json"])
+    assert result.exit_code == 0, result.output
+    hit = json.loads(result.output)
+    assert hit["video_id"] == "abc"
+    assert hit["start"] == 0.0
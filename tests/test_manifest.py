@@ -0,0 +1,103 @@
+import json
+import os
+
+from click.testing import CliRunner
+
+from video_ocr.bench import make_synthetic_video
+from video_ocr.cli import cli
+from video_ocr.manifest import Manifest, file_state
+
+
+def test_file_state(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"a" * 100)
+    state = file_state(path)
+
+    # the digest is reused while size and modification time are unchanged
+    path.write_bytes(b"b" * 100)
+    os.utime(path, ns=(state.mtime_ns, state.mtime_ns))
+    assert file_state(path, state) == state
+
+    os.utime(path, ns=(state.mtime_ns + 1, state.mtime_ns + 1))
+    assert file_state(path, state).digest != state.digest
+
+
+def test_manifest(tmp_path):
+    path = tmp_path / "video.manifest.json"
+    manifest = Manifest(path)
+    manifest.begin("ocr", "k")
+    assert not Manifest(path).is_current("ocr", "k", path)
+
+    manifest.finish("ocr", "k")
+    assert Manifest(path).is_current("ocr", "k", path)
+    assert not Manifest(path).is_current("ocr", "other", path)
+    assert not Manifest(path).is_current("ocr", "k", tmp_path / "missing")
+
+    path.write_text("{")
+    assert Manifest(path).stages == {}
+
+
+def test_run_skips_unchanged_stages(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    output_file = tmp_path / "out" / "video.json"
+    metrics_file = tmp_path / "metrics.json"
+
+    def run(*args):
+        result = CliRunner().invoke(
+            cli,
+            ["run", str(synthetic_video), "-d", str(output_file.parent)]
+            + ["--backend", "stub", "--no-cache", "--metrics-out", str(metrics_file)]
+            + list(args),
+        )
+        assert result.exit_code == 0, result.output
+        return json.loads(metrics_file.read_text())["counters"]
+
+    counters = run("--interval", "1")
+    assert counters["frames_ocr"] == 3
+    expected = output_file.read_text()
+
+    # nothing changed
+    counters = run("--interval", "1")
+    assert "frames_decoded" not in counters
+    assert counters["stages_skipped"] == 2
+    assert output_file.read_text() == expected
+
+    # only the missing output is written again
+    output_file.unlink()
+    counters = run("--interval", "1", "--tracks")
+    assert "frames_decoded" not in counters
+    assert counters["stages_skipped"] == 1
+    assert output_file.read_text() == expected
+    assert output_file.with_suffix(".tracks.json").exists()
+
+    # changed settings and a changed video run ocr again, from the start
+    assert run("--interval", "0.5")["frames_sampled"] == 6
+    make_synthetic_video(synthetic_video, seconds=2, width=320, height=240)
+    counters = run("--interval", "0.5")
+    assert counters["frames_sampled"] == 4
+    assert "frames_resumed" not in counters
+
+    assert run("--interval", "0.5", "--force")["frames_sampled"] == 4
+
+
+def test_batch_skips_unchanged_videos(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    other = make_synthetic_video(tmp_path / "other.mp4", seconds=1, width=320)
+
+    def run():
+        result = CliRunner().invoke(
+            cli,
+            ["batch", str(synthetic_video), str(other), "-d", str(tmp_path / "out")]
+            + ["--workers", "1", "--interval", "1", "--backend", "stub"]
+            + ["--metrics-out", str(tmp_path / "metrics.json")],
+        )
+        assert result.exit_code == 0, result.output
+        return json.loads((tmp_path / "metrics.json").read_text())["counters"]
+
+    assert run()["frames_sampled"] == 4
+    make_synthetic_video(other, seconds=2, width=320)
+    counters = run()
+    assert counters["frames_sampled"] == 2
+    assert counters["stages_skipped"] == 2
+    output = json.loads((tmp_path / "out" / "other" / "video.json").read_text())
+    assert [frame["index"] for frame in output["frames"]] == [0, 30]
@@ -0,0 +1,86 @@
+import json
+import pstats
+
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.cli import cli, measured
+from video_ocr.metrics import Metrics, metrics, recording
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    with metrics.stage("decode"):
+        pass
+    metrics.incr("frames_decoded")
+
+    assert metrics.to_dict()["stages"] == {}
+    assert metrics.to_dict()["counters"] == {}
+
+
+def test_recording(tmp_path):
+    output = tmp_path / "metrics.json"
+    with recording(output) as recorded:
+        with recorded.stage("decode"):
+            pass
+        recorded.incr("frames_decoded", 3)
+    # disabled again after the block
+    recorded.incr("frames_decoded")
+
+    result = json.loads(output.read_text())
+    assert result["stages"]["decode"]["calls"] == 1
+    assert result["counters"] == {"frames_decoded": 3}
+    assert result["peak_rss_bytes"] > 0
+
+
+def test_run_command_metrics(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "run",
+            str(synthetic_video),
+            "-d",
+            str(tmp_path),
+            "--frame-rate",
+            "15",
+            "--backend",
+            "stub",
+            "--metrics-out",
+            str(tmp_path / "metrics.json"),
+            "--profile",
+            str(tmp_path / "run.prof"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    metrics = json.loads((tmp_path / "metrics.json").read_text())
+    assert {"decode", "dedup", "ocr", "cache", "checkpoint", "serialize"} <= set(
+        metrics["stages"]
+    )
+    counters = metrics["counters"]
+    assert counters["frames_grabbed"] > counters["frames_decoded"]
+    assert counters["frames_decoded"] == 6
+    assert counters["frames_sampled"] == 6
+    # 3 scenes of 2 identical frames each
+    assert counters["frames_skipped"] == 3
+    assert counters["frames_ocr"] == 3
+
+    assert pstats.Stats(str(tmp_path / "run.prof")).total_calls > 0
+
+
+def test_measured_stops_recording_if_profiling_fails(tmp_path):
+    options = {
+        "metrics_out": tmp_path / "metrics.json",
+        "profile": tmp_path / "run.prof",
+        "profiler": "unknown",
+    }
+    # the traceback keeps the frames of measured alive
+    with pytest.raises(ValueError) as error:
+        with measured(**options):
+            pass
+
+    assert error.traceback
+    assert not metrics.enabled
+    assert (tmp_path / "metrics.json").exists()
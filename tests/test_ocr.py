@@ -0,0 +1,132 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from video_ocr.backends.stub import StubBackend
+from video_ocr.ocr import (
+    OCRBackend,
+    OCRResult,
+    available_backends,
+    detect_text,
+    detect_text_batch,
+    get_backend,
+    register_backend,
+)
+
+
+def test_available_backends():
+    assert {"stub", "tesseract", "vision"} <= set(available_backends())
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("unknown")
+
+
+def test_register_backend():
+    class EmptyBackend(OCRBackend):
+        name = "empty"
+
+        def detect(self, image):
+            return []
+
+    register_backend("empty", EmptyBackend)
+
+    backend = get_backend("empty", languages=["ja"])
+    assert isinstance(backend, EmptyBackend)
+    assert backend.languages == ["ja"]
+    assert backend.detect_batch([np.zeros((8, 8, 3), np.uint8)] * 2) == [[], []]
+
+
+def test_stub_backend():
+    backend = get_backend("stub")
+    assert isinstance(backend, StubBackend)
+
+    image = np.zeros((100, 200, 3), np.uint8)
+    assert backend.detect(image) == []
+
+    image[10:30, 50:150] = 255
+    [result] = backend.detect(image)
+    assert result.bbox == pytest.approx((0.25, 0.7, 0.5, 0.2))
+    assert backend.detect(image.copy()) == [result]
+
+
+def test_detect_text_from_file(tmp_path):
+    import cv2
+
+    image = np.zeros((100, 200, 3), np.uint8)
+    image[10:30, 50:150] = 255
+    cv2.imwrite(str(tmp_path / "frame.png"), image)
+
+    assert detect_text(str(tmp_path / "frame.png"), backend="stub") == detect_text(
+        image, backend="stub"
+    )
+
+
+def test_detect_text_batch(tmp_path):
+    import cv2
+
+    images = [np.zeros((100, 200, 3), np.uint8) for _ in range(3)]
+    images[1][10:30, 50:150] = 255
+    images[2][60:90, 20:60] = 255
+    cv2.imwrite(str(tmp_path / "frame.png"), images[1])
+
+    expected = [detect_text(image, backend="stub") for image in images]
+    assert detect_text_batch(images, backend="stub") == expected
+    assert detect_text_batch([images[0], tmp_path / "frame.png"], backend="stub") == [
+        expected[0],
+        expected[1],
+    ]
+
+
+def test_tesserocr_engine_is_reused():
+    pytest.importorskip("tesserocr")
+    import cv2
+
+    image = np.full((80, 480, 3), 255, np.uint8)
+    cv2.putText(image, "HELLO WORLD", (10, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+
+    backend = get_backend("tesseract", languages=["en"])
+    assert backend.engine == "tesserocr"
+    first, second = backend.detect_batch([image, image])
+    assert first == second
+    assert "HELLO" in " ".join(result.text for result in first)
+
+
+def test_ocr_result_is_compact():
+    result = OCRResult(text="a", confidence=0.5, bbox=(0.0, 0.1, 0.5, 0.2))
+
+    assert not hasattr(result, "__dict__")
+    assert pickle.loads(pickle.dumps(result)) == result
+    with pytest.raises(AttributeError):
+        result.text = "b"  # type: ignore
+
+
+def test_tesseract_joins_words_of_lines():
+    from video_ocr.backends.tesseract import to_results
+
+    words = ["東京", "タワー", "TOKYO", "TOWER", "へ", "2024", "年"]
+    data = {
+        "text": words + [""],
+        "conf": [90] * len(words) + [-1],
+        "block_num": [1] * (len(words) + 1),
+        "par_num": [1] * (len(words) + 1),
+        "line_num": [1] * (len(words) + 1),
+        "left": [10 * i for i in range(len(words) + 1)],
+        "top": [0] * (len(words) + 1),
+        "width": [10] * (len(words) + 1),
+        "height": [10] * (len(words) + 1),
+    }
+
+    [result] = to_results(data, width=100, height=100)
+    assert result.text == "東京タワーTOKYO TOWERへ2024年"
+
+
+def test_tesserocr_engine_is_closed():
+    pytest.importorskip("tesserocr")
+
+    with get_backend("tesseract", languages=["en"]) as backend:
+        backend.detect(np.full((40, 40), 255, np.uint8))
+        assert backend._api is not None
+    assert backend._api is None
@@ -0,0 +1,130 @@
+import importlib.util
+
+import numpy as np
+import pytest
+
+from video_ocr import parallel
+from video_ocr.decode import open_video
+from video_ocr.parallel import ParallelSampler, keyframe_indices, plan_segments
+from video_ocr.sampling import FrameSampler
+from video_ocr.video import Video
+
+
+@pytest.mark.parametrize(
+    "total_frames, step, segment_frames, keyframes",
+    [
+        (90, 7, 10, ()),
+        (90, 1, 25, ()),
+        (90, 20, 10, ()),
+        (90, 7, 10, (0, 12, 31, 50, 77)),
+        (5, 7, 10, ()),
+    ],
+)
+def test_plan_segments(total_frames, step, segment_frames, keyframes):
+    segments = plan_segments(total_frames, step, segment_frames, keyframes)
+
+    assert segments[0][0] == 0
+    # the last segment reads to the end of the video
+    assert segments[-1][1] is None
+    assert segments[-1][0] < total_frames
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start
+        assert start % step == 0
+    assert all(start < end for start, end in segments[:-1])
+
+
+@pytest.mark.parametrize(
+    "decoder",
+    [
+        "cv2",
+        pytest.param(
+            "pyav",
+            marks=pytest.mark.skipif(
+                importlib.util.find_spec("av") is None, reason="PyAV is not installed"
+            ),
+        ),
+    ],
+)
+@pytest.mark.parametrize("strategy", ["grab", "seek"])
+def test_parallel_sampler_matches_frame_sampler(synthetic_video, decoder, strategy):
+    kwargs = {"step": 7, "strategy": strategy, "decoder": decoder}
+    expected = list(FrameSampler(synthetic_video, **kwargs))
+    sampler = ParallelSampler(synthetic_video, workers=2, segment_frames=20, **kwargs)
+    frames = list(sampler)
+
+    assert [f.index for f in frames] == [f.index for f in expected]
+    assert [f.timestamp for f in frames] == pytest.approx(
+        [f.timestamp for f in expected]
+    )
+    for frame, expected_frame in zip(frames, expected):
+        assert np.abs(frame.image.astype(int) - expected_frame.image).mean() < 2
+    assert sampler.stats.sampled == len(expected)
+
+
+class UnderReporting:
+    """video reader reporting fewer frames than the video has"""
+
+    total_frames = 50
+
+    def __init__(self, vid):
+        self.vid = vid
+
+    def __getattr__(self, name):
+        return getattr(self.vid, name)
+
+
+@pytest.mark.parametrize("strategy", ["grab", "seek"])
+def test_parallel_sampler_reads_past_frame_count(
+    synthetic_video, monkeypatch, strategy
+):
+    expected = list(FrameSampler(synthetic_video, step=7, strategy="grab"))
+    monkeypatch.setattr(
+        parallel, "open_video", lambda *args: UnderReporting(open_video(*args))
+    )
+    sampler = ParallelSampler(
+        synthetic_video, workers=2, segment_frames=20, step=7, strategy=strategy
+    )
+
+    assert [f.index for f in sampler] == [f.index for f in expected]
+    assert expected[-1].index > UnderReporting.total_frames
+
+
+@pytest.mark.parametrize("step, segments", [(1, 6), (3, 2), (30, 1)])
+def test_parallel_sampler_limits_sampled_frames_of_segments(
+    synthetic_video, monkeypatch, step, segments
+):
+    planned = []
+
+    def plan(*args):
+        planned.extend(plan_segments(*args))
+        return planned
+
+    monkeypatch.setattr(parallel, "plan_segments", plan)
+    monkeypatch.setattr(parallel, "SEGMENT_SAMPLES", 16)
+    sampler = ParallelSampler(synthetic_video, workers=2, step=step, strategy="grab")
+
+    assert len(list(sampler)) == len(range(0, 90, step))
+    assert len(planned) == segments
+    for start, end in planned:
+        assert len(range(start, 90 if end is None else end, step)) <= 16
+
+
+def test_keyframe_indices(synthetic_video):
+    pytest.importorskip("av")
+
+    keyframes = keyframe_indices(synthetic_video)
+    assert keyframes[0] == 0
+    assert all(0 <= index < 90 for index in keyframes)
+
+
+def test_run_ocr_on_processes(synthetic_video, tmp_path):
+    def run(decode_processes):
+        return Video(
+            output_file=tmp_path / f"video{decode_processes}.json",
+            video_file=synthetic_video,
+            frame_rate=15,
+            backend="stub",
+            decode_processes=decode_processes,
+        ).run_ocr()
+
+    assert run(2) == run(1)
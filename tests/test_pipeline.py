@@ -0,0 +1,117 @@
+import json
+import shutil
+
+from click.testing import CliRunner
+
+from video_ocr.cli import cli
+from video_ocr.execute import BatchRunner
+from video_ocr.pipeline import DirectoryDownloader, PlaylistRunner
+from video_ocr.playlist import Playlist
+from video_ocr.video import Video
+
+
+class CountingDownloader(DirectoryDownloader):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.downloaded = []
+
+    def download(self, video_id, path):
+        self.downloaded.append(video_id)
+        super().download(video_id, path)
+
+
+def make_source(synthetic_video, directory, ids):
+    directory.mkdir()
+    for video_id in ids:
+        shutil.copy(synthetic_video, directory / f"{video_id}.mp4")
+    return directory
+
+
+def test_playlist_runner(synthetic_video, tmp_path):
+    source = make_source(synthetic_video, tmp_path / "source", ["a", "b", "c"])
+    downloader = CountingDownloader(source)
+
+    def make_runner(frame_rate=30, **kwargs):
+        return PlaylistRunner(
+            BatchRunner(backend="stub", workers=2, decode_workers=2),
+            downloader,
+            tmp_path / "out",
+            lambda video_file, output_file: Video(
+                output_file=output_file,
+                video_file=video_file,
+                frame_rate=frame_rate,
+                keep_frames=False,
+            ),
+            download_workers=2,
+            **kwargs,
+        )
+
+    finished = list(make_runner().run(["a", "missing", "b", "a", "c"]))
+
+    assert sorted(video.output_file.parent.name for video in finished) == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert sorted(downloader.downloaded) == ["a", "b", "c", "missing"]
+    for video_id in "abc":
+        output = json.loads((tmp_path / "out" / video_id / "video.json").read_text())
+        assert [frame["index"] for frame in output["frames"]] == [0, 30, 60]
+
+    # done videos are skipped, and downloaded videos are not downloaded again
+    downloader.downloaded.clear()
+    assert list(make_runner().run(["a", "b"])) == []
+
+    # force runs ocr again instead of resuming from the checkpoint
+    checkpoint = tmp_path / "out" / "a" / "video.jsonl"
+    checkpoint.write_text(checkpoint.read_text().replace('"text":"', '"text":"x'))
+    finished = list(make_runner(force=True, keep_videos=False).run(["a"]))
+    assert len(finished) == 1
+    assert downloader.downloaded == []
+    assert not (tmp_path / "out" / "a" / "video.mp4").exists()
+    assert '"text":"x' not in (tmp_path / "out" / "a" / "video.json").read_text()
+
+    # a removed video is not downloaded again while its ocr is up to date, and missing
+    # outputs are written from the checkpoint
+    (tmp_path / "out" / "a" / "video.json").unlink()
+    assert list(make_runner(keep_videos=False).run(["a"])) == []
+    assert downloader.downloaded == []
+    assert (tmp_path / "out" / "a" / "video.json").exists()
+
+    # it is once the settings changed
+    finished = list(make_runner(frame_rate=15, keep_videos=False).run(["a"]))
+    assert len(finished) == 1
+    assert downloader.downloaded == ["a"]
+    output = json.loads((tmp_path / "out" / "a" / "video.json").read_text())
+    assert [frame["index"] for frame in output["frames"]] == [0, 15, 30, 45, 60, 75]
+
+
+def test_playlist_run_command(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    source = make_source(synthetic_video, tmp_path / "source", ["a", "b"])
+    playlist = Playlist(
+        "PL", items=[{"contentDetails": {"videoId": video_id}} for video_id in "ab"]
+    ).to_json(tmp_path / "playlist.json")
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "youtube",
+            "playlist-run",
+            str(playlist),
+            "--source",
+            str(source),
+            "-d",
+            str(tmp_path / "out"),
+            "--workers",
+            "1",
+            "--interval",
+            "1",
+            "--backend",
+            "stub",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "out" / "a" / "video.json").exists()
+    assert (tmp_path / "out" / "b" / "video.json").exists()
+    assert (tmp_path / "out" / "a" / "video.manifest.json").exists()
@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.bench import make_synthetic_video
+from video_ocr.cli import cli
+from video_ocr.prefilter import TextPrefilter, calibrate, text_score
+from video_ocr.sampling import FrameSampler
+from video_ocr.video import Video
+
+
+@pytest.fixture
+def blank_scene_video(tmp_path):
+    """3 seconds of video, the second one without text"""
+    return make_synthetic_video(
+        tmp_path / "blank.mp4",
+        seconds=3,
+        fps=30,
+        width=320,
+        height=240,
+        scene_seconds=1,
+        texts=["0", "", "2"],
+    )
+
+
+def test_text_score(synthetic_video):
+    frames = list(FrameSampler(synthetic_video, step=30))
+    rng = np.random.default_rng(0)
+    blank = np.full((240, 320, 3), 64, np.uint8)
+    gradient = np.tile(np.linspace(0, 255, 320, dtype=np.uint8), (240, 1))
+    noise = rng.integers(0, 256, (240, 320), dtype=np.uint8)
+
+    for frame in frames:
+        assert text_score(frame.image) > 0.001
+    for image in (blank, gradient, noise):
+        assert text_score(image) < 0.001
+
+
+def test_text_prefilter():
+    with pytest.raises(ValueError):
+        TextPrefilter(-1)
+
+    prefilter = TextPrefilter()
+    assert not prefilter.has_text(np.zeros((240, 320), np.uint8))
+    assert prefilter.stats.frames == 1
+    assert prefilter.stats.skip_ratio == 1
+
+
+def test_calibrate():
+    scores = [0.0, 0.001, 0.01, 0.02, 0.0]
+    has_text = [False, True, True, True, True]
+    zero, low, high = calibrate(scores, has_text, [0.0, 0.001, 0.015])
+
+    assert (zero.precision, zero.recall, zero.skip_ratio) == (0.8, 1.0, 0.0)
+    assert (low.precision, low.recall) == (1.0, 0.75)
+    assert low.skip_ratio == pytest.approx(0.4)
+    assert (high.precision, high.recall) == (1.0, 0.25)
+
+    with pytest.raises(ValueError):
+        calibrate([0.0], [True, False])
+
+
+@pytest.mark.parametrize("dedup_threshold", [None, 0])
+def test_run_ocr_skips_frames_without_text(
+    blank_scene_video, tmp_path, dedup_threshold
+):
+    def run(text_threshold):
+        video = Video(
+            output_file=tmp_path / f"video{text_threshold}.json",
+            video_file=blank_scene_video,
+            frame_rate=10,
+            backend="stub",
+            dedup_threshold=dedup_threshold,
+            text_threshold=text_threshold,
+        )
+        video.run_ocr()
+        return video
+
+    expected = run(None)
+    video = run(0.001)
+
+    assert video.frames == expected.frames
+    # duplicates are not scored, the frames of the blank scene are skipped
+    stats = video.prefilter_stats
+    assert (stats.frames, stats.skipped) == (
+        (9, 3) if dedup_threshold is None else (3, 1)
+    )
+    assert video.settings("ja")["text_threshold"] == 0.001
+
+
+def test_calibrate_command(blank_scene_video, tmp_path):
+    output = tmp_path / "calibration.json"
+    result = CliRunner().invoke(
+        cli,
+        [
+            "calibrate",
+            str(blank_scene_video),
+            "--backend",
+            "stub",
+            "--interval",
+            "0.5",
+            "--threshold",
+            "0",
+            "--threshold",
+            "0.001",
+            "-o",
+            str(output),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    calibration = json.loads(output.read_text())
+    assert calibration["frames"] == 6
+    assert calibration["frames_with_text"] == 4
+    zero, low = calibration["points"]
+    assert zero == {"threshold": 0, "precision": 4 / 6, "recall": 1, "skip_ratio": 0}
+    assert (low["precision"], low["recall"]) == (1, 1)
@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+import pytest
+
+from video_ocr.backends.stub import StubBackend
+from video_ocr.roi import (
+    RegionCropper,
+    detect_text_regions,
+    edge_blobs,
+    parse_region,
+)
+from video_ocr.video import Video
+
+
+def make_frame() -> np.ndarray:
+    """a frame with a subtitle at the bottom"""
+    image = np.zeros((360, 640, 3), np.uint8)
+    cv2.putText(
+        image, "subtitle", (220, 330), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2
+    )
+    return image
+
+
+def test_parse_region():
+    assert parse_region("0,0.8,1,0.2") == (0.0, 0.8, 1.0, 0.2)
+    with pytest.raises(ValueError):
+        parse_region("0,0.8,1")
+    with pytest.raises(ValueError):
+        parse_region("0,0.9,1,0.2")
+
+
+def test_detect_text_regions():
+    regions = detect_text_regions(make_frame())
+
+    assert len(regions) == 1
+    x, y, w, h = regions[0]
+    # the region covers the subtitle, and not much more
+    assert x < 220 / 640 and x + w > 325 / 640
+    assert y < 303 / 360 and y + h > 330 / 360
+    assert w * h < 0.1
+
+    assert detect_text_regions(np.zeros((360, 640, 3), np.uint8)) == []
+
+
+def test_edge_blobs():
+    blobs = edge_blobs(make_frame(), width=320)
+
+    # the letters of the subtitle join into one blob
+    assert blobs.edges.shape == blobs.labels.shape == (180, 320)
+    assert blobs.count == 2
+    x, y, w, h, _ = blobs.stats[1]
+    assert x <= 220 / 2 and x + w >= 325 / 2
+    assert y <= 308 / 2 and y + h >= 330 / 2
+
+    assert edge_blobs(np.zeros((360, 640), np.uint8)).count == 1
+
+
+@pytest.mark.parametrize(
+    "cropper",
+    [
+        RegionCropper([(0.0, 0.75, 1.0, 0.25)]),
+        RegionCropper([(0.0, 0.75, 1.0, 0.25)], scale=0.5),
+        RegionCropper(auto=True),
+    ],
+)
+def test_results_are_remapped_to_the_frame(cropper):
+    image = make_frame()
+    backend = StubBackend()
+    (expected,) = backend.detect(image)
+
+    patches, crops = cropper.crop([image])
+    assert sum(patch.size for patch in patches) < image.size / 2
+
+    (results,) = cropper.merge(backend.detect_batch(patches), crops, 1)
+    (result,) = results
+    assert np.allclose(result.bbox, expected.bbox, atol=2 / 360)
+    if cropper.scale == 1:
+        assert result.text == expected.text
+
+
+def test_auto_skips_frames_without_text():
+    cropper = RegionCropper(auto=True)
+    blank = np.zeros((360, 640, 3), np.uint8)
+
+    patches, crops = cropper.crop([blank, make_frame(), blank])
+    assert len(patches) == 1
+    assert cropper.merge([[]], crops, 3) == [[], [], []]
+
+
+def test_run_ocr_with_roi(synthetic_video):
+    full = Video(video_file=synthetic_video, frame_rate=30, backend="stub")
+    cropped = Video(
+        video_file=synthetic_video,
+        frame_rate=30,
+        backend="stub",
+        roi=[(0.25, 0.25, 0.5, 0.5)],
+    )
+
+    for a, b in zip(full.run_ocr(), cropped.run_ocr()):
+        assert a.results[0].text == b.results[0].text
+        assert np.allclose(a.results[0].bbox, b.results[0].bbox)
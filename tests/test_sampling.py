@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.cli import cli
+from video_ocr.sampling import SEEK_THRESHOLD, AdaptiveSampler, FrameSampler
+
+
+@pytest.mark.parametrize("strategy", ["grab", "seek"])
+def test_sample_by_step(synthetic_video, strategy):
+    sampler = FrameSampler(synthetic_video, step=20, strategy=strategy)
+    frames = list(sampler)
+
+    assert [frame.index for frame in frames] == [0, 20, 40, 60, 80]
+    assert [frame.timestamp for frame in frames] == pytest.approx(
+        [0, 20 / 30, 40 / 30, 2, 80 / 30]
+    )
+    assert frames[0].image.shape == (240, 320, 3)
+
+    assert sampler.stats.total_frames == 90
+    assert sampler.stats.decoded == 5
+    assert sampler.stats.decodes_saved == 85
+
+
+def test_grab_and_seek_return_same_frames(synthetic_video):
+    grabbed = list(FrameSampler(synthetic_video, step=30, strategy="grab"))
+    seeked = list(FrameSampler(synthetic_video, step=30, strategy="seek"))
+
+    for a, b in zip(grabbed, seeked):
+        assert a.index == b.index
+        assert (a.image == b.image).all()
+
+
+def test_sample_by_interval(synthetic_video):
+    sampler = FrameSampler(synthetic_video, step=7, interval=1.0)
+
+    assert [frame.index for frame in sampler] == [0, 30, 60]
+
+
+def test_choose_strategy(synthetic_video):
+    sampler = FrameSampler(synthetic_video)
+
+    assert sampler.choose_strategy(SEEK_THRESHOLD, 10000) == "seek"
+    assert sampler.choose_strategy(SEEK_THRESHOLD - 1, 10000) == "grab"
+    # unknown frame count
+    assert sampler.choose_strategy(SEEK_THRESHOLD, 0) == "grab"
+
+
+def test_invalid_strategy(synthetic_video):
+    with pytest.raises(ValueError):
+        FrameSampler(synthetic_video, strategy="skip")
+
+
+def test_adaptive_sampler_catches_short_text(tmp_path):
+    # 10 seconds of static text with other text flashing for 10 frames
+    path = tmp_path / "flash.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 240))
+    for index in range(300):
+        image = np.zeros((240, 320, 3), np.uint8)
+        text = "FLASH" if 140 <= index < 150 else "static"
+        cv2.putText(
+            image, text, (40, 140), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255,) * 3, 3
+        )
+        writer.write(image)
+    writer.release()
+
+    modulo = [frame.index for frame in FrameSampler(path, step=100)]
+    assert not any(140 <= index < 150 for index in modulo)
+
+    sampler = AdaptiveSampler(path, min_interval=0.25, max_interval=4.0)
+    adaptive = [frame.index for frame in sampler]
+
+    assert any(140 <= index < 150 for index in adaptive)
+    assert len(adaptive) <= 6
+    # no gap between samples is longer than max_interval
+    assert max(b - a for a, b in zip(adaptive, adaptive[1:])) <= 120
+
+
+@pytest.mark.parametrize("command", ["run", "batch"])
+def test_min_interval_longer_than_max_interval(synthetic_video, tmp_path, command):
+    result = CliRunner().invoke(
+        cli,
+        [command, str(synthetic_video), "-d", str(tmp_path / "out"), "-b", "stub"]
+        + ["--sampling", "adaptive", "--min-interval", "2", "--max-interval", "1"],
+    )
+
+    assert result.exit_code == 2
+    assert "--max-interval" in result.output
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from video_ocr.shm import FrameRing, read_chunk
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=2, slot_bytes=2**16)
+    yield ring
+    ring.close()
+
+
+def images():
+    rng = np.random.default_rng(0)
+    bgr = rng.integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    return [bgr, bgr[::2, ::3, 1], rng.random((10, 10), dtype=np.float32)]
+
+
+def test_read_chunk_views_slot(ring):
+    chunk = ring.put(images())
+    views = read_chunk(chunk)
+
+    for view, image in zip(views, images()):
+        np.testing.assert_array_equal(view, image)
+        assert view.dtype == image.dtype
+        assert view.ctypes.data % 64 == 0
+
+    # views are of the shared memory, not copies
+    ring.write(chunk.slot, [np.zeros_like(image) for image in images()])
+    assert not any(view.any() for view in views)
+
+
+def test_slots_are_recycled(ring):
+    first = ring.put(images())
+    second = ring.put(images())
+    assert {first.slot, second.slot} == {0, 1}
+    with pytest.raises(TimeoutError):
+        ring.put(images(), timeout=0.01)
+
+    # a writer waits for a slot to be released
+    timer = threading.Timer(0.05, ring.release, args=(first.slot,))
+    timer.start()
+    assert ring.put(images(), timeout=5).slot == first.slot
+    timer.join()
+
+
+def test_chunks_that_do_not_fit(ring):
+    too_large = [np.zeros(2**16 + 1, np.uint8)]
+    assert not ring.fits(too_large)
+    with pytest.raises(ValueError):
+        ring.put(too_large)
+    # the slot was released
+    assert len(ring.free) == 2
+
+
+def sum_chunk(chunk):
+    return [int(image.astype(np.int64).sum()) for image in read_chunk(chunk)]
+
+
+def test_read_chunk_in_worker_process(ring):
+    chunk = ring.put(images())
+    with ProcessPoolExecutor(1) as pool:
+        sums = pool.submit(sum_chunk, chunk).result()
+
+    assert sums == [int(image.astype(np.int64).sum()) for image in images()]
@@ -0,0 +1,53 @@
+import pytest
+
+from video_ocr.stream import interleave, prefetch
+
+
+def test_prefetch_keeps_order():
+    assert list(prefetch(range(100), maxsize=3)) == list(range(100))
+
+
+def test_prefetch_reraises_producer_error():
+    def produce():
+        yield 1
+        raise RuntimeError("decode failed")
+
+    with pytest.raises(RuntimeError, match="decode failed"):
+        list(prefetch(produce()))
+
+
+def test_prefetch_closes_producer_on_early_exit():
+    closed = []
+
+    def produce():
+        try:
+            yield from range(1000)
+        finally:
+            closed.append(True)
+
+    for item in prefetch(produce(), maxsize=2):
+        if item == 5:
+            break
+
+    assert closed == [True]
+
+
+def test_interleave_keeps_order_of_each_iterable():
+    def produce(name):
+        for i in range(50):
+            yield name, i
+
+    items = list(interleave((produce(name) for name in "abcd"), workers=3, maxsize=2))
+
+    assert sorted(items) == [(name, i) for name in "abcd" for i in range(50)]
+    for name in "abcd":
+        assert [i for n, i in items if n == name] == list(range(50))
+
+
+def test_interleave_reraises_producer_error():
+    def produce():
+        yield 1
+        raise RuntimeError("decode failed")
+
+    with pytest.raises(RuntimeError, match="decode failed"):
+        list(interleave([produce(), range(10)], workers=2))
@@ -0,0 +1,106 @@
+import numpy as np
+from click.testing import CliRunner
+
+from video_ocr.cli import cli
+from video_ocr.ocr import OCRResult
+from video_ocr.tracks import build_tracks, format_timestamp, iou_matrix, to_srt
+from video_ocr.video import Frame
+
+TOP = (0.1, 0.8, 0.8, 0.1)
+BOTTOM = (0.1, 0.1, 0.8, 0.1)
+
+
+def make_frame(index, *observations):
+    return Frame(
+        index=index,
+        timestamp=index * 0.5,
+        results=[
+            OCRResult(text=text, confidence=confidence, bbox=bbox)
+            for text, bbox, confidence in observations
+        ],
+    )
+
+
+def test_iou_matrix():
+    a = np.array([[0.0, 0.0, 1.0, 1.0], [0.0, 0.0, 0.5, 0.5]])
+    b = np.array([[0.0, 0.0, 0.5, 1.0], [2.0, 2.0, 1.0, 1.0], [0.0, 0.0, 0.0, 0.0]])
+
+    assert np.allclose(iou_matrix(a, b), [[0.5, 0, 0], [0.5, 0, 0]])
+
+
+def test_build_tracks():
+    frames = [
+        make_frame(0, ("hello world", BOTTOM, 0.9)),
+        make_frame(1, ("hello world", BOTTOM, 0.7), ("title", TOP, 1.0)),
+        # ocr noise, and missing for one frame
+        make_frame(2, ("hello w0rld", BOTTOM, 0.5), ("title", TOP, 1.0)),
+        make_frame(3, ("title", TOP, 1.0)),
+        make_frame(4, ("hello world", BOTTOM, 0.9), ("title", TOP, 1.0)),
+        make_frame(5),
+        make_frame(6, ("goodbye", BOTTOM, 1.0)),
+    ]
+
+    tracks = build_tracks(frames)
+
+    assert [(track.text, track.start, track.end) for track in tracks] == [
+        ("hello world", 0.0, 2.5),
+        ("title", 0.5, 2.5),
+        # lasts until the frame that would come next
+        ("goodbye", 3.0, 3.5),
+    ]
+    assert tracks[0].observations == 4
+    assert np.isclose(tracks[0].confidence, 0.75)
+    assert np.allclose(tracks[0].bbox, BOTTOM)
+
+
+def test_gap_ends_tracks():
+    frames = [
+        make_frame(0, ("hello", BOTTOM, 1.0)),
+        make_frame(1),
+        make_frame(2),
+        make_frame(3, ("hello", BOTTOM, 1.0)),
+    ]
+
+    tracks = build_tracks(frames, max_gap=1)
+    assert [(track.start, track.end) for track in tracks] == [(0.0, 0.5), (1.5, 2.0)]
+
+
+def test_srt():
+    assert format_timestamp(3723.5) == "01:02:03,500"
+    assert format_timestamp(0.25, ".") == "00:00:00.250"
+
+    tracks = build_tracks([make_frame(0, ("hello", BOTTOM, 1.0)), make_frame(1)])
+    assert to_srt(tracks) == "1\n00:00:00,000 --> 00:00:00,500\nhello\n"
+
+
+def test_tracks_command(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "run",
+            str(synthetic_video),
+            "-d",
+            str(tmp_path),
+            "--frame-rate",
+            "15",
+            "--backend",
+            "stub",
+            "--tracks",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "video.tracks.json").exists()
+
+    result = runner.invoke(
+        cli, ["tracks", str(tmp_path / "video.json"), "-o", str(tmp_path / "video.vtt")]
+    )
+    assert result.exit_code == 0, result.output
+
+    vtt = (tmp_path / "video.vtt").read_text()
+    # one cue per second of text
+    assert vtt.startswith("WEBVTT\n")
+    assert "00:00:00.000 --> 00:00:01.000" in vtt
+    assert "00:00:01.000 --> 00:00:02.000" in vtt
+    assert "00:00:02.000 --> 00:00:03.000" in vtt
@@ -0,0 +1,121 @@
+import importlib.util
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.backends.stub import StubBackend
+from video_ocr.cli import cli
+from video_ocr.video import Video
+
+
+def test_run_ocr(synthetic_video, tmp_path):
+    video = Video(
+        output_file=tmp_path / "video.json",
+        video_file=synthetic_video,
+        frame_rate=15,
+        backend="stub",
+    )
+    frames = video.run_ocr()
+
+    assert [frame.index for frame in frames] == [0, 15, 30, 45, 60, 75]
+    assert all(frame.results for frame in frames)
+    assert all(frame.frame_file is None for frame in frames)
+    # each second shows different text
+    assert frames[0].results[0].text != frames[2].results[0].text
+
+
+def test_run_command(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    backends = []
+    init = StubBackend.__init__
+
+    def counting_init(self, *args, **kwargs):
+        backends.append(self)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(StubBackend, "__init__", counting_init)
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "run",
+            str(synthetic_video),
+            "-d",
+            str(tmp_path),
+            "--interval",
+            "1",
+            "--backend",
+            "stub",
+            "--save-frames",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    output = json.loads((tmp_path / "video.json").read_text())
+    assert output["backend"] == "stub"
+    assert [frame["index"] for frame in output["frames"]] == [0, 30, 60]
+    assert [frame["timestamp"] for frame in output["frames"]] == [0.0, 1.0, 2.0]
+    assert (tmp_path / ".frames" / "frame-30.png").exists()
+    assert (tmp_path / "ocr-cache.sqlite").exists()
+    # one backend is set up for the manifest and ocr
+    assert len(backends) == 1
+
+
+def test_run_ocr_adaptive(synthetic_video):
+    video = Video(
+        video_file=synthetic_video,
+        backend="stub",
+        sampling="adaptive",
+        min_interval=0.5,
+        max_interval=1.0,
+    )
+    frames = video.run_ocr()
+
+    # text changes at frame 30 and 60, which are sampled along with the next probe
+    assert [frame.index for frame in frames] == [0, 30, 45, 60, 75]
+
+
+def test_run_ocr_without_keeping_frames(synthetic_video, tmp_path):
+    def run(keep_frames):
+        video = Video(
+            output_file=tmp_path / str(keep_frames) / "video.json",
+            video_file=synthetic_video,
+            frame_rate=15,
+            backend="stub",
+            keep_frames=keep_frames,
+        )
+        frames = video.run_ocr()
+        return video, frames, video.to_json().read_text()
+
+    kept, kept_frames, kept_json = run(True)
+    streamed, streamed_frames, streamed_json = run(False)
+
+    assert streamed_frames == streamed.frames == []
+    assert streamed_json == kept_json
+    assert list(streamed.iter_saved_frames()) == kept_frames
+
+
+def test_streaming_needs_output_file(synthetic_video):
+    video = Video(video_file=synthetic_video, backend="stub", keep_frames=False)
+    with pytest.raises(ValueError):
+        video.run_ocr()
+
+
+@pytest.mark.parametrize("command", ["run", "batch"])
+def test_parquet_without_pyarrow(synthetic_video, tmp_path, monkeypatch, command):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util,
+        "find_spec",
+        lambda name, *args: None if name == "pyarrow" else find_spec(name, *args),
+    )
+
+    result = CliRunner().invoke(
+        cli,
+        [command, str(synthetic_video), "-d", str(tmp_path / "out"), "--parquet"]
+        + ["--backend", "stub"],
+    )
+    assert result.exit_code == 2
+    assert "pyarrow" in result.output
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,230 @@
+import json
+import threading
+import time
+from dataclasses import asdict
+
+import pytest
+from click.testing import CliRunner
+
+from video_ocr.cli import cli
+from video_ocr.video import Video
+from video_ocr.workqueue import (
+    QueueClient,
+    QueueServer,
+    QueueWorker,
+    VideoTask,
+    WorkQueue,
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def client(queue):
+    server = QueueServer(queue, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = QueueClient(server.url)
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("served", [False, True])
+def test_lease_complete(queue, client, served):
+    q = client if served else queue
+    assert queue.put("a", {"n": 1})
+    assert queue.put("b", {"n": 2})
+    assert not queue.put("a", {"n": 3})
+
+    a = q.lease("w1")
+    b = q.lease("w2")
+    assert (a.key, a.payload, a.attempts) == ("a", {"n": 1}, 1)
+    assert b.key == "b"
+    assert q.lease("w3") is None
+
+    assert q.heartbeat(a)
+    assert q.complete(a)
+    assert not q.complete(a)
+    assert q.stats() == {"pending": 0, "leased": 1, "done": 1, "failed": 0}
+
+
+def test_expired_lease_is_retried(queue):
+    queue.put("a", {})
+    dead = queue.lease("dead", seconds=0.01)
+    time.sleep(0.02)
+
+    task = queue.lease("alive")
+    assert (task.key, task.attempts) == ("a", 2)
+    # the worker that lost the lease can not renew or finish it
+    assert not queue.heartbeat(dead)
+    assert not queue.complete(dead)
+    assert queue.complete(task)
+
+
+def test_failed_tasks_are_retried_up_to_max_attempts(queue):
+    queue.put("a", {}, max_attempts=2)
+
+    assert queue.fail(queue.lease("w"), "error 1")
+    assert queue.stats()["pending"] == 1
+    assert queue.fail(queue.lease("w"), "error 2")
+    assert queue.lease("w") is None
+    assert queue.stats()["failed"] == 1
+    assert queue.errors() == {"a": "error 2"}
+
+    # expired leases count as attempts
+    queue.put("b", {}, max_attempts=1)
+    queue.lease("w", seconds=0.01)
+    time.sleep(0.02)
+    assert queue.lease("w") is None
+    assert queue.errors()["b"] == "lease expired"
+
+    assert queue.retry_failed() == 2
+    assert queue.lease("w").attempts == 1
+
+
+def test_put_queues_finished_tasks_again(queue):
+    queue.put("a", {"n": 1})
+    queue.complete(queue.lease("w"))
+    queue.put("b", {"n": 1}, max_attempts=1)
+    queue.fail(queue.lease("w"), "error")
+
+    assert queue.put("a", {"n": 2})
+    assert queue.put("b", {"n": 2})
+    assert queue.payloads() == {"a": {"n": 2}, "b": {"n": 2}}
+    assert queue.stats() == {"pending": 2, "leased": 0, "done": 0, "failed": 0}
+
+    # pending and leased tasks are only replaced with replace
+    held = queue.lease("w")
+    assert (held.key, held.attempts) == ("a", 1)
+    assert not queue.put("a", {"n": 3})
+    assert not queue.put("b", {"n": 3})
+    assert queue.put("a", {"n": 3}, replace=True)
+    assert not queue.heartbeat(held)
+    task = queue.lease("w")
+    assert (task.key, task.payload, task.attempts) == ("a", {"n": 3}, 1)
+
+
+def video_task(video_file, output_file, **fields):
+    task = VideoTask(
+        video_file=str(video_file),
+        output_file=str(output_file),
+        fields={"frame_rate": 15, "backend": "stub", **fields},
+    )
+    return asdict(task)
+
+
+def test_worker_runs_tasks(synthetic_video, tmp_path, queue, client):
+    expected = Video(video_file=synthetic_video, frame_rate=15, backend="stub")
+    expected.run_ocr()
+
+    for name in ("a", "b"):
+        queue.put(name, video_task(synthetic_video, tmp_path / name / "video.json"))
+    # a task of a worker that was killed is retried once its lease expires
+    queue.put("killed", video_task(synthetic_video, tmp_path / "c" / "video.json"))
+    queue.lease("killed", seconds=0.5)
+    queue.put("missing", video_task(tmp_path / "missing.mp4", tmp_path / "d.json"))
+
+    worker = QueueWorker(client, lease_seconds=1, poll_interval=0.1)
+    assert worker.run() == 3
+
+    for name in ("a", "b", "c"):
+        video = Video.from_json(tmp_path / name / "video.json")
+        assert video.frames == expected.frames
+    assert queue.stats() == {"pending": 0, "leased": 0, "done": 3, "failed": 1}
+
+
+def test_worker_resumes_from_checkpoint(synthetic_video, tmp_path, queue):
+    output_file = tmp_path / "video.json"
+    Video(
+        output_file=output_file,
+        video_file=synthetic_video,
+        frame_rate=15,
+        backend="stub",
+        keep_frames=False,
+    ).run_ocr()
+    done = output_file.with_suffix(".jsonl").read_text()
+
+    queue.put("a", video_task(synthetic_video, output_file))
+    worker = QueueWorker(queue)
+    task = queue.lease(worker.name)
+    task.attempts = 2  # a retry resumes however the task was added
+
+    assert worker.run_task(task)
+    assert output_file.with_suffix(".jsonl").read_text() == done
+
+
+def test_serve_queue_and_worker_commands(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    runner = CliRunner()
+    queue_file = tmp_path / "queue.sqlite"
+    options = ["--queue-file", str(queue_file), "-d", str(tmp_path / "out")]
+
+    for _ in range(2):
+        result = runner.invoke(
+            cli,
+            ["serve-queue", str(synthetic_video), "--no-serve", "--interval", "1"]
+            + ["--backend", "stub", "--roi", "0,0,1,1", *options],
+        )
+        assert result.exit_code == 0, result.output
+    assert "added 0 videos" in result.output
+
+    result = runner.invoke(cli, ["worker", str(queue_file), "--lease", "5"])
+    assert result.exit_code == 0, result.output
+    assert "finished 1 videos" in result.output
+
+    output = json.loads((tmp_path / "out" / "synthetic" / "video.json").read_text())
+    assert [frame["index"] for frame in output["frames"]] == [0, 30, 60]
+
+
+def test_serve_queue_again_with_other_options(synthetic_video, tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDEO_OCR_USER_PATH", str(tmp_path))
+    runner = CliRunner()
+    queue_file = tmp_path / "queue.sqlite"
+    out = tmp_path / "out"
+    # videos of the same name in other directories
+    other = tmp_path / "other" / synthetic_video.name
+    other.parent.mkdir()
+    other.write_bytes(synthetic_video.read_bytes())
+
+    def serve(*args):
+        result = runner.invoke(
+            cli,
+            ["serve-queue", str(synthetic_video), str(other), "--no-serve"]
+            + ["--queue-file", str(queue_file), "-d", str(out), "--backend", "stub"]
+            + list(args),
+        )
+        assert result.exit_code == 0, result.output
+        return result.output
+
+    def run_worker():
+        result = runner.invoke(cli, ["worker", str(queue_file)])
+        assert result.exit_code == 0, result.output
+
+    def indices(output_file):
+        return [
+            frame["index"] for frame in json.loads(output_file.read_text())["frames"]
+        ]
+
+    output = serve("--interval", "1")
+    assert "added 2 videos" in output
+    assert "is the output file of" in output
+    run_worker()
+    output_files = sorted(out.glob("*/video.json"))
+    assert len(output_files) == 2
+    assert output_files[0].parent.name == "synthetic"
+    assert output_files[1].parent.name.startswith("synthetic-")
+    assert all(indices(path) == [0, 30, 60] for path in output_files)
+
+    assert "added 0 videos" in serve("--interval", "1")
+    # tasks done are queued again with the new options, to the same output files
+    assert "added 2 videos" in serve("--interval", "2", "-f")
+    run_worker()
+    assert sorted(out.glob("*/video.json")) == output_files
+    assert all(indices(path) == [0, 60] for path in output_files)
@@ -0,0 +1,32 @@
+"""
+registry of ocr backends, import them through `video_ocr.ocr.get_backend`.
+
+the registry maps names to import paths, so listing backends imports neither the
+backends nor `video_ocr.ocr`.
+"""
+
+import sys
+import typing as t
+
+if t.TYPE_CHECKING:
+    from video_ocr.ocr import OCRBackend
+
+# name -> "module:class" of the backend, imported on first use
+_BACKENDS: t.Dict[str, t.Union[str, t.Type["OCRBackend"]]] = {
+    "vision": "video_ocr.backends.vision:VisionBackend",
+    "tesseract": "video_ocr.backends.tesseract:TesseractBackend",
+    "stub": "video_ocr.backends.stub:StubBackend",
+}
+
+
+def register_backend(name: str, backend: t.Union[str, t.Type["OCRBackend"]]) -> None:
+    """register a backend class, or its import path as "module:class" to import it lazily"""
+    _BACKENDS[name] = backend
+
+
+def available_backends() -> t.List[str]:
+    return sorted(_BACKENDS)
+
+
+def default_backend() -> str:
+    return "vision" if sys.platform == "darwin" else "tesseract"
@@ -0,0 +1,53 @@
+"""
+deterministic ocr backend for tests and benchmarks, it does not recognize any text.
+"""
+
+import hashlib
+import typing as t
+
+import cv2
+import numpy as np
+
+from video_ocr.ocr import OCRBackend, OCRResult
+
+
+class StubBackend(OCRBackend):
+    """Report one observation per frame that is not blank.
+
+    The bbox covers pixels that differ from the background, and the text is a digest
+    of a coarse thumbnail of those pixels, so similar frames get the same text.
+    """
+
+    name = "stub"
+    accepts_gray = True
+
+    def detect(self, image: np.ndarray) -> t.List[OCRResult]:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        foreground = np.abs(gray.astype(np.int16) - int(np.median(gray))) > 64
+        if not foreground.any():
+            return []
+
+        height, width = gray.shape
+        rows = np.flatnonzero(foreground.any(axis=1))
+        cols = np.flatnonzero(foreground.any(axis=0))
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = cols[0], cols[-1] + 1
+
+        # the same foreground gets the same text wherever it is in the frame
+        mask = foreground[top:bottom, left:right].astype(np.uint8) * 255
+        thumbnail = cv2.resize(mask, (32, 32), interpolation=cv2.INTER_AREA) // 128
+        text = hashlib.blake2b(thumbnail.tobytes(), digest_size=4).hexdigest()
+
+        return [
+            OCRResult(
+                text=text,
+                confidence=1.0,
+                bbox=(
+                    float(left / width),
+                    float(1 - bottom / height),
+                    float((right - left) / width),
+                    float((bottom - top) / height),
+                ),
+            )
+        ]
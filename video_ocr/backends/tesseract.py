@@ -0,0 +1,177 @@
+"""
+ocr backend using tesseract, runs on any platform.
+
+with tesserocr installed, the `tesserocr` extra, tesseract runs in process with one
+engine per backend, which loads its models once and is reused for every image.
+otherwise each image runs the tesseract binary through pytesseract, which loads the
+models again every time. both need traineddata for the languages, e.g. `jpn` for
+japanese.
+"""
+
+import importlib.util
+import re
+import typing as t
+
+import cv2
+import numpy as np
+
+from video_ocr.ocr import OCRBackend, OCRResult
+
+# Vision language codes to tesseract ones, other codes are passed as is
+LANGUAGES = {
+    "en": "eng",
+    "en-US": "eng",
+    "ja": "jpn",
+    "ko": "kor",
+    "zh-Hans": "chi_sim",
+    "zh-Hant": "chi_tra",
+}
+
+# chinese and japanese characters, which are written without spaces between words
+CJK = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+class TesseractBackend(OCRBackend):
+    """tesseract has no fast mode, so `recognition_level` is ignored"""
+
+    name = "tesseract"
+    accepts_gray = True
+
+    def __init__(
+        self,
+        recognition_level: str = "accurate",
+        languages: t.Optional[t.List[str]] = None,
+        orientation: t.Optional[int] = None,
+    ):
+        super().__init__(recognition_level, languages, orientation)
+        self.lang = "+".join(LANGUAGES.get(lang, lang) for lang in self.languages)
+        self.engine = (
+            "tesserocr" if importlib.util.find_spec("tesserocr") else "pytesseract"
+        )
+        self._api = None  # tesserocr handle, created on first use
+        self._version: t.Optional[str] = None
+        if self.engine == "pytesseract":
+            # fail when the backend is created, not on the first frame
+            import pytesseract  # noqa: F401
+
+    def settings_key(self) -> str:
+        # the engines split text into lines slightly differently
+        return f"{super().settings_key()}:{self.engine}"
+
+    def engine_version(self) -> str:
+        # pytesseract runs the binary to get it, which is done once
+        if self._version is None:
+            if self.engine == "tesserocr":
+                from tesserocr import tesseract_version
+
+                self._version = tesseract_version()
+            else:
+                import pytesseract
+
+                self._version = str(pytesseract.get_tesseract_version())
+
+        return self._version
+
+    def detect(self, image: np.ndarray) -> t.List[OCRResult]:
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        if self.engine == "tesserocr":
+            return self._detect_tesserocr(image)
+
+        import pytesseract
+
+        data = pytesseract.image_to_data(
+            image, lang=self.lang, output_type=pytesseract.Output.DICT
+        )
+        height, width = image.shape[:2]
+
+        return to_results(data, width, height)
+
+    def _detect_tesserocr(self, image: np.ndarray) -> t.List[OCRResult]:
+        from tesserocr import RIL, PyTessBaseAPI, iterate_level
+
+        if self._api is None:
+            self._api = PyTessBaseAPI(lang=self.lang)
+
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        self._api.SetImageBytes(
+            image.tobytes(), width, height, channels, width * channels
+        )
+        self._api.Recognize()
+
+        results = []
+        for line in iterate_level(self._api.GetIterator(), RIL.TEXTLINE):
+            text = (line.GetUTF8Text(RIL.TEXTLINE) or "").strip()
+            box = line.BoundingBox(RIL.TEXTLINE)
+            if not text or box is None:
+                continue
+
+            left, top, right, bottom = box
+            results.append(
+                OCRResult(
+                    text=text,
+                    confidence=line.Confidence(RIL.TEXTLINE) / 100,
+                    bbox=(
+                        left / width,
+                        1 - bottom / height,  # tesseract's origin is the top-left
+                        (right - left) / width,
+                        (bottom - top) / height,
+                    ),
+                )
+            )
+
+        return results
+
+    def close(self) -> None:
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+
+
+def join_words(words: t.Iterable[str]) -> str:
+    """text of a line of words, with spaces between them unless one side is cjk"""
+    text = ""
+    for word in words:
+        if text and not (CJK.match(text[-1]) or CJK.match(word[0])):
+            text += " "
+        text += word
+    return text
+
+
+def to_results(data: t.Dict[str, list], width: int, height: int) -> t.List[OCRResult]:
+    """group words of `image_to_data` output into lines, like Vision observations"""
+    lines: t.Dict[t.Tuple[int, int, int], t.List[int]] = {}
+
+    for i, text in enumerate(data["text"]):
+        # conf is -1 for boxes of blocks, paragraphs and lines
+        if not text.strip() or float(data["conf"][i]) < 0:
+            continue
+
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(i)
+
+    results = []
+    for words in lines.values():
+        left = min(data["left"][i] for i in words)
+        top = min(data["top"][i] for i in words)
+        right = max(data["left"][i] + data["width"][i] for i in words)
+        bottom = max(data["top"][i] + data["height"][i] for i in words)
+        confidence = sum(float(data["conf"][i]) for i in words) / len(words) / 100
+
+        results.append(
+            OCRResult(
+                text=join_words(data["text"][i].strip() for i in words),
+                confidence=confidence,
+                bbox=(
+                    left / width,
+                    1 - bottom / height,  # tesseract's origin is the top-left
+                    (right - left) / width,
+                    (bottom - top) / height,
+                ),
+            )
+        )
+
+    return results
@@ -0,0 +1,169 @@
+"""
+ocr backend using Apple's Vision framework, only available on macOS.
+
+the text request is configured once per backend and performed on every image, and
+batches of images share one `VNSequenceRequestHandler`.
+
+reference:
+mainly copied from : https://github.com/RhetTbull/textinator/blob/3aae89d0eea18aa44cd8304f30b50bc49b33b134/src/macvision.py
+also credits: https://github.com/straussmaximilian/ocrmac/blob/main/ocrmac/ocrmac.py
+"""
+
+import platform
+import typing as t
+from pathlib import Path
+
+import cv2
+import numpy as np
+import objc
+import Quartz
+import Vision
+from Foundation import NSURL, NSData, NSDictionary
+
+from video_ocr.ocr import OCRBackend, OCRResult
+
+
+class VisionBackend(OCRBackend):
+    name = "vision"
+    accepts_gray = True
+
+    def __init__(
+        self,
+        recognition_level: str = "accurate",
+        languages: t.Optional[t.List[str]] = None,
+        orientation: t.Optional[int] = None,
+    ):
+        if orientation is not None and not 1 <= orientation <= 8:
+            raise ValueError("orientation must be between 1 and 8")
+
+        super().__init__(recognition_level, languages, orientation)
+
+        self._request: t.Optional[Vision.VNRecognizeTextRequest] = None
+        self._sequence_handler: t.Optional[Vision.VNSequenceRequestHandler] = None
+
+    @property
+    def request(self) -> Vision.VNRecognizeTextRequest:
+        """text request configured once and performed on every image"""
+        if self._request is None:
+            request = Vision.VNRecognizeTextRequest.alloc().init()
+            request.setRecognitionLanguages_(self.languages)
+            request.setUsesLanguageCorrection_(True)
+            request.setRecognitionLevel_(1 if self.recognition_level == "fast" else 0)
+            self._request = request
+
+        return self._request
+
+    def engine_version(self) -> str:
+        # Vision is updated with macOS
+        return platform.mac_ver()[0]
+
+    def detect(self, image: np.ndarray) -> t.List[OCRResult]:
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images: t.Sequence[np.ndarray]) -> t.List[t.List[OCRResult]]:
+        """perform the configured request on each image with one sequence handler"""
+        if self._sequence_handler is None:
+            self._sequence_handler = Vision.VNSequenceRequestHandler.alloc().init()
+
+        results = []
+        for image in images:
+            # release the buffers of each image before the next one
+            with objc.autorelease_pool():
+                if self.orientation is None:
+                    (
+                        success,
+                        error,
+                    ) = self._sequence_handler.performRequests_onCIImage_error_(
+                        [self.request], to_ci_image(image), None
+                    )
+                else:
+                    (
+                        success,
+                        error,
+                    ) = self._sequence_handler.performRequests_onCIImage_orientation_error_(
+                        [self.request], to_ci_image(image), self.orientation, None
+                    )
+                if not success:
+                    raise ValueError(f"Vision request failed: {error}")
+
+                results.append(to_results(self.request))
+
+        return results
+
+    def detect_file(self, path: t.Union[str, Path]) -> t.List[OCRResult]:
+        with objc.autorelease_pool():
+            input_url = NSURL.fileURLWithPath_(str(path))
+            return self._perform(Quartz.CIImage.imageWithContentsOfURL_(input_url))
+
+    def _perform(self, image: Quartz.CIImage) -> t.List[OCRResult]:
+        """process image with VNRecognizeTextRequest and return results
+
+        This code originally developed for https://github.com/RhetTbull/osxphotos
+        """
+        vision_options = NSDictionary.dictionaryWithDictionary_({})
+        if self.orientation is None:
+            vision_handler = (
+                Vision.VNImageRequestHandler.alloc().initWithCIImage_options_(
+                    image, vision_options
+                )
+            )
+        else:
+            vision_handler = Vision.VNImageRequestHandler.alloc().initWithCIImage_orientation_options_(
+                image, self.orientation, vision_options
+            )
+
+        success, error = vision_handler.performRequests_error_([self.request], None)
+        if not success:
+            raise ValueError(f"Vision request failed: {error}")
+
+        return to_results(self.request)
+
+
+def to_ci_image(image: np.ndarray) -> Quartz.CIImage:
+    """wrap a BGR or grayscale image array as CIImage without encoding it"""
+    if image.ndim == 2:
+        channels = 1
+        color_space = Quartz.CGColorSpaceCreateDeviceGray()
+    else:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        channels = 3
+        color_space = Quartz.CGColorSpaceCreateDeviceRGB()
+
+    height, width = image.shape[:2]
+    buffer = np.ascontiguousarray(image).tobytes()
+    provider = Quartz.CGDataProviderCreateWithCFData(
+        NSData.dataWithBytes_length_(buffer, len(buffer))
+    )
+    cg_image = Quartz.CGImageCreate(
+        width,
+        height,
+        8,  # bits per component
+        8 * channels,  # bits per pixel
+        width * channels,  # bytes per row
+        color_space,
+        Quartz.kCGImageAlphaNone,
+        provider,
+        None,
+        False,
+        Quartz.kCGRenderingIntentDefault,
+    )
+    return Quartz.CIImage.imageWithCGImage_(cg_image)
+
+
+def to_results(request: Vision.VNRecognizeTextRequest) -> t.List[OCRResult]:
+    """results of the last image the request was performed on"""
+    results = []
+    for observation in request.results() or []:
+        bbox = observation.boundingBox()
+        w, h = bbox.size.width, bbox.size.height
+        x, y = bbox.origin.x, bbox.origin.y
+
+        results.append(
+            OCRResult(
+                text=observation.text(),
+                confidence=observation.confidence(),
+                bbox=(x, y, w, h),
+            )
+        )
+
+    return results
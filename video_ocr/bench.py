@@ -0,0 +1,364 @@
+"""
+benchmarks of the frame extraction and ocr pipeline on synthetic videos.
+
+videos are rendered locally with cv2, so results are reproducible anywhere and can be
+tracked across releases from the JSON report of `run_benchmarks`.
+"""
+
+import importlib.util
+import platform
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+from serde.json import to_json
+
+from video_ocr.config import get_logger
+from video_ocr.decode import open_video
+from video_ocr.dedup import FrameDeduplicator
+from video_ocr.manifest import package_version
+from video_ocr.ocr import OCRResult, detect_text, get_backend
+from video_ocr.roi import RegionCropper
+from video_ocr.sampling import FrameSampler
+from video_ocr.shm import ChunkRef, FrameRing, read_chunk
+from video_ocr.video import Frame
+
+logger = get_logger(__name__)
+
+TEXTS = (
+    "The quick brown fox jumps over the lazy dog",
+    "Pack my box with five dozen liquor jugs",
+    "How vexingly quick daft zebras jump",
+    "Sphinx of black quartz, judge my vow",
+)
+BATCH_SIZES = (1, 4, 16)  # batch sizes ocr is benchmarked at
+# ways frames are sent to worker processes, see `bench_transport`
+TRANSPORTS = ("pickle", "shared_memory", "png")
+
+
+def make_synthetic_video(  # noqa: PLR0913
+    path: Path,
+    seconds: float = 10.0,
+    fps: int = 30,
+    width: int = 640,
+    height: int = 360,
+    scene_seconds: float = 2.0,
+    texts: t.Sequence[str] = TEXTS,
+) -> Path:
+    """render a video showing one of `texts` per scene, changing every `scene_seconds`"""
+    writer = cv2.VideoWriter(
+        str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height)
+    )
+    if not writer.isOpened():
+        raise ValueError(f"could not write video: {path}")
+
+    scale = height / 240
+    frames_per_scene = max(round(scene_seconds * fps), 1)
+
+    for index in range(round(seconds * fps)):
+        scene = index // frames_per_scene
+        text = texts[scene % len(texts)]
+
+        image = np.full((height, width, 3), 32 * (scene % 4), np.uint8)
+        (text_width, text_height), _ = cv2.getTextSize(
+            text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2
+        )
+        origin = ((width - text_width) // 2, (height + text_height) // 2)
+        cv2.putText(
+            image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), 2
+        )
+        writer.write(image)
+
+    writer.release()
+    return path
+
+
+@dataclass
+class StageResult:
+    frames: int  # frames processed by the stage
+    seconds: float
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.seconds if self.seconds else 0.0
+
+
+def bench_decode(video_file: Path, decoder: str = "cv2") -> StageResult:
+    """decode every frame into an image, the baseline of sampling"""
+    vid = open_video(video_file, decoder)
+    frames = 0
+
+    start = time.perf_counter()
+    while vid.grab():
+        vid.retrieve()
+        frames += 1
+    seconds = time.perf_counter() - start
+
+    vid.release()
+    return StageResult(frames, seconds)
+
+
+def bench_sampling(
+    video_file: Path, step: int, strategy: str = "auto"
+) -> t.Tuple[StageResult, t.List[np.ndarray]]:
+    """sample frames, frames of the result are the frames of the video walked through"""
+    start = time.perf_counter()
+    sampler = FrameSampler(video_file, step=step, strategy=strategy)
+    images = [frame.image for frame in sampler]
+    seconds = time.perf_counter() - start
+
+    return StageResult(sampler.stats.total_frames, seconds), images
+
+
+def bench_dedup(images: t.List[np.ndarray]) -> t.Tuple[StageResult, float]:
+    """check sampled frames for duplicates, also returns the skip ratio"""
+    deduplicator = FrameDeduplicator()
+
+    start = time.perf_counter()
+    for image in images:
+        deduplicator.is_duplicate(image)
+    seconds = time.perf_counter() - start
+
+    return StageResult(len(images), seconds), deduplicator.stats.skip_ratio
+
+
+def bench_ocr(
+    images: t.List[np.ndarray],
+    backend: str,
+    batch_size: int = 4,
+    cropper: t.Optional[RegionCropper] = None,
+) -> t.Tuple[StageResult, t.List[Frame]]:
+    """ocr images, cropping them to text regions first if cropper is given"""
+    engine = get_backend(backend)
+    frames = []
+
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch = images[i : i + batch_size]
+        if cropper:
+            patches, crops = cropper.crop(batch)
+            batch_results = cropper.merge(
+                engine.detect_batch(patches), crops, len(batch)
+            )
+        else:
+            batch_results = engine.detect_batch(batch)
+        for j, results in enumerate(batch_results):
+            frames.append(Frame(index=i + j, timestamp=0.0, results=results))
+    seconds = time.perf_counter() - start
+
+    return StageResult(len(images), seconds), frames
+
+
+def bench_ocr_per_call(images: t.List[np.ndarray], backend: str) -> StageResult:
+    """ocr images with `detect_text`, which sets up a backend for every image"""
+    start = time.perf_counter()
+    for image in images:
+        detect_text(image, backend=backend)
+    seconds = time.perf_counter() - start
+
+    return StageResult(len(images), seconds)
+
+
+def _read_pickled(images: t.List[np.ndarray]) -> t.List[int]:
+    # reads every pixel, as ocr would
+    return [int(image.max()) for image in images]
+
+
+def _read_shared(chunk: ChunkRef) -> t.List[int]:
+    return _read_pickled(read_chunk(chunk))
+
+
+def _read_png(paths: t.List[str]) -> t.List[int]:
+    return _read_pickled([cv2.imread(path, cv2.IMREAD_UNCHANGED) for path in paths])
+
+
+def bench_transport(  # noqa: PLR0913
+    images: t.List[np.ndarray],
+    transport: str,
+    workers: int = 2,
+    chunk_size: int = 4,
+    rounds: int = 5,
+) -> StageResult:
+    """send images to worker processes, which read every pixel of them, in chunks.
+
+    as in `BatchRunner`, at most twice as many chunks as workers are in flight.
+    transport is how images are sent: "pickle" through the pool, "shared_memory"
+    through a `FrameRing`, or "png" as files written to and read from disk.
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError(f"transport must be one of {TRANSPORTS}, got {transport}")
+
+    max_in_flight = 2 * workers
+    slot_bytes = max(
+        sum(image.nbytes for image in images[i : i + chunk_size]) * 2
+        for i in range(0, len(images), chunk_size)
+    )
+    ring = (
+        FrameRing(max_in_flight, slot_bytes) if transport == "shared_memory" else None
+    )
+    in_flight: t.Deque[t.Tuple[Future, t.Optional[int]]] = deque()
+
+    def collect() -> None:
+        future, slot = in_flight.popleft()
+        future.result()
+        if ring and slot is not None:
+            ring.release(slot)
+
+    try:
+        with tempfile.TemporaryDirectory() as td, ProcessPoolExecutor(workers) as pool:
+            # start the workers before timing
+            list(pool.map(abs, range(workers)))
+
+            start = time.perf_counter()
+            for r in range(rounds):
+                for i in range(0, len(images), chunk_size):
+                    chunk = images[i : i + chunk_size]
+                    if len(in_flight) >= max_in_flight:
+                        collect()
+
+                    if ring:
+                        ref = ring.put(chunk)
+                        in_flight.append((pool.submit(_read_shared, ref), ref.slot))
+                    elif transport == "png":
+                        paths = [f"{td}/{r}-{i + j}.png" for j in range(len(chunk))]
+                        for path, image in zip(paths, chunk):
+                            cv2.imwrite(path, image)
+                        in_flight.append((pool.submit(_read_png, paths), None))
+                    else:
+                        in_flight.append((pool.submit(_read_pickled, chunk), None))
+            while in_flight:
+                collect()
+            seconds = time.perf_counter() - start
+    finally:
+        if ring:
+            ring.close()
+
+    return StageResult(len(images) * rounds, seconds)
+
+
+def bench_serialization(frames: t.List[Frame]) -> StageResult:
+    start = time.perf_counter()
+    for frame in frames:
+        to_json(frame)
+    seconds = time.perf_counter() - start
+
+    return StageResult(len(frames), seconds)
+
+
+def measure_observation_bytes(count: int = 10_000) -> float:
+    """bytes of memory an ocr observation takes, as kept in a list of results"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = [
+            OCRResult(
+                text="text", confidence=i / count, bbox=(i / count, 0.1, 0.5, 0.1)
+            )
+            for i in range(count)
+        ]
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    return size / len(results)
+
+
+def run_benchmarks(  # noqa: PLR0913
+    video_file: t.Optional[Path] = None,
+    backend: str = "stub",
+    step: int = 10,
+    seconds: float = 10.0,
+    width: int = 640,
+    height: int = 360,
+    scene_seconds: float = 2.0,
+    batch_sizes: t.Sequence[int] = BATCH_SIZES,
+) -> t.Dict[str, t.Any]:
+    """benchmark each stage on video_file, or on a synthetic video rendered for the run.
+
+    ocr is also run at each of batch_sizes, with one backend for all batches.
+    """
+    params = {
+        "video_file": str(video_file) if video_file else None,
+        "backend": backend,
+        "step": step,
+        "seconds": seconds,
+        "width": width,
+        "height": height,
+        "scene_seconds": scene_seconds,
+        "batch_sizes": list(batch_sizes),
+    }
+
+    with tempfile.TemporaryDirectory() as td:
+        if video_file is None:
+            video_file = make_synthetic_video(
+                Path(td) / "synthetic.mp4",
+                seconds=seconds,
+                width=width,
+                height=height,
+                scene_seconds=scene_seconds,
+            )
+
+        logger.info(f"benchmarking {video_file}...")
+        decode = bench_decode(video_file)
+        decode_pyav = (
+            bench_decode(video_file, "pyav") if importlib.util.find_spec("av") else None
+        )
+        sampling, images = bench_sampling(video_file, step)
+        dedup, skip_ratio = bench_dedup(images)
+        ocr, frames = bench_ocr(images, backend)
+        ocr_auto_roi, _ = bench_ocr(images, backend, cropper=RegionCropper(auto=True))
+        ocr_per_call = bench_ocr_per_call(images, backend)
+        ocr_batches = {
+            size: bench_ocr(images, backend, batch_size=size)[0] for size in batch_sizes
+        }
+        serialization = bench_serialization(frames)
+        transport = {name: bench_transport(images, name) for name in TRANSPORTS}
+
+    stages = {
+        "decode": decode,
+        "decode_pyav": decode_pyav,
+        "sampling": sampling,
+        "dedup": dedup,
+        "ocr": ocr,
+        "ocr_auto_roi": ocr_auto_roi,
+        "ocr_per_call": ocr_per_call,
+        "serialization": serialization,
+    }
+
+    return {
+        "environment": {
+            "video-ocr": package_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+        },
+        "params": params,
+        "stages": {
+            name: {**asdict(result), "fps": result.fps}
+            for name, result in stages.items()
+            if result is not None
+        },
+        "ocr_batch_sizes": {
+            str(size): {**asdict(result), "fps": result.fps}
+            for size, result in ocr_batches.items()
+        },
+        # megabytes of frames sent to workers per second measure the memory bandwidth
+        "transport": {
+            name: {
+                **asdict(result),
+                "fps": result.fps,
+                "mb_per_s": result.fps * images[0].nbytes / 1024 / 1024,
+            }
+            for name, result in transport.items()
+        },
+        "dedup_skip_ratio": skip_ratio,
+        "observation_bytes": measure_observation_bytes(),
+    }
@@ -0,0 +1,209 @@
+"""
+persistent cache of ocr results, keyed by frame content, backend settings and the
+version of the engine.
+
+results are stored in a sqlite database under `user_dir()`, and the least recently
+used entries are evicted once the stored results exceed the size cap.
+"""
+
+import hashlib
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+
+import numpy as np
+from serde.json import from_json, to_json
+
+from video_ocr import user_dir
+from video_ocr.config import DEFAULT_MAX_BYTES, get_logger
+from video_ocr.metrics import metrics
+from video_ocr.ocr import OCRBackend, OCRResult, run_batch
+
+logger = get_logger(__name__)
+
+# sqlite limits the number of variables in a statement
+_CHUNK_SIZE = 500
+
+
+def cache_path() -> Path:
+    return user_dir() / "ocr-cache.sqlite"
+
+
+def engine_key(engine: OCRBackend) -> str:
+    """settings and version of a backend, which its results depend on"""
+    return f"{engine.settings_key()}:{engine.engine_version()}"
+
+
+def frame_key(image: np.ndarray, settings: str) -> str:
+    """hash of the frame content and backend settings, see `engine_key`"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}{image.dtype}{settings}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """Cache of ocr results stored in sqlite.
+
+    Args:
+        path: path of the database, defaults to `cache_path()`
+        max_bytes: size cap of stored results, least recently used ones are evicted beyond it
+    """
+
+    def __init__(
+        self, path: t.Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.path = path or cache_path()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+        )
+        self.conn.commit()
+        # bytes of stored results, kept up to date by puts and evictions instead of
+        # summing the table after each put
+        self.stored = self.size()
+
+    def get_many(self, keys: t.List[str]) -> t.List[t.Optional[t.List[OCRResult]]]:
+        """results for each key, None for keys not in the cache"""
+        with metrics.stage("cache"):
+            return self._get_many(keys)
+
+    def _get_many(self, keys: t.List[str]) -> t.List[t.Optional[t.List[OCRResult]]]:
+        found: t.Dict[str, str] = {}
+        for start in range(0, len(keys), _CHUNK_SIZE):
+            chunk = keys[start : start + _CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(
+                self.conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({placeholders})",
+                    chunk,
+                )
+            )
+
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE results SET accessed = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self.conn.commit()
+
+        self.hits += sum(key in found for key in keys)
+        self.misses += sum(key not in found for key in keys)
+        metrics.incr("frames_cached", len(found))
+
+        return [
+            from_json(t.List[OCRResult], found[key]) if key in found else None
+            for key in keys
+        ]
+
+    def put_many(self, items: t.List[t.Tuple[str, t.List[OCRResult]]]) -> None:
+        with metrics.stage("cache"):
+            self._put_many(items)
+
+    def _put_many(self, items: t.List[t.Tuple[str, t.List[OCRResult]]]) -> None:
+        now = time.time()
+        rows = []
+        for key, results in items:
+            value = to_json(results)
+            rows.append((key, value, len(value), now))
+
+        replaced = self._stored_size([key for key, *_ in rows])
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.commit()
+
+        self.stored += sum(size for _, _, size, _ in rows) - replaced
+        if self.stored > self.max_bytes:
+            self.evict()
+
+    def _stored_size(self, keys: t.List[str]) -> int:
+        """bytes of the stored results of keys"""
+        size = 0
+        for start in range(0, len(keys), _CHUNK_SIZE):
+            chunk = keys[start : start + _CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            size += self.conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM results WHERE key IN ({placeholders})",
+                chunk,
+            ).fetchone()[0]
+        return size
+
+    def size(self) -> int:
+        """bytes of stored results"""
+        return self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+
+    def evict(self) -> None:
+        """delete least recently used results until the cache fits in max_bytes"""
+        # other processes may share the database, so the size is counted again
+        self.stored = self.size()
+        excess = self.stored - self.max_bytes
+        if excess <= 0:
+            return
+
+        keys = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM results ORDER BY accessed"
+        ):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+            self.stored -= size
+
+        self.conn.executemany("DELETE FROM results WHERE key = ?", keys)
+        self.conn.commit()
+        self.evicted += len(keys)
+
+    def detect_batch(
+        self, engine: OCRBackend, images: t.Sequence[np.ndarray]
+    ) -> t.List[t.List[OCRResult]]:
+        """`engine.detect_batch` that only runs ocr on images not in the cache"""
+        settings = engine_key(engine)
+        keys = [frame_key(image, settings) for image in images]
+        results = self.get_many(keys)
+
+        missing = [i for i, found in enumerate(results) if found is None]
+        if missing:
+            detected = run_batch(engine, [images[i] for i in missing])
+            for i, found in zip(missing, detected):
+                results[i] = found
+            self.put_many(
+                [
+                    (keys[i], detected_results)
+                    for i, detected_results in zip(missing, detected)
+                ]
+            )
+
+        return t.cast(t.List[t.List[OCRResult]], results)
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"ocr cache: {self.hits} hits, {self.misses} misses, {self.evicted} evicted."
+        )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,107 @@
+"""
+append-only checkpoint of ocr results, so an interrupted run can resume.
+
+a checkpoint is a JSON Lines file. the first line holds the settings the results were
+made with, and every following line is a `Frame`, flushed as soon as its ocr finishes.
+frames without text are written too, so a resumed run does not send them to ocr again.
+"""
+
+import json
+import typing as t
+from pathlib import Path
+
+from serde.json import from_json, to_json
+
+from video_ocr.config import get_logger
+
+if t.TYPE_CHECKING:
+    from video_ocr.video import Frame
+
+logger = get_logger(__name__)
+
+VERSION = 1
+
+
+class Checkpoint:
+    """Checkpoint file of a video.
+
+    Args:
+        path: path of the JSON Lines file
+        settings: settings of the run. results made with other settings are discarded
+    """
+
+    def __init__(self, path: Path, settings: t.Dict[str, t.Any]):
+        self.path = path
+        self.settings = settings
+        self._file: t.Optional[t.TextIO] = None
+
+    def _header(self) -> str:
+        return json.dumps({"version": VERSION, "settings": self.settings})
+
+    def open(self, resume: bool = True) -> t.Set[int]:
+        """open the checkpoint for appending, returns indices of frames already done.
+
+        the checkpoint is started over if resume is False or its settings differ.
+        a line cut off by a crash is dropped, and so are a corrupt line and the lines
+        after it.
+        """
+        done: t.Set[int] = set()
+        valid_bytes = 0
+
+        if resume and self.path.exists():
+            with open(self.path, "rb") as f:
+                header = f.readline()
+                if header.rstrip(b"\n") == self._header().encode() and header.endswith(
+                    b"\n"
+                ):
+                    valid_bytes = len(header)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            index = json.loads(line)["index"]
+                        except (ValueError, KeyError, TypeError) as e:
+                            logger.warning(
+                                f"dropping the corrupt end of {self.path} at byte "
+                                f"{valid_bytes}: {e!r}"
+                            )
+                            break
+                        done.add(index)
+                        valid_bytes += len(line)
+                else:
+                    logger.info(f"settings of {self.path} changed, starting over.")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if valid_bytes:
+            logger.info(f"resuming from {self.path} with {len(done)} frames done.")
+            self._file = open(self.path, "r+")
+            self._file.truncate(valid_bytes)
+            self._file.seek(valid_bytes)
+        else:
+            self._file = open(self.path, "w")
+            self._file.write(self._header() + "\n")
+            self._file.flush()
+
+        return done
+
+    def append(self, frame: "Frame") -> None:
+        if self._file is None:
+            raise ValueError("checkpoint is not open")
+
+        self._file.write(to_json(frame) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def iter_frames(self) -> t.Iterator["Frame"]:
+        """stream frames from the checkpoint, in the order they were written"""
+        from video_ocr.video import Frame
+
+        with open(self.path) as f:
+            f.readline()  # header
+            for line in f:
+                if line.endswith("\n"):
+                    yield from_json(Frame, line)
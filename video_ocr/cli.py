@@ -1,11 +1,38 @@
+import collections
+import contextlib
+import importlib.util
 import json
+import typing as t
+from dataclasses import asdict
 from pathlib import Path
 
 import click
 
 from video_ocr import key_path
-from video_ocr.playlist import Playlist
-from video_ocr.video import Video
+from video_ocr.backends import available_backends, default_backend
+from video_ocr.config import (
+    DECODERS,
+    DEFAULT_LEASE,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_PORT,
+    DEFAULT_TEXT_THRESHOLD,
+    DEFAULT_THRESHOLD,
+    DEFAULT_TTL,
+    FORMATS,
+    IOU_THRESHOLD,
+    MAX_ATTEMPTS,
+    MAX_GAP,
+    SIMILARITY,
+    STRATEGIES,
+)
+from video_ocr.index import SearchIndex
+from video_ocr.metrics import PROFILERS, profiling, recording
+
+# modules that import numpy, cv2, serde or pytube are imported in the commands that
+# use them, so the cli, e.g. `--help` and `key`, starts without loading them
+if t.TYPE_CHECKING:
+    from video_ocr.cache import OCRCache
+    from video_ocr.video import Video
 
 
 @click.group()
@@ -50,12 +77,12 @@ def youtube():
 
 
 @youtube.command(name="playlist")
-@click.argument("playlist_id", required=True, type=str)
+@click.argument("playlist_ids", nargs=-1, required=True, type=str)
 @click.option(
     "-n",
     "--name",
     type=str,
-    help="Specify the file name",
+    help="Specify the file name, only for a single playlist",
 )
 @click.option(
     "-d",
@@ -70,30 +97,66 @@ def youtube():
     default=False,
     help="Overwrite the file if it already exists",
 )
-def write_playlist(playlist_id, name, directory, force):
-    """Write a playlist to a json file"""
-    if not name:
-        name = f"playlist-{playlist_id}.json"
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="Revalidate cached pages of the playlists, even if they are fresh",
+)
+@click.option(
+    "--ttl",
+    default=DEFAULT_TTL,
+    type=click.FloatRange(min=0),
+    help="Seconds a cached page of a playlist is used without revalidating it",
+)
+def write_playlist(playlist_ids, name, directory, force, refresh, ttl):  # noqa: PLR0913
+    """Write playlists to json files
+
+    Playlists are fetched at once, and their pages are cached, so only pages that
+    changed are downloaded again.
+    """
+    from video_ocr.fetch import PlaylistFetcher
+    from video_ocr.playlist import Playlist
+
+    if name and len(playlist_ids) > 1:
+        raise click.UsageError("--name can only be used with a single playlist")
 
     if not directory:
         directory = "."
 
-    output_path = Path(directory) / name
-
-    if output_path.exists() and not force:
-        click.echo(f"{output_path} already exists. Use -f to overwrite")
+    output_paths = {
+        playlist_id: Path(directory) / (name or f"playlist-{playlist_id}.json")
+        for playlist_id in playlist_ids
+    }
+    for output_path in output_paths.values():
+        if output_path.exists() and not force:
+            click.echo(f"{output_path} already exists. Use -f to overwrite")
+    output_paths = {
+        playlist_id: output_path
+        for playlist_id, output_path in output_paths.items()
+        if force or not output_path.exists()
+    }
+    if not output_paths:
         return
 
-    playlist = Playlist(playlist_id)
-    playlist.get_playlist()
+    fetcher = PlaylistFetcher(ttl=ttl)
+    try:
+        playlists = Playlist.get_playlists(output_paths, fetcher, refresh=refresh)
+    finally:
+        fetcher.close()
 
-    playlist.to_json(output_path)
+    for playlist in playlists:
+        playlist.to_json(output_paths[playlist.playlist_id])
+    if len(playlists) < len(output_paths):
+        raise click.ClickException("could not get some of the playlists")
 
 
 @youtube.command(name="ls")
 @click.argument("video_id", required=True, type=str)
 def get_resolutions(video_id):
     """Get resolutions for a video"""
+    from video_ocr.video import Video
+
     resolutions = Video.get_resolutions(video_id)
     for resolution in resolutions:
         click.echo(resolution)
@@ -129,6 +192,8 @@ def get_resolutions(video_id):
 )
 def download_video(video_id, name, directory, force, resolution):
     """Download a video"""
+    from video_ocr.video import Video
+
     if not name:
         name = f"{video_id}.{resolution}.mp4"
 
@@ -145,6 +210,426 @@ def download_video(video_id, name, directory, force, resolution):
     video.download_video(video_id, resolution=resolution)
 
 
+def sampling_options(f):
+    """options of how frames are sampled from a video"""
+    options = [
+        click.option(
+            "--frame-rate",
+            "-fr",
+            default=100,
+            type=int,
+            help="Number of frames per second to extract from the video",
+        ),
+        click.option(
+            "--interval",
+            "-i",
+            type=float,
+            help="Extract one frame every N seconds, overrides --frame-rate",
+        ),
+        click.option(
+            "--sampling",
+            default="auto",
+            type=click.Choice(STRATEGIES),
+            help="How to skip frames: grab every frame, seek to each sampled frame, choose between them automatically, or sample densely around scene changes (adaptive)",
+        ),
+        click.option(
+            "--min-interval",
+            default=0.25,
+            type=click.FloatRange(min=0, min_open=True),
+            help="Shortest interval in seconds between frames for --sampling adaptive",
+        ),
+        click.option(
+            "--max-interval",
+            default=4.0,
+            type=click.FloatRange(min=0, min_open=True),
+            help="Longest interval in seconds between frames for --sampling adaptive",
+        ),
+        click.option(
+            "--scene-threshold",
+            default=DEFAULT_THRESHOLD,
+            type=click.IntRange(min=0),
+            help="Number of changed pixels in a downscaled frame not treated as a scene change, for --sampling adaptive",
+        ),
+        click.option(
+            "--decoder",
+            default="cv2",
+            type=click.Choice(DECODERS),
+            help="Video decoder. pyav decodes on all cores and reports exact timestamps of variable frame rate videos, needs PyAV",
+        ),
+        click.option(
+            "--gray",
+            is_flag=True,
+            default=False,
+            help="Decode frames to grayscale, if the OCR backend accepts it",
+        ),
+        click.option(
+            "--decode-width",
+            type=click.IntRange(min=1),
+            help="Decode frames downscaled to this width",
+        ),
+        click.option(
+            "--decode-processes",
+            default=1,
+            type=click.IntRange(min=1),
+            help="Number of processes decoding segments of a video at once, not used with --sampling adaptive",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def parse_roi(ctx, param, value):
+    from video_ocr.roi import parse_region
+
+    if "auto" in value:
+        if len(value) > 1:
+            raise click.BadParameter("auto can not be combined with regions")
+        return "auto"
+
+    try:
+        return [parse_region(v) for v in value]
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+def ocr_options(f):
+    """options of how sampled frames are sent to ocr"""
+    options = [
+        click.option(
+            "--backend",
+            "-b",
+            type=click.Choice(available_backends()),
+            help="OCR backend, defaults to vision on macOS and tesseract elsewhere",
+        ),
+        click.option(
+            "--batch-size",
+            default=4,
+            type=click.IntRange(min=1),
+            help="Number of frames passed to the OCR backend at once",
+        ),
+        click.option(
+            "--dedup/--no-dedup",
+            default=True,
+            help="Reuse OCR results of the previous frame for frames that look the same",
+        ),
+        click.option(
+            "--dedup-threshold",
+            default=DEFAULT_THRESHOLD,
+            type=click.IntRange(min=0),
+            help="Number of changed pixels in a downscaled frame still treated as the same frame",
+        ),
+        click.option(
+            "--prefilter/--no-prefilter",
+            default=False,
+            help="Skip OCR on frames a fast check finds no text in. Check how much text it misses with `video-ocr calibrate`",
+        ),
+        click.option(
+            "--text-threshold",
+            default=DEFAULT_TEXT_THRESHOLD,
+            type=click.FloatRange(min=0),
+            help="Lowest text score of frames sent to OCR with --prefilter, higher skips more frames and misses more text",
+        ),
+        click.option(
+            "--resume/--no-resume",
+            default=True,
+            help="Skip frames already in the checkpoint (video.jsonl) of an interrupted run with the same settings",
+        ),
+        click.option(
+            "--roi",
+            multiple=True,
+            callback=parse_roi,
+            help="Only send this region of frames to OCR, as x,y,w,h normalized to 0-1 from the top-left, e.g. 0,0.8,1,0.2 for a subtitle band. Repeat for more regions, or use auto to detect text regions of each frame",
+        ),
+        click.option(
+            "--roi-scale",
+            default=1.0,
+            type=click.FloatRange(min=0, max=1, min_open=True),
+            help="Downscale regions sent to OCR by this factor",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def cache_options(f):
+    """options of the cache of ocr results"""
+    options = [
+        click.option(
+            "--cache/--no-cache",
+            default=True,
+            help="Reuse OCR results of identical frames from previous runs, stored in the user directory",
+        ),
+        click.option(
+            "--cache-size",
+            default=DEFAULT_MAX_BYTES // 1024 // 1024,
+            type=click.IntRange(min=1),
+            help="Size cap of the OCR cache in MB, least recently used results are evicted beyond it",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def metrics_options(f):
+    """options of how a run is measured"""
+    options = [
+        click.option(
+            "--metrics-out",
+            type=click.Path(dir_okay=False, writable=True),
+            help="Write per-stage timings, frame counters and peak memory to this JSON file",
+        ),
+        click.option(
+            "--profile",
+            type=click.Path(dir_okay=False, writable=True),
+            help="Profile the run and write the result to this file",
+        ),
+        click.option(
+            "--profiler",
+            default="cprofile",
+            type=click.Choice(PROFILERS),
+            help="Profiler used with --profile: cprofile writes pstats data, pyinstrument an html report",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+@contextlib.contextmanager
+def measured(**options) -> t.Iterator[None]:
+    """record metrics and profile the block, as set by the values of `metrics_options`"""
+    with recording(
+        Path(options["metrics_out"]) if options["metrics_out"] else None
+    ), profiling(
+        Path(options["profile"]) if options["profile"] else None,
+        options["profiler"],
+    ):
+        yield
+
+
+def output_options(f):
+    """options of which files are written"""
+    options = [
+        click.option(
+            "--parquet",
+            is_flag=True,
+            default=False,
+            help="Also write one row per text observation to video.parquet, needs pyarrow",
+        ),
+        click.option(
+            "--tracks",
+            is_flag=True,
+            default=False,
+            help="Also write text tracks, observations linked across frames, to video.tracks.json",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def check_outputs(**options) -> None:
+    """raise if the files of `output_options` can not be written, before any ocr"""
+    if options["parquet"] and importlib.util.find_spec("pyarrow") is None:
+        raise click.UsageError(
+            "--parquet needs pyarrow, install it with `pip install video-ocr[parquet]`"
+        )
+
+
+def check_sampling(**options) -> None:
+    """raise if the values of `sampling_options` do not fit together"""
+    if options["min_interval"] > options["max_interval"]:
+        raise click.BadParameter(
+            "must not be shorter than --min-interval", param_hint="--max-interval"
+        )
+
+
+def sampling_settings(**options) -> t.Dict[str, t.Any]:
+    """fields of a Video from the values of `sampling_options`"""
+    check_sampling(**options)
+    return {
+        "frame_rate": options["frame_rate"],
+        "interval": options["interval"],
+        "sampling": options["sampling"],
+        "min_interval": options["min_interval"],
+        "max_interval": options["max_interval"],
+        "scene_threshold": options["scene_threshold"],
+        "decoder": options["decoder"],
+        "gray": options["gray"],
+        "decode_width": options["decode_width"],
+        "decode_processes": options["decode_processes"],
+    }
+
+
+def video_settings(**options) -> t.Dict[str, t.Any]:
+    """fields of a Video from the values of `sampling_options` and `ocr_options`"""
+    return {
+        **sampling_settings(**options),
+        "backend": options["backend"] or default_backend(),
+        "dedup_threshold": options["dedup_threshold"] if options["dedup"] else None,
+        "text_threshold": options["text_threshold"] if options["prefilter"] else None,
+        "roi": None if options["roi"] == "auto" else options["roi"] or None,
+        "auto_roi": options["roi"] == "auto",
+        "roi_scale": options["roi_scale"],
+    }
+
+
+def make_video(input_video, output_file, **options) -> "Video":
+    """create a Video from the values of `sampling_options` and `ocr_options`"""
+    from video_ocr.video import Video
+
+    return Video(
+        output_file=Path(output_file),
+        video_file=Path(input_video),
+        **video_settings(**options),
+        # output files are written from the checkpoint, so frames are not kept
+        keep_frames=False,
+    )
+
+
+def make_cache(**options) -> t.Optional["OCRCache"]:
+    from video_ocr.cache import OCRCache
+
+    if not options["cache"]:
+        return None
+    return OCRCache(max_bytes=options["cache_size"] * 1024 * 1024)
+
+
+@youtube.command(name="playlist-run")
+@click.argument("playlist", required=True, type=str)
+@click.option(
+    "--directory",
+    "-d",
+    default=".",
+    type=click.Path(file_okay=False, writable=True),
+    help="Directory to save videos and output files to, each video to <directory>/<video id>/",
+)
+@click.option(
+    "--source",
+    type=click.Path(exists=True, file_okay=False),
+    help="Copy videos from files named <video id>.mp4 in this directory instead of downloading them",
+)
+@click.option(
+    "--resolution",
+    "--res",
+    default="worst",
+    type=str,
+    help="Resolution of the videos to download. worst/best or a itag",
+)
+@click.option(
+    "--download-workers",
+    default=4,
+    type=click.IntRange(min=1),
+    help="Number of videos downloaded at once",
+)
+@click.option(
+    "--decode-workers",
+    default=2,
+    type=click.IntRange(min=1),
+    help="Number of videos decoded at once",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    help="Number of OCR worker processes, defaults to the number of CPUs",
+)
+@click.option(
+    "-f",
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Run OCR and write output files even if their inputs did not change since the last run",
+)
+@click.option(
+    "--keep-videos/--no-keep-videos",
+    default=True,
+    help="Keep downloaded videos after their OCR finished",
+)
+@click.option(
+    "--shared-memory",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Send frames to OCR workers through slots of shared memory of this many MB, one per chunk in flight, instead of pickling them. 0 pickles frames",
+)
+@sampling_options
+@ocr_options
+@cache_options
+@output_options
+@metrics_options
+def playlist_run(  # noqa: PLR0913
+    playlist,
+    directory,
+    source,
+    resolution,
+    download_workers,
+    decode_workers,
+    workers,
+    force,
+    keep_videos,
+    shared_memory,
+    **options,
+):
+    """Download the videos of a playlist and write ocr json files of them
+
+    PLAYLIST is a playlist id, or a json file written by `video-ocr youtube playlist`.
+    Videos whose inputs did not change since they last finished are skipped, see
+    `video-ocr run`.
+    """
+    from video_ocr.execute import BatchRunner
+    from video_ocr.pipeline import (
+        DirectoryDownloader,
+        PlaylistRunner,
+        YouTubeDownloader,
+    )
+    from video_ocr.playlist import Playlist
+
+    check_sampling(**options)
+    check_outputs(**options)
+    if Path(playlist).is_file():
+        video_ids = Playlist.from_json(Path(playlist)).to_video_ids()
+    else:
+        p = Playlist(playlist)
+        if p.get_playlist() is None:
+            raise click.ClickException(f"could not get playlist {playlist}")
+        video_ids = p.to_video_ids()
+
+    with measured(**options):
+        cache = make_cache(**options)
+        runner = PlaylistRunner(
+            BatchRunner(
+                backend=options["backend"] or default_backend(),
+                workers=workers,
+                chunk_size=options["batch_size"],
+                cache=cache,
+                resume=options["resume"],
+                decode_workers=decode_workers,
+                slot_bytes=shared_memory * 1024 * 1024,
+            ),
+            DirectoryDownloader(Path(source))
+            if source
+            else YouTubeDownloader(resolution),
+            Path(directory),
+            lambda video_file, output_file: make_video(
+                video_file, output_file, **options
+            ),
+            download_workers=download_workers,
+            force=force,
+            keep_videos=keep_videos,
+            parquet=options["parquet"],
+            tracks=options["tracks"],
+        )
+        try:
+            for _ in runner.run(video_ids):
+                pass
+        finally:
+            if cache:
+                cache.close()
+
+
 @cli.command(name="run")
 @click.argument(
     "input_video", required=True, type=click.Path(dir_okay=False, writable=True)
@@ -160,28 +645,647 @@ def download_video(video_id, name, directory, force, resolution):
     "--frames-dir",
     "-fd",
     type=click.Path(file_okay=False, writable=True),
-    help="Directory to store frames",
+    help="Directory to store frames, only used with --save-frames",
 )
 @click.option(
-    "--frame-rate",
-    "-fr",
-    default=100,
-    type=int,
-    help="Number of frames per second to extract from the video",
+    "--save-frames",
+    is_flag=True,
+    default=False,
+    help="Also write sampled frames as png files to --frames-dir, for debugging",
 )
-def run_ocr(input_video, directory, frames_dir, frame_rate):
-    """Write a ocr json file from a video file"""
+@click.option(
+    "-f",
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Run OCR and write output files even if their inputs did not change since the last run",
+)
+@sampling_options
+@ocr_options
+@cache_options
+@output_options
+@metrics_options
+def run_ocr(input_video, directory, frames_dir, save_frames, force, **options):  # noqa: PLR0913
+    """Write a ocr json file from a video file
+
+    Steps whose inputs, the video file, settings and OCR backend, did not change
+    since they last finished are skipped, see video.manifest.json.
+    """
+    from video_ocr.manifest import VideoStages
+    from video_ocr.ocr import get_backend
+
+    check_outputs(**options)
     output_file = Path(directory) / "video.json"
 
-    if not frames_dir:
+    if save_frames and not frames_dir:
         frames_dir = Path(directory) / ".frames"
 
-    video = Video(
-        output_file=Path(output_file),
-        video_file=Path(input_video),
-        frames_dir=Path(frames_dir),
-        frame_rate=frame_rate,
+    video = make_video(input_video, output_file, **options)
+    video.frames_dir = Path(frames_dir) if frames_dir else None
+    video.save_frames = save_frames
+
+    with measured(**options), get_backend(video.backend, languages=["ja"]) as engine:
+        # frames are only saved by ocr
+        stages = VideoStages(video, engine, force=force or save_frames)
+        if stages.needs_ocr():
+            cache = make_cache(**options)
+            try:
+                video.run_ocr(
+                    batch_size=options["batch_size"],
+                    cache=cache,
+                    resume=options["resume"],
+                    engine=engine,
+                )
+            finally:
+                if cache:
+                    cache.close()
+            stages.ocr_done()
+        stages.write(parquet=options["parquet"], tracks=options["tracks"])
+
+
+@cli.command(name="batch")
+@click.argument(
+    "input_videos",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option(
+    "--directory",
+    "-d",
+    default=".",
+    type=click.Path(file_okay=False, writable=True),
+    help="Directory to save the output files, each video is saved to <directory>/<video name>/video.json",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    help="Number of OCR worker processes, defaults to the number of CPUs",
+)
+@click.option(
+    "--decode-workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of videos decoded at once",
+)
+@click.option(
+    "-f",
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Run OCR and write output files even if their inputs did not change since the last run",
+)
+@click.option(
+    "--shared-memory",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Send frames to OCR workers through slots of shared memory of this many MB, one per chunk in flight, instead of pickling them. 0 pickles frames",
+)
+@sampling_options
+@ocr_options
+@cache_options
+@output_options
+@metrics_options
+def run_batch(  # noqa: PLR0913
+    input_videos, directory, workers, decode_workers, force, shared_memory, **options
+):
+    """Write ocr json files from many video files, with a pool of OCR processes
+
+    Videos whose inputs did not change since they last finished are skipped, see
+    `video-ocr run`.
+    """
+    from video_ocr.execute import BatchRunner
+    from video_ocr.manifest import VideoStages
+    from video_ocr.ocr import get_backend
+
+    check_sampling(**options)
+    check_outputs(**options)
+    # each video is written to a directory of its name, which must be unique
+    input_videos = list({Path(v).resolve(): v for v in input_videos}.values())
+    names = collections.Counter(Path(v).stem for v in input_videos)
+    duplicates = sorted(name for name, count in names.items() if count > 1)
+    if duplicates:
+        raise click.UsageError(
+            f"videos of the same name would overwrite each other's output: "
+            f"{', '.join(duplicates)}. Run them with separate --directory."
+        )
+
+    backend = options["backend"] or default_backend()
+    engine = get_backend(backend, languages=["ja"])
+    # stages of videos sent to ocr, by output file
+    stages: t.Dict[Path, VideoStages] = {}
+
+    def iter_videos():
+        for input_video in input_videos:
+            output_file = Path(directory) / Path(input_video).stem / "video.json"
+            video = make_video(input_video, output_file, **options)
+
+            video_stages = VideoStages(video, engine, force=force)
+            if video_stages.needs_ocr():
+                stages[output_file] = video_stages
+                yield video
+            else:
+                video_stages.write(parquet=options["parquet"], tracks=options["tracks"])
+
+    with measured(**options):
+        cache = make_cache(**options)
+        runner = BatchRunner(
+            backend=backend,
+            workers=workers,
+            chunk_size=options["batch_size"],
+            cache=cache,
+            resume=options["resume"],
+            decode_workers=decode_workers,
+            slot_bytes=shared_memory * 1024 * 1024,
+        )
+        try:
+            for video in runner.run(iter_videos()):
+                video_stages = stages.pop(video.output_file)
+                video_stages.ocr_done()
+                video_stages.write(parquet=options["parquet"], tracks=options["tracks"])
+        finally:
+            if cache:
+                cache.close()
+
+
+def queue_output(
+    directory: Path,
+    video_file: Path,
+    tasks: t.Dict[str, t.Dict[str, t.Any]],
+    outputs: t.Dict[str, str],
+) -> Path:
+    """output file of a video added to a queue, <directory>/<video name>/video.json.
+
+    a video queued before keeps its output file. if another video of the same name
+    has the output file, the name is followed by a hash of the path of the video.
+
+    Args:
+        directory: directory of output files
+        video_file: resolved path of the video
+        tasks: payloads of tasks in the queue, by key
+        outputs: keys of tasks by their output file
+    """
+    import hashlib
+
+    key = str(video_file)
+    if key in tasks:
+        previous = Path(tasks[key]["output_file"])
+        if previous.parent.parent == directory:
+            return previous
+
+    output_file = directory / video_file.stem / "video.json"
+    if outputs.get(str(output_file), key) == key:
+        return output_file
+
+    digest = hashlib.blake2b(key.encode(), digest_size=4).hexdigest()
+    unique = directory / f"{video_file.stem}-{digest}" / "video.json"
+    click.echo(
+        f"{output_file} is the output file of {outputs[str(output_file)]}, "
+        f"writing {video_file} to {unique}"
+    )
+    return unique
+
+
+@cli.command(name="serve-queue")
+@click.argument(
+    "input_videos",
+    nargs=-1,
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option(
+    "--directory",
+    "-d",
+    default=".",
+    type=click.Path(file_okay=False, writable=True),
+    help="Directory to save the output files, each video is saved to <directory>/<video name>/video.json",
+)
+@click.option(
+    "--queue-file",
+    type=click.Path(dir_okay=False, writable=True),
+    help="SQLite file of the queue, defaults to <directory>/queue.sqlite",
+)
+@click.option(
+    "--host",
+    default="127.0.0.1",
+    type=str,
+    help="Address to serve the queue on, 0.0.0.0 to accept workers on other machines",
+)
+@click.option(
+    "--port",
+    default=DEFAULT_PORT,
+    type=click.IntRange(min=0, max=65535),
+    help="Port to serve the queue on",
+)
+@click.option(
+    "--serve/--no-serve",
+    default=True,
+    help="Serve the queue until all its tasks finished, or only add tasks for workers reading --queue-file directly",
+)
+@click.option(
+    "--max-attempts",
+    default=MAX_ATTEMPTS,
+    type=click.IntRange(min=1),
+    help="Number of times a video is tried, counting workers that stopped sending heartbeats, before it is failed",
+)
+@click.option(
+    "--retry-failed",
+    is_flag=True,
+    default=False,
+    help="Try failed videos of the queue again",
+)
+@click.option(
+    "-f",
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Add videos that already have an output file or are queued, and run every step of them again",
+)
+@sampling_options
+@ocr_options
+@output_options
+def serve_queue(  # noqa: PLR0913
+    input_videos,
+    directory,
+    queue_file,
+    host,
+    port,
+    serve,
+    max_attempts,
+    retry_failed,
+    force,
+    **options,
+):
+    """Add ocr of video files to a queue and serve it to `video-ocr worker`s
+
+    Each video is a task, which workers lease and renew while they run it. Tasks of
+    workers that stopped are retried, resuming from the checkpoint of the video.
+    Workers need the video files and --directory at the same paths, e.g. on a shared
+    filesystem. Videos still queued are not added again, and videos done or failed
+    are queued again with the current options.
+    """
+    from video_ocr.workqueue import QueueServer, VideoTask, WorkQueue
+
+    queue = WorkQueue(
+        Path(queue_file) if queue_file else Path(directory) / "queue.sqlite"
+    )
+    try:
+        # tasks are keyed by video file, their output files must be unique too
+        tasks = queue.payloads()
+        outputs = {task["output_file"]: key for key, task in tasks.items()}
+        added = 0
+        for video_file in dict.fromkeys(Path(v).resolve() for v in input_videos):
+            key = str(video_file)
+            output_file = queue_output(
+                Path(directory).resolve(), video_file, tasks, outputs
+            )
+            outputs[str(output_file)] = key
+
+            if output_file.exists() and not force:
+                click.echo(f"{output_file} already exists. Use -f to overwrite")
+                continue
+
+            task = VideoTask(
+                video_file=str(video_file),
+                output_file=str(output_file),
+                fields=video_settings(**options),
+                batch_size=options["batch_size"],
+                resume=options["resume"],
+                parquet=options["parquet"],
+                tracks=options["tracks"],
+                force=force,
+            )
+            if queue.put(key, asdict(task), max_attempts, replace=force):
+                added += 1
+            else:
+                click.echo(f"{video_file} is already queued. Use -f to replace it")
+        if retry_failed:
+            queue.retry_failed()
+        click.echo(f"added {added} videos to {queue.path}")
+
+        if serve:
+            stats = QueueServer(queue, host, port).serve_until_done()
+            click.echo(f"{stats['done']} videos done, {stats['failed']} failed")
+            for key, error in queue.errors().items():
+                click.echo(f"failed {key}: {error}")
+    finally:
+        queue.close()
+
+
+@cli.command(name="worker")
+@click.argument("queue", required=True, type=str)
+@click.option(
+    "--workers",
+    "-w",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes, e.g. one per CPU",
+)
+@click.option(
+    "--lease",
+    default=DEFAULT_LEASE,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds a video stays leased to a worker that stopped sending heartbeats, before it is retried",
+)
+@cache_options
+@metrics_options
+def queue_worker(queue, workers, lease, **options):
+    """Run ocr on videos of a queue until it is empty
+
+    QUEUE is the url of `video-ocr serve-queue`, e.g. http://coordinator:8765, or
+    the path of its --queue-file on this machine.
+    """
+    from video_ocr.workqueue import run_workers
+
+    with measured(**options):
+        done = run_workers(
+            queue,
+            workers,
+            cache_bytes=options["cache_size"] * 1024 * 1024
+            if options["cache"]
+            else None,
+            lease_seconds=lease,
+        )
+    click.echo(f"finished {done} videos")
+
+
+@cli.command(name="calibrate")
+@click.argument(
+    "input_video", required=True, type=click.Path(exists=True, dir_okay=False)
+)
+@click.option(
+    "--backend",
+    "-b",
+    type=click.Choice(available_backends()),
+    help="OCR backend finding which frames have text, defaults to vision on macOS and tesseract elsewhere",
+)
+@click.option(
+    "--batch-size",
+    default=4,
+    type=click.IntRange(min=1),
+    help="Number of frames passed to the OCR backend at once",
+)
+@click.option(
+    "--threshold",
+    "thresholds",
+    multiple=True,
+    type=click.FloatRange(min=0),
+    help="Text threshold to measure, may be repeated, defaults to a range of them",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the results to this file instead of stdout",
+)
+@sampling_options
+def calibrate(input_video, backend, batch_size, thresholds, output, **options):  # noqa: PLR0913
+    """Measure how many frames with text --prefilter misses at each --text-threshold
+
+    Every sampled frame of INPUT_VIDEO is scored by the prefilter and run through
+    full OCR, and for each threshold, the precision and recall of frames with text
+    and the ratio of frames skipped are written as json.
+    """
+    from video_ocr.ocr import get_backend
+    from video_ocr.prefilter import THRESHOLDS, calibrate, score_frames
+    from video_ocr.video import Video
+
+    video = Video(video_file=Path(input_video), **sampling_settings(**options))
+    engine = get_backend(backend, languages=["ja"])  # as `Video.run_ocr`
+    scores, has_text = score_frames(
+        (frame.image for frame in video.iter_frames()), engine, batch_size
+    )
+    points = calibrate(scores, has_text, thresholds or THRESHOLDS)
+
+    s = json.dumps(
+        {
+            "frames": len(scores),
+            "frames_with_text": sum(has_text),
+            "points": [asdict(point) for point in points],
+        },
+        indent=2,
     )
-    video.gen_frame_files()
-    video.run_ocr()
-    video.to_json()
+    if output:
+        Path(output).write_text(s + "\n")
+    else:
+        click.echo(s)
+
+
+@cli.command(name="tracks")
+@click.argument(
+    "input_file", required=True, type=click.Path(exists=True, dir_okay=False)
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(FORMATS),
+    help="Output format, defaults to the suffix of --output, or json",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the tracks to this file instead of stdout",
+)
+@click.option(
+    "--iou-threshold",
+    default=IOU_THRESHOLD,
+    type=click.FloatRange(min=0, max=1),
+    help="Minimum overlap of bboxes of the same text in consecutive frames",
+)
+@click.option(
+    "--similarity",
+    default=SIMILARITY,
+    type=click.FloatRange(min=0, max=1),
+    help="Minimum similarity of texts of the same track",
+)
+@click.option(
+    "--max-gap",
+    default=MAX_GAP,
+    type=click.IntRange(min=0),
+    help="Number of frames a text may be missing from and still continue its track",
+)
+def tracks(input_file, fmt, output, iou_threshold, similarity, max_gap):  # noqa: PLR0913
+    """Link observations of a ocr json file into text tracks, e.g. to export subtitles"""
+    from video_ocr.tracks import dumps
+    from video_ocr.video import Video
+
+    video = Video.load_frames(Path(input_file))
+    text_tracks = video.build_tracks(
+        iou_threshold=iou_threshold, similarity=similarity, max_gap=max_gap
+    )
+
+    if not fmt:
+        suffix = Path(output).suffix.lstrip(".") if output else ""
+        fmt = suffix if suffix in FORMATS else "json"
+
+    s = dumps(text_tracks, fmt)
+    if output:
+        Path(output).write_text(s)
+    else:
+        click.echo(s, nl=False)
+
+
+def index_option(f):
+    return click.option(
+        "--index",
+        "index_file",
+        type=click.Path(dir_okay=False, writable=True),
+        help="Path of the search index, defaults to index.sqlite in the user directory",
+    )(f)
+
+
+@cli.command(name="index")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@index_option
+@click.option(
+    "-f",
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Reindex videos even if their output files did not change",
+)
+def index_videos(paths, index_file, force):
+    """Add ocr json files to the search index.
+
+    PATHS are video.json files or directories searched for them. Each video is
+    identified by the name of the directory of its video.json.
+    """
+    output_files = []
+    for path in map(Path, paths):
+        output_files.extend(
+            sorted(path.rglob("video.json")) if path.is_dir() else [path]
+        )
+
+    search_index = SearchIndex(Path(index_file) if index_file else None)
+    indexed = 0
+    try:
+        for output_file in output_files:
+            video_id = output_file.resolve().parent.name
+            indexed += search_index.add(video_id, output_file, force=force)
+    finally:
+        search_index.close()
+
+    click.echo(f"indexed {indexed} videos, {len(output_files) - indexed} unchanged.")
+
+
+@cli.command(name="search")
+@click.argument("query", required=True, type=str)
+@index_option
+@click.option(
+    "--limit",
+    "-n",
+    default=20,
+    type=click.IntRange(min=1),
+    help="Maximum number of results",
+)
+@click.option("--video", "video_id", type=str, help="Only search this video")
+@click.option(
+    "--json", "as_json", is_flag=True, default=False, help="Output JSON lines"
+)
+def search(query, index_file, limit, video_id, as_json):
+    """Search the text of indexed videos.
+
+    Every whitespace separated term of QUERY must appear in the text.
+    """
+    search_index = SearchIndex(Path(index_file) if index_file else None)
+    try:
+        hits = search_index.search(query, limit=limit, video_id=video_id)
+    finally:
+        search_index.close()
+
+    for hit in hits:
+        if as_json:
+            click.echo(json.dumps(asdict(hit), ensure_ascii=False))
+        else:
+            click.echo(f"{hit.video_id}\t{hit.start:.2f}-{hit.end:.2f}\t{hit.text}")
+
+
+@cli.command(name="bench")
+@click.option(
+    "--video",
+    "video_file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Video to benchmark, defaults to a synthetic video rendered for the run",
+)
+@click.option(
+    "--backend",
+    "-b",
+    default="stub",
+    type=click.Choice(available_backends()),
+    help="OCR backend to benchmark",
+)
+@click.option(
+    "--frame-rate",
+    "-fr",
+    default=10,
+    type=click.IntRange(min=1),
+    help="Sample every N-th frame",
+)
+@click.option(
+    "--seconds",
+    default=10.0,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Length of the synthetic video",
+)
+@click.option(
+    "--width",
+    default=640,
+    type=click.IntRange(min=1),
+    help="Width of the synthetic video",
+)
+@click.option(
+    "--height",
+    default=360,
+    type=click.IntRange(min=1),
+    help="Height of the synthetic video",
+)
+@click.option(
+    "--scene-seconds",
+    default=2.0,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds between text changes in the synthetic video",
+)
+@click.option(
+    "--batch-size",
+    "batch_sizes",
+    multiple=True,
+    type=click.IntRange(min=1),
+    help="Batch size to measure OCR throughput at, repeat for more, defaults to 1, 4 and 16",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the results to this JSON file instead of stdout",
+)
+def bench(  # noqa: PLR0913
+    video_file,
+    backend,
+    frame_rate,
+    seconds,
+    width,
+    height,
+    scene_seconds,
+    batch_sizes,
+    output,
+):
+    """Benchmark decoding, sampling, dedup, OCR and serialization"""
+    from video_ocr.bench import BATCH_SIZES, run_benchmarks
+
+    results = run_benchmarks(
+        video_file=Path(video_file) if video_file else None,
+        backend=backend,
+        step=frame_rate,
+        seconds=seconds,
+        width=width,
+        height=height,
+        scene_seconds=scene_seconds,
+        batch_sizes=batch_sizes or BATCH_SIZES,
+    )
+
+    s = json.dumps(results, indent=2)
+    if output:
+        Path(output).write_text(s + "\n")
+    else:
+        click.echo(s)
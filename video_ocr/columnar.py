@@ -0,0 +1,126 @@
+"""
+columnar output of ocr results as parquet, with one row per text observation.
+
+rows are written in row groups as frames stream in, so memory stays flat however
+long the video is, and files are read back memory-mapped, e.g. for analytics with
+pyarrow, pandas or duckdb. needs pyarrow, see the `parquet` extra.
+"""
+
+import typing as t
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from video_ocr.config import get_logger
+from video_ocr.ocr import OCRResult
+
+if t.TYPE_CHECKING:
+    from video_ocr.video import Frame
+
+logger = get_logger(__name__)
+
+ROW_GROUP_SIZE = 64 * 1024  # observations per row group
+
+SCHEMA = pa.schema(
+    [
+        ("frame_index", pa.int64()),
+        ("timestamp", pa.float64()),
+        ("text", pa.string()),
+        ("confidence", pa.float32()),
+        # bbox of `OCRResult`, normalized with the origin at the bottom-left
+        ("x", pa.float32()),
+        ("y", pa.float32()),
+        ("width", pa.float32()),
+        ("height", pa.float32()),
+    ]
+)
+
+
+class ParquetWriter:
+    """Write observations of frames to a parquet file, a row group at a time.
+
+    Args:
+        path: path of the parquet file
+        row_group_size: number of observations buffered before writing a row group
+    """
+
+    def __init__(self, path: Path, row_group_size: int = ROW_GROUP_SIZE):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._columns: t.Dict[str, list] = {name: [] for name in SCHEMA.names}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = pq.ParquetWriter(str(path), SCHEMA, compression="zstd")
+
+    def write_frame(self, frame: "Frame") -> None:
+        columns = self._columns
+        for result in frame.results:
+            columns["frame_index"].append(frame.index)
+            columns["timestamp"].append(frame.timestamp)
+            columns["text"].append(result.text)
+            columns["confidence"].append(result.confidence)
+            for name, value in zip(("x", "y", "width", "height"), result.bbox):
+                columns[name].append(value)
+
+        if len(columns["text"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """write buffered observations as a row group"""
+        if not self._columns["text"]:
+            return
+
+        self._writer.write_table(pa.table(self._columns, schema=SCHEMA))
+        self.rows += len(self._columns["text"])
+        self._columns = {name: [] for name in SCHEMA.names}
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self) -> "ParquetWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_parquet(
+    frames: t.Iterable["Frame"], path: Path, row_group_size: int = ROW_GROUP_SIZE
+) -> int:
+    """write observations of frames to path, returns the number of rows"""
+    with ParquetWriter(path, row_group_size) as writer:
+        for frame in frames:
+            writer.write_frame(frame)
+
+    logger.info(f"wrote {writer.rows} observations to {path}.")
+    return writer.rows
+
+
+def read_parquet(path: Path, columns: t.Optional[t.List[str]] = None) -> pa.Table:
+    """memory-mapped table of observations, optionally of some columns only"""
+    return pq.read_table(str(path), columns=columns, memory_map=True)
+
+
+def iter_frames(path: Path) -> t.Iterator["Frame"]:
+    """frames of observations in path, a row group at a time"""
+    from video_ocr.video import Frame
+
+    file = pq.ParquetFile(str(path), memory_map=True)
+    frame: t.Optional[Frame] = None
+    for i in range(file.num_row_groups):
+        columns = file.read_row_group(i).to_pydict()
+        for row in zip(*(columns[name] for name in SCHEMA.names)):
+            index, timestamp, text, confidence, *bbox = row
+            if frame is None or frame.index != index:
+                if frame is not None:
+                    yield frame
+                frame = Frame(index=index, timestamp=timestamp, results=[])
+            frame.results.append(
+                OCRResult(text=text, confidence=confidence, bbox=tuple(bbox))
+            )
+
+    if frame is not None:
+        yield frame
@@ -4,6 +4,26 @@ from pathlib import Path
 
 DATA_DIR = Path(__file__).parents[1] / "data"
 
+# defaults and choices of the modules named in comments. they are kept here, without
+# dependencies, so the cli can build its options without importing numpy, cv2 or serde
+DECODERS = ("cv2", "pyav")  # decode
+STRATEGIES = ("auto", "grab", "seek", "adaptive")  # sampling
+DEFAULT_THRESHOLD = (
+    2  # dedup, number of changed signature pixels still counted as duplicate
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # cache
+IOU_THRESHOLD = 0.5  # tracks, overlap of bboxes of the same text in consecutive frames
+SIMILARITY = (
+    0.8  # tracks, similarity of texts of the same track, to allow for ocr noise
+)
+MAX_GAP = 1  # tracks, sampled frames a track may be missing from and still continue
+FORMATS = ("json", "srt", "vtt")  # tracks
+DEFAULT_TTL = 60 * 60.0  # fetch, seconds a cached page is used without revalidating it
+DEFAULT_TEXT_THRESHOLD = 0.001  # prefilter, lowest text score of a frame with text
+DEFAULT_LEASE = 5 * 60.0  # workqueue, seconds a task is held without a heartbeat
+MAX_ATTEMPTS = 3  # workqueue, leases of a task before it is marked failed
+DEFAULT_PORT = 8765  # workqueue, port the queue is served on
+
 
 # default setting for logger
 logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,228 @@
+"""
+decoders of video frames, behind the `grab()`/`retrieve()` interface of cv2.
+
+"cv2" decodes with `cv2.VideoCapture` on a single thread. "pyav" decodes with ffmpeg
+through PyAV, with frame and slice threading of the codec, converts frames straight to
+grayscale or a lower resolution, and reports the presentation timestamp of each frame,
+which is exact for variable frame rate videos. pyav needs the `pyav` extra.
+"""
+
+import typing as t
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from video_ocr.config import DECODERS
+
+
+class VideoReader:
+    """Base class of opened videos, read a frame at a time.
+
+    `grab` decodes the next frame, and `retrieve` converts the last grabbed frame into
+    an image, so frames that are skipped are never converted.
+
+    Args:
+        video_file: path to the video
+        gray: retrieve grayscale images instead of BGR ones
+        width: retrieve images downscaled to this width, keeping the aspect ratio
+    """
+
+    name: t.ClassVar[str] = ""
+
+    def __init__(
+        self, video_file: Path, gray: bool = False, width: t.Optional[int] = None
+    ):
+        self.video_file = video_file
+        self.gray = gray
+        self.width = width
+
+    @property
+    def fps(self) -> float:
+        raise NotImplementedError
+
+    @property
+    def total_frames(self) -> int:
+        """frames in the video as reported by the container, 0 if unknown"""
+        raise NotImplementedError
+
+    def grab(self) -> bool:
+        raise NotImplementedError
+
+    def retrieve(self) -> t.Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def timestamp(self) -> float:
+        """seconds from the start of the video of the last grabbed frame"""
+        raise NotImplementedError
+
+    def seek(self, index: int) -> None:
+        """make the next `grab` decode the frame at index"""
+        raise NotImplementedError
+
+    def release(self) -> None:
+        raise NotImplementedError
+
+    def _size(self, width: int, height: int) -> t.Tuple[int, int]:
+        if not self.width or self.width >= width:
+            return width, height
+        return self.width, max(round(height * self.width / width), 1)
+
+
+class CV2Reader(VideoReader):
+    name = "cv2"
+
+    def __init__(
+        self, video_file: Path, gray: bool = False, width: t.Optional[int] = None
+    ):
+        super().__init__(video_file, gray, width)
+        self.vid = cv2.VideoCapture(str(video_file))
+        if not self.vid.isOpened():
+            raise ValueError(f"could not open video: {video_file}")
+        self.index = -1
+
+    @property
+    def fps(self) -> float:
+        return self.vid.get(cv2.CAP_PROP_FPS)
+
+    @property
+    def total_frames(self) -> int:
+        return int(self.vid.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def grab(self) -> bool:
+        self.index += 1
+        return self.vid.grab()
+
+    def retrieve(self) -> t.Optional[np.ndarray]:
+        ret, image = self.vid.retrieve()
+        if not ret:
+            return None
+
+        if self.gray:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        size = self._size(image.shape[1], image.shape[0])
+        if size != (image.shape[1], image.shape[0]):
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def timestamp(self) -> float:
+        # falls back to index / fps for containers without timestamps
+        msec = self.vid.get(cv2.CAP_PROP_POS_MSEC)
+        if msec > 0 or self.index == 0:
+            return msec / 1000
+        return self.index / self.fps if self.fps > 0 else 0.0
+
+    def seek(self, index: int) -> None:
+        self.vid.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.index = index - 1
+
+    def release(self) -> None:
+        self.vid.release()
+
+
+class PyAVReader(VideoReader):
+    name = "pyav"
+
+    def __init__(
+        self, video_file: Path, gray: bool = False, width: t.Optional[int] = None
+    ):
+        super().__init__(video_file, gray, width)
+        try:
+            import av
+        except ImportError as e:
+            raise ValueError(
+                "PyAV is not installed, install it with `pip install video-ocr[pyav]`"
+            ) from e
+
+        try:
+            self.container = av.open(str(video_file))
+        except (av.error.FFmpegError, OSError) as e:
+            raise ValueError(f"could not open video: {video_file}") from e
+        if not self.container.streams.video:
+            self.container.close()
+            raise ValueError(f"no video stream in: {video_file}")
+
+        self.stream = self.container.streams.video[0]
+        # decode frames and slices on all cores
+        self.stream.thread_type = "AUTO"
+        self.frames = self.container.decode(self.stream)
+        self.frame = None
+
+    @property
+    def fps(self) -> float:
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        return float(rate) if rate else 0.0
+
+    @property
+    def total_frames(self) -> int:
+        return self.stream.frames
+
+    def grab(self) -> bool:
+        self.frame = next(self.frames, None)
+        return self.frame is not None
+
+    def retrieve(self) -> t.Optional[np.ndarray]:
+        if self.frame is None:
+            return None
+
+        width, height = self._size(self.frame.width, self.frame.height)
+        # scale and convert the pixel format in one pass of swscale
+        return self.frame.reformat(
+            width=width, height=height, format="gray" if self.gray else "bgr24"
+        ).to_ndarray()
+
+    def timestamp(self) -> float:
+        if self.frame is None or self.frame.time is None:
+            return 0.0
+        return self.frame.time - self._start_time()
+
+    def _start_time(self) -> float:
+        if self.stream.start_time is None:
+            return 0.0
+        return float(self.stream.start_time * self.stream.time_base)
+
+    def seek(self, index: int) -> None:
+        """seek to the keyframe before index, and decode forward to it.
+
+        the frame is found by timestamp, index / fps, so it is approximate for
+        variable frame rate videos.
+        """
+        target = index / self.fps + self._start_time() if self.fps else 0.0
+        self.container.seek(
+            int(target / self.stream.time_base), stream=self.stream, backward=True
+        )
+        self.frames = self.container.decode(self.stream)
+
+        # half a frame of tolerance for rounding of timestamps
+        tolerance = 0.5 / self.fps if self.fps else 0.0
+        for frame in self.frames:
+            if frame.time is None or frame.time >= target - tolerance:
+                self.frames = _prepend(frame, self.frames)
+                return
+        self.frames = iter(())
+
+    def release(self) -> None:
+        self.container.close()
+
+
+def _prepend(item, iterator: t.Iterator) -> t.Iterator:
+    yield item
+    yield from iterator
+
+
+_READERS: t.Dict[str, t.Type[VideoReader]] = {
+    reader.name: reader for reader in (CV2Reader, PyAVReader)
+}
+
+
+def open_video(
+    video_file: Path,
+    decoder: str = "cv2",
+    gray: bool = False,
+    width: t.Optional[int] = None,
+) -> VideoReader:
+    """open video_file with a decoder of `DECODERS`"""
+    if decoder not in _READERS:
+        raise ValueError(f"decoder must be one of {DECODERS}, got {decoder}")
+
+    return _READERS[decoder](video_file, gray=gray, width=width)
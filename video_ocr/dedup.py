@@ -0,0 +1,86 @@
+"""
+skip ocr on frames that look the same as the last frame sent to ocr.
+
+frames are compared by a downscaled grayscale signature rather than a perceptual hash:
+perceptual hashes are built to ignore small changes, e.g. a single changed character
+in a subtitle, which are exactly the changes ocr must not miss.
+"""
+
+import typing as t
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from video_ocr.config import DEFAULT_THRESHOLD, get_logger
+
+logger = get_logger(__name__)
+
+SIGNATURE_WIDTH = 128  # width of the signature, height keeps the aspect ratio
+PIXEL_DELTA = 32  # difference of gray levels for a signature pixel to count as changed
+
+
+def signature(image: np.ndarray, width: int = SIGNATURE_WIDTH) -> np.ndarray:
+    """downscaled grayscale copy of a BGR or grayscale image"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height = max(round(gray.shape[0] * width / gray.shape[1]), 1)
+
+    return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def changed_pixels(a: np.ndarray, b: np.ndarray, delta: int = PIXEL_DELTA) -> int:
+    """number of pixels that differ by more than `delta` between two signatures"""
+    if a.shape != b.shape:
+        return a.size
+
+    return int(np.count_nonzero(cv2.absdiff(a, b) > delta))
+
+
+@dataclass
+class DedupStats:
+    frames: int = 0  # frames checked
+    skipped: int = 0  # frames found to be duplicates
+
+    @property
+    def skip_ratio(self) -> float:
+        return self.skipped / self.frames if self.frames else 0.0
+
+
+class FrameDeduplicator:
+    """Find frames that are duplicates of the last unique frame.
+
+    Comparing against the last unique frame, rather than the previous frame,
+    keeps slow fades from being skipped one small step at a time.
+
+    Args:
+        threshold: maximum number of changed signature pixels of a duplicate
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD):
+        if threshold < 0:
+            raise ValueError("threshold must not be negative")
+
+        self.threshold = threshold
+        self.reference: t.Optional[np.ndarray] = None
+        self.stats = DedupStats()
+
+    def is_duplicate(self, image: np.ndarray) -> bool:
+        current = signature(image)
+        self.stats.frames += 1
+
+        if (
+            self.reference is not None
+            and changed_pixels(self.reference, current) <= self.threshold
+        ):
+            self.stats.skipped += 1
+            return True
+
+        self.reference = current
+        return False
+
+    def log_stats(self) -> None:
+        stats = self.stats
+        logger.info(
+            f"skipped ocr on {stats.skipped} of {stats.frames} frames "
+            f"({stats.skip_ratio:.1%}) as duplicates."
+        )
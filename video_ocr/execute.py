@@ -1,157 +1,248 @@
-# this file is WIP, but it is a good example of how to use multiprocessing and multithreading
-# turn off mypy for this file
-# mypy: ignore-errors
-import timeit
+"""
+batch ocr over many videos with a fixed pool of worker processes.
+
+frames of videos are decoded on background threads, one video per thread, and sent to
+the pool in chunks, so a single video is spread over all workers, and decoding of the
+next videos overlaps with ocr of the current one. both the decoded frames waiting for the
+pool and the chunks in flight are bounded, so memory stays flat however many videos
+are processed.
+
+frames are pickled to the workers, or with slot_bytes, copied into slots of shared
+memory, one per chunk in flight, which workers read without a copy, see
+`video_ocr.shm`.
+"""
+
+import contextlib
+import os
 import typing as t
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-from time import monotonic
-
-from serde import SerdeError
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 
+from video_ocr.cache import OCRCache, engine_key, frame_key
 from video_ocr.config import get_logger
-from video_ocr.video import Video
+from video_ocr.metrics import metrics
+from video_ocr.ocr import OCRResult, get_backend
+from video_ocr.roi import Crop
+from video_ocr.sampling import SampledFrame
+from video_ocr.shm import FrameRing
+from video_ocr.stream import batched, interleave
+from video_ocr.video import OCRState, Video
+from video_ocr.worker import detect_chunk, detect_shared, init_worker
 
 logger = get_logger(__name__)
 
 
-def _load_or_create_video(video_id: str, load=False) -> Video:
-    if load:
+class _VideoEnd(t.NamedTuple):
+    """marks the end of the frames of a video"""
+
+    failed: bool
+
+
+@dataclass
+class _Chunk:
+    state: OCRState
+    batch: t.List[SampledFrame]
+    positions: t.List[int]
+    crops: t.Optional[t.List[Crop]]
+    # results of images to ocr, None for those sent to the pool
+    results: t.List[t.Optional[t.List[OCRResult]]]
+    keys: t.List[str]  # cache keys of images to ocr, empty without cache
+    future: t.Optional[Future]
+    slot: t.Optional[int] = None  # of the ring the images were sent in
+
+
+class BatchRunner:
+    """Run ocr on many videos, sharding chunks of frames over worker processes.
+
+    Args:
+        backend: name of the ocr backend used by all workers
+        lang: language to recognize
+        workers: number of worker processes, defaults to the number of cpus
+        chunk_size: number of frames sent to a worker at once
+        queue_size: number of decoded chunks buffered ahead of the pool
+        max_in_flight: number of chunks submitted to the pool and not yet collected,
+            defaults to twice the number of workers
+        cache: cache to look up frames in before sending them to the pool
+        resume: skip frames already in the checkpoints of videos with an output_file
+        decode_workers: number of threads decoding videos, each decodes one video at a time
+        slot_bytes: size of the slots of shared memory chunks are sent to workers in,
+            chunks that do not fit are pickled. None pickles every chunk
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        backend: str,
+        lang: str = "ja",
+        workers: t.Optional[int] = None,
+        chunk_size: int = 8,
+        queue_size: int = 4,
+        max_in_flight: t.Optional[int] = None,
+        cache: t.Optional[OCRCache] = None,
+        resume: bool = True,
+        decode_workers: int = 1,
+        slot_bytes: t.Optional[int] = None,
+    ):
+        self.backend = backend
+        self.lang = lang
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.cache = cache
+        self.resume = resume
+        self.decode_workers = decode_workers
+        self.slot_bytes = slot_bytes
+        self.ring: t.Optional[FrameRing] = None  # of the current run
+        # cache keys need the settings of the backend the workers use
+        self.settings = (
+            engine_key(get_backend(backend, languages=[lang])) if cache else ""
+        )
+
+    def _iter_chunks(
+        self, video: Video
+    ) -> t.Iterator[t.Tuple[Video, t.Union[t.List[SampledFrame], _VideoEnd]]]:
         try:
-            video = Video.from_json(video_id)
-        except SerdeError as e:
-            logger.warning(
-                f"{video_id=}: failed to load Video from json, creating fresh Video instance"
+            for batch in batched(video.iter_frames(), self.chunk_size):
+                yield video, batch
+        except Exception as e:
+            logger.error(f"failed to decode {video.video_file}: {e}")
+            yield video, _VideoEnd(failed=True)
+        else:
+            yield video, _VideoEnd(failed=False)
+
+    def _submit(
+        self, pool: ProcessPoolExecutor, state: OCRState, batch: t.List[SampledFrame]
+    ) -> _Chunk:
+        images, positions, crops = state.split(batch)
+
+        keys: t.List[str] = []
+        results: t.List[t.Optional[t.List[OCRResult]]] = [None] * len(images)
+        if self.cache and images:
+            keys = [frame_key(image, self.settings) for image in images]
+            results = self.cache.get_many(keys)
+
+        missing = [image for image, r in zip(images, results) if r is None]
+        future = None
+        slot = None
+        if missing and self.ring and self.ring.fits(missing):
+            # a slot is free, the ring has one more than chunks in flight
+            chunk = self.ring.put(missing, timeout=0)
+            future = pool.submit(detect_shared, chunk)
+            slot = chunk.slot
+            metrics.incr("frames_shared", len(missing))
+        elif missing:
+            future = pool.submit(detect_chunk, missing)
+        metrics.incr("frames_ocr", len(missing))
+        metrics.incr(
+            "pixels_ocr", sum(image.shape[0] * image.shape[1] for image in missing)
+        )
+
+        return _Chunk(state, batch, positions, crops, results, keys, future, slot)
+
+    def _collect(self, chunk: _Chunk) -> None:
+        if chunk.future:
+            # time the main process waits for the pool, ocr time of workers is "ocr"
+            with metrics.stage("ocr_wait"):
+                results, seconds = chunk.future.result()
+            metrics.add_time("ocr", seconds)
+            if self.ring and chunk.slot is not None:
+                self.ring.release(chunk.slot)
+
+            detected = iter(results)
+            missing = [i for i, r in enumerate(chunk.results) if r is None]
+            for i in missing:
+                chunk.results[i] = next(detected)
+
+            if self.cache:
+                self.cache.put_many(
+                    [(chunk.keys[i], chunk.results[i]) for i in missing]  # type: ignore
+                )
+
+        chunk.state.collect(
+            chunk.batch,
+            chunk.positions,
+            t.cast(t.List[t.List[OCRResult]], chunk.results),
+            chunk.crops,
+        )
+
+    def run(self, videos: t.Iterable[Video]) -> t.Iterator[Video]:
+        """run ocr on videos and yield each video once its frames are ready.
+
+        videos are yielded in order with a single decode worker, and in the order they
+        finish decoding otherwise. videos that failed to decode are logged and not yielded.
+        videos is advanced by the decode workers, so it may block, e.g. on downloads.
+        """
+        in_flight: t.Deque[t.Union[_Chunk, t.Tuple[OCRState, _VideoEnd]]] = deque()
+        states: t.Dict[int, OCRState] = {}
+
+        def collect_oldest() -> t.Optional[Video]:
+            item = in_flight.popleft()
+            if isinstance(item, _Chunk):
+                self._collect(item)
+                return None
+
+            state, end = item
+            if end.failed:
+                if state.video.checkpoint:
+                    state.video.checkpoint.close()
+                return None
+            state.finish()
+            return state.video
+
+        logger.info(
+            f"start batch OCR with {self.workers} {self.backend} workers, "
+            f"{self.chunk_size} frames per chunk..."
+        )
+        if self.slot_bytes:
+            # chunks in flight, and the one submitted before the oldest is collected
+            self.ring = FrameRing(self.max_in_flight + 1, self.slot_bytes)
+        with contextlib.ExitStack() as stack:
+            if self.ring:
+                stack.callback(self._close_ring)
+            pool = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=init_worker,
+                    initargs=(self.backend, [self.lang]),
+                )
             )
-            logger.error(e)
-            video = Video(video_id)
-        except FileNotFoundError as e:
-            logger.warning(
-                f"{video_id=}: file is not found, creating fresh Video instance"
+            chunks = interleave(
+                (self._iter_chunks(video) for video in videos),
+                self.decode_workers,
+                self.queue_size,
             )
-            logger.error(e)
-            video = Video(video_id)
-
-    else:
-        video = Video(video_id)
-
-    if not video.video_path.exists():
-        logger.info(f"{video.video_path=} does not exist, downloading video...")
-        video.download_video()
-
-    return video
-
-
-def _to_frames_if_not_exists(video: Video) -> None:
-    if not video.frames:
-        video.to_frames()
-        logger.info(f"{video.to_json()=}")
-
-
-# return closure for thread pool. `to_frames` is io bound, so we use thread pool
-def func_to_frames_if_not_exists(load=True) -> t.Callable:
-    def closure(video_id: str):
-        video = _load_or_create_video(video_id, load=load)
-        _to_frames_if_not_exists(video)
-
-    return closure
-
-
-# function for process pool. running ocr is memory bound, so we use process pool
-# notice that we cant use closure here, since closure cannot be pickled meaning it cannot be passed to process pool
-def run_ocr_if_not_exists(video_id: str) -> Video:
-    video = _load_or_create_video(video_id, load=True)  # must load video with frames
-
-    results = [frame.results for frame in video.frames]
-
-    if any(results):
-        logger.info(f"{video.video_id=} has already saved results, stop ocr.")
-        # already saved results
-        return video
-
-    logger.info(f"{video.video_id=} has no saved results, run ocr.")
-    video.get_frames_ocr()
-    logger.info(f"{video.to_json()=}")
-
-    return video
-
-
-def run_on_thread_pool(exec_func, *iterable, max_workers=4):
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        return executor.map(exec_func, *iterable)
-
-
-def run_on_process_pool(exec_func, *iterable, max_workers=None):
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(exec_func, *iterable)
-
-
-def log_time(function):
-    def wrap(*args, **kwargs):
-        start_time = monotonic()
-        function_return = function(*args, **kwargs)
-        logger.info(f"{function.__name__}:Run time {monotonic() - start_time} seconds")
-        return function_return
-
-    return wrap
-
-
-def run_ocr_multi_process(video_ids: list[str], load=False) -> None:
-    logger.info("start saving frames.")
-    run_on_thread_pool(func_to_frames_if_not_exists(load), video_ids)
-    logger.info("finish saving frames.")
-
-    logger.info("start saving ocr results.")
-    run_on_process_pool(run_ocr_if_not_exists, video_ids)
-    logger.info("finish saving ocr results.")
-
-
-def check_performance(
-    video_ids: list[str],
-    exec_func,
-    pattern=None,
-    tp_max_worker=4,
-    mp_max_worker=None,
-) -> dict[str, float | dict]:
-    """
-    for 10 videos,
-    - gen_frames
-        - sync: 30.243480375000217
-        - async:
-            - 20.119083291001516, for 4 workers
-            - 22.35446845899969 , for 10 workers
-        - multi proc: 23.37792808300037
-
-    - ocr
-        - sync: 47.840016333000676
-        - async: 40.077069167000445
-        - multi proc: 27.40532650000023
-    """
-
-    if pattern is None:
-        pattern = ["sync", "async", "multi-proc"]
-    result: dict[str, dict | float] = {"args": locals()}
-
-    if "sync" in pattern:
-        start = timeit.default_timer()
-        for video_id in video_ids:
-            exec_func(video_id, load=False)
-
-        end = timeit.default_timer()
-        logger.info(f"sync: {end - start}")
-        result["sync"] = end - start
-
-    if "async" in pattern:
-        start = timeit.default_timer()
-        run_on_thread_pool(exec_func, video_ids, False, max_workers=tp_max_worker)
-        end = timeit.default_timer()
-        logger.info(f"async: {end - start}")
-        result["sync"] = end - start
-
-    if "multi-proc" in pattern:
-        start = timeit.default_timer()
-        run_on_process_pool(exec_func, video_ids, False, max_workers=mp_max_worker)
-        end = timeit.default_timer()
-        logger.info(f"multi proc: {end - start}")
-        result["sync"] = end - start
-
-    return result
+            for video, batch in chunks:
+                if id(video) not in states:
+                    video.backend = self.backend
+                    states[id(video)] = video.start_ocr(self.lang, self.resume)
+                state = states[id(video)]
+
+                if isinstance(batch, _VideoEnd):
+                    del states[id(video)]
+                    in_flight.append((state, batch))
+                else:
+                    in_flight.append(self._submit(pool, state, batch))
+
+                # backpressure: wait for the oldest chunk before decoding more
+                while len(in_flight) > self.max_in_flight or (
+                    in_flight and not isinstance(in_flight[0], _Chunk)
+                ):
+                    finished = collect_oldest()
+                    if finished:
+                        yield finished
+
+            while in_flight:
+                finished = collect_oldest()
+                if finished:
+                    yield finished
+
+        if self.cache:
+            self.cache.log_stats()
+        logger.info("finished batch OCR.")
+
+    def _close_ring(self) -> None:
+        # after the pool shut down, so no worker reads the ring anymore
+        if self.ring:
+            self.ring.close()
+            self.ring = None
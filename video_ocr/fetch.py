@@ -0,0 +1,314 @@
+"""
+fetch items of youtube playlists from the data api.
+
+many playlists are fetched at once by coroutines, which send their requests over a
+pool of keep-alive connections on threads, so each request does not pay for a new
+tls handshake. pages of a playlist are fetched in order, following nextPageToken,
+with the most items per page the api returns.
+
+each page is cached in a sqlite database under `user_dir()`. cached pages younger
+than the time-to-live are used without a request, and older ones are revalidated by
+their etag, so pages that did not change are not sent again.
+"""
+
+import asyncio
+import gzip
+import http.client
+import json
+import queue
+import sqlite3
+import time
+import typing as t
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from video_ocr import get_key, user_dir
+from video_ocr.config import DEFAULT_TTL, get_logger
+from video_ocr.metrics import metrics
+
+logger = get_logger(__name__)
+
+API_URL = "https://www.googleapis.com/youtube/v3"
+MAX_RESULTS = 50  # most items of a page the api returns, larger values are capped
+DEFAULT_CONNECTIONS = 8
+# methods a request may be sent again with, on a new connection if the first failed
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"))
+
+
+def page_cache_path() -> Path:
+    return user_dir() / "youtube-cache.sqlite"
+
+
+@dataclass
+class Response:
+    status: int
+    etag: t.Optional[str]
+    body: bytes
+
+
+class ConnectionPool:
+    """Keep-alive http connections to the host of base_url, shared by threads.
+
+    Args:
+        base_url: url requests are relative to
+        timeout: seconds to wait for a response
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        url = urllib.parse.urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"base_url must be an http(s) url, got {base_url}")
+
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.base_path = url.path.rstrip("/")
+        self.timeout = timeout
+        self.idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    def get(
+        self, path: str, params: t.Dict[str, str], headers: t.Dict[str, str]
+    ) -> Response:
+        """send a GET request on an idle connection, or a new one if none is idle"""
+        return self.request("GET", path, params, headers)
+
+    def request(  # noqa: PLR0913
+        self,
+        method: str,
+        path: str,
+        params: t.Dict[str, str],
+        headers: t.Dict[str, str],
+        body: t.Optional[bytes] = None,
+    ) -> Response:
+        """send a request on an idle connection, or a new one if none is idle.
+
+        an idempotent request that fails is sent once more on a new connection, others
+        are not, since the server may have handled them before the connection broke.
+        """
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        url = f"{self.base_path}{path}"
+        if params:
+            url += f"?{urllib.parse.urlencode(params)}"
+        headers = {"Accept-Encoding": "gzip", **headers}
+        for retry in (False, True):
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # the server may have closed an idle connection, retry on a new one
+                if retry or method not in IDEMPOTENT_METHODS:
+                    raise
+                conn = self._connect()
+
+        if response.getheader("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.idle.put(conn)
+
+        return Response(response.status, response.getheader("ETag"), data)
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+@dataclass
+class CachedPage:
+    etag: t.Optional[str]
+    body: bytes
+    fetched: float  # time.time() the page was fetched or revalidated
+
+
+class PageCache:
+    """Cache of api responses stored in sqlite, keyed by request.
+
+    Args:
+        path: path of the database, defaults to `page_cache_path()`
+    """
+
+    def __init__(self, path: t.Optional[Path] = None):
+        self.path = path or page_cache_path()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                body BLOB NOT NULL,
+                fetched REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> t.Optional[CachedPage]:
+        row = self.conn.execute(
+            "SELECT etag, body, fetched FROM pages WHERE key = ?", (key,)
+        ).fetchone()
+        return CachedPage(*row) if row else None
+
+    def put(self, key: str, etag: t.Optional[str], body: bytes) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (key, etag, body, fetched) VALUES (?, ?, ?, ?)",
+                (key, etag, body, time.time()),
+            )
+
+    def touch(self, key: str) -> None:
+        """mark the page as revalidated now"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE pages SET fetched = ? WHERE key = ?", (time.time(), key)
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class PlaylistFetcher:
+    """Fetch items of many playlists at once, caching each page.
+
+    Args:
+        api_key: youtube data api key, defaults to the stored YOUTUBE_API_KEY
+        cache: cache of pages, defaults to a `PageCache` at `page_cache_path()`
+        ttl: seconds a cached page is used without revalidating it
+        connections: number of requests in flight at once
+        base_url: url of the api, to use a mock server in tests
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        api_key: t.Optional[str] = None,
+        cache: t.Optional[PageCache] = None,
+        ttl: float = DEFAULT_TTL,
+        connections: int = DEFAULT_CONNECTIONS,
+        base_url: str = API_URL,
+    ):
+        self.api_key = api_key or get_key("YOUTUBE_API_KEY")
+        if not self.api_key:
+            raise ValueError("YOUTUBE_API_KEY is not set")
+        if connections < 1:
+            raise ValueError("connections must be a positive integer")
+
+        self.cache = cache or PageCache()
+        self.ttl = ttl
+        self.connections = connections
+        self.pool = ConnectionPool(base_url)
+        self.executor = ThreadPoolExecutor(max_workers=connections)
+
+    async def fetch_page(
+        self,
+        playlist_id: str,
+        page_token: t.Optional[str] = None,
+        refresh: bool = False,
+    ) -> dict:
+        """a page of playlist items, from the cache if it is fresh or did not change.
+
+        refresh revalidates cached pages however fresh they are.
+        """
+        key = f"playlistItems:{playlist_id}:{page_token or ''}"
+        cached = self.cache.get(key)
+        if cached and not refresh and time.time() - cached.fetched < self.ttl:
+            metrics.incr("api_pages_cached")
+            return json.loads(cached.body)
+
+        params = {
+            "part": "snippet,contentDetails",
+            "playlistId": playlist_id,
+            "maxResults": str(MAX_RESULTS),
+            "key": self.api_key,  # type: ignore
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        headers = {"If-None-Match": cached.etag} if cached and cached.etag else {}
+
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor, self.pool.get, "/playlistItems", params, headers
+        )
+        metrics.incr("api_requests")
+
+        if response.status == 304 and cached:
+            metrics.incr("api_pages_not_modified")
+            self.cache.touch(key)
+            return json.loads(cached.body)
+        if response.status != 200:
+            raise ValueError(
+                f"{response.status} when requesting items of {playlist_id}: "
+                f"{_error_message(response.body)}"
+            )
+
+        self.cache.put(key, response.etag, response.body)
+        return json.loads(response.body)
+
+    async def fetch(self, playlist_id: str, refresh: bool = False) -> t.List[dict]:
+        """all items of a playlist, in order"""
+        items: t.List[dict] = []
+        page_token = None
+        while True:
+            page = await self.fetch_page(playlist_id, page_token, refresh)
+            items.extend(page.get("items", []))
+
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                break
+
+        logger.info(f"got {len(items)} items of playlist {playlist_id}.")
+        return items
+
+    async def fetch_many(
+        self, playlist_ids: t.Iterable[str], refresh: bool = False
+    ) -> t.Dict[str, t.Optional[t.List[dict]]]:
+        """items of each playlist, None for playlists that failed, which are logged"""
+        playlist_ids = list(dict.fromkeys(playlist_ids))
+        results = await asyncio.gather(
+            *(self.fetch(playlist_id, refresh) for playlist_id in playlist_ids),
+            return_exceptions=True,
+        )
+
+        items: t.Dict[str, t.Optional[t.List[dict]]] = {}
+        for playlist_id, result in zip(playlist_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"failed to get playlist {playlist_id}: {result}")
+                items[playlist_id] = None
+            else:
+                items[playlist_id] = result  # type: ignore
+
+        return items
+
+    def run(
+        self, playlist_ids: t.Iterable[str], refresh: bool = False
+    ) -> t.Dict[str, t.Optional[t.List[dict]]]:
+        """`fetch_many` from synchronous code"""
+        return asyncio.run(self.fetch_many(playlist_ids, refresh))
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        self.pool.close()
+        self.cache.close()
+
+
+def _error_message(body: bytes) -> str:
+    try:
+        return json.loads(body)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return body[:200].decode(errors="replace")
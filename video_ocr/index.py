@@ -0,0 +1,217 @@
+"""
+full-text search over ocr results of many videos.
+
+text tracks of each video, see `video_ocr.tracks`, are stored in a sqlite database
+under `user_dir()` with an FTS5 index using the trigram tokenizer, which matches
+substrings and so needs no word segmentation for japanese. sqlite older than 3.34
+has no trigram tokenizer, there tracks are searched by a scan. videos are indexed
+incrementally: a video is only reindexed if its output file changed, and reindexing
+replaces the rows of that video only.
+"""
+
+import sqlite3
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from video_ocr import user_dir
+from video_ocr.config import get_logger
+
+logger = get_logger(__name__)
+
+# terms shorter than this can not use the trigram index and are matched by a scan
+MIN_TERM_LENGTH = 3
+# first sqlite version with the trigram tokenizer
+TRIGRAM_VERSION = (3, 34, 0)
+
+
+def index_path() -> Path:
+    return user_dir() / "index.sqlite"
+
+
+@dataclass
+class SearchHit:
+    video_id: str
+    text: str
+    start: float  # seconds the text appears, see `TextTrack`
+    end: float
+    first_frame: int
+    last_frame: int
+    bbox: t.Tuple[float, float, float, float]  # see `OCRResult`
+
+
+class SearchIndex:
+    """Full-text index of text tracks of videos, stored in sqlite.
+
+    Args:
+        path: path of the database, defaults to `index_path()`
+    """
+
+    def __init__(self, path: t.Optional[Path] = None):
+        self.path = path or index_path()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY,
+                video_id TEXT NOT NULL UNIQUE,
+                source TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tracks (
+                id INTEGER PRIMARY KEY,
+                video INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+                text TEXT NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                first_frame INTEGER NOT NULL,
+                last_frame INTEGER NOT NULL,
+                x REAL NOT NULL,
+                y REAL NOT NULL,
+                width REAL NOT NULL,
+                height REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tracks_video ON tracks (video);
+            """
+        )
+        # whether tracks are indexed, else searched by a scan
+        self.trigram = sqlite3.sqlite_version_info >= TRIGRAM_VERSION
+        if self.trigram:
+            self._create_fts()
+        else:
+            logger.warning(
+                f"sqlite {sqlite3.sqlite_version} has no trigram tokenizer, which "
+                f"needs {'.'.join(map(str, TRIGRAM_VERSION))}. searching without index."
+            )
+        self.conn.commit()
+
+    def _create_fts(self) -> None:
+        self.conn.executescript(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5 (
+                text, content='tracks', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS tracks_insert AFTER INSERT ON tracks BEGIN
+                INSERT INTO tracks_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tracks_delete AFTER DELETE ON tracks BEGIN
+                INSERT INTO tracks_fts (tracks_fts, rowid, text)
+                VALUES ('delete', old.id, old.text);
+            END;
+            """
+        )
+
+    def add(self, video_id: str, output_file: Path, force: bool = False) -> bool:
+        """index the text tracks of the output file of a video.
+
+        returns False if the video is already indexed from the same, unchanged file.
+        """
+        stat = output_file.stat()
+        source = str(output_file.resolve())
+        row = self.conn.execute(
+            "SELECT source, mtime_ns, size FROM videos WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        if not force and row == (source, stat.st_mtime_ns, stat.st_size):
+            return False
+
+        # imported here, so searching does not import numpy, cv2 and serde
+        from video_ocr.video import Video
+
+        tracks = Video.load_frames(output_file).build_tracks()
+        with self.conn:
+            self.conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            video = self.conn.execute(
+                "INSERT INTO videos (video_id, source, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                (video_id, source, stat.st_mtime_ns, stat.st_size),
+            ).lastrowid
+            self.conn.executemany(
+                """
+                INSERT INTO tracks (
+                    video, text, start, end, first_frame, last_frame, x, y, width, height
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        video,
+                        track.text,
+                        track.start,
+                        track.end,
+                        track.first_frame,
+                        track.last_frame,
+                        *track.bbox,
+                    )
+                    for track in tracks
+                ],
+            )
+
+        logger.info(f"indexed {len(tracks)} tracks of {video_id}.")
+        return True
+
+    def remove(self, video_id: str) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+
+    def video_ids(self) -> t.List[str]:
+        return [
+            video_id
+            for (video_id,) in self.conn.execute(
+                "SELECT video_id FROM videos ORDER BY video_id"
+            )
+        ]
+
+    def search(
+        self, query: str, limit: int = 20, video_id: t.Optional[str] = None
+    ) -> t.List[SearchHit]:
+        """tracks containing every whitespace separated term of query, best match first"""
+        terms = query.split()
+        if not terms:
+            return []
+
+        if self.trigram:
+            long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+            short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+        else:
+            long_terms, short_terms = [], terms
+
+        where = []
+        params: t.List[t.Any] = []
+        if long_terms:
+            # quote terms as fts5 strings, so they are matched as substrings as is
+            where.append("tracks_fts MATCH ?")
+            params.append(
+                " ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+            )
+        for term in short_terms:
+            where.append("instr(lower(tracks.text), lower(?)) > 0")
+            params.append(term)
+        if video_id is not None:
+            where.append("videos.video_id = ?")
+            params.append(video_id)
+
+        # without terms for the index, tracks are scanned and not ranked
+        join = "JOIN tracks_fts ON tracks_fts.rowid = tracks.id" if long_terms else ""
+        order = "tracks_fts.rank, " if long_terms else ""
+        rows = self.conn.execute(
+            f"""
+            SELECT videos.video_id, tracks.text, tracks.start, tracks.end,
+                tracks.first_frame, tracks.last_frame,
+                tracks.x, tracks.y, tracks.width, tracks.height
+            FROM tracks
+            {join}
+            JOIN videos ON videos.id = tracks.video
+            WHERE {" AND ".join(where)}
+            ORDER BY {order}videos.video_id, tracks.start
+            LIMIT ?
+            """,
+            [*params, limit],
+        )
+
+        return [SearchHit(*row[:6], bbox=tuple(row[6:])) for row in rows]  # type: ignore
+
+    def close(self) -> None:
+        self.conn.close()
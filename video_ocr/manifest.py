@@ -0,0 +1,235 @@
+"""
+record what the outputs of a video were made from, so reruns skip what did not change.
+
+the manifest of a video, `video.manifest.json` next to its output file, holds the
+digest of the video file and a key per stage, a hash of everything the output of the
+stage depends on: for ocr, the video, the sampling and ocr settings, and the backend
+and its version, and for each output file, the ocr key. like a build system, a stage
+runs again only when its key changed or its output is missing.
+
+the video is hashed once, later runs reuse the digest while its size and modification
+time are unchanged.
+"""
+
+import hashlib
+import json
+import os
+import typing as t
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from video_ocr.checkpoint import Checkpoint
+from video_ocr.config import get_logger
+from video_ocr.metrics import metrics
+from video_ocr.ocr import OCRBackend
+
+if t.TYPE_CHECKING:
+    from video_ocr.video import Video
+
+logger = get_logger(__name__)
+
+VERSION = 1
+CHUNK_SIZE = 1024 * 1024  # bytes read at once to hash a file
+
+
+def package_version() -> str:
+    """version of video-ocr, whose outputs may change with it"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("video-ocr")
+    except PackageNotFoundError:
+        return ""
+
+
+@dataclass
+class FileState:
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+def file_state(path: Path, previous: t.Optional[FileState] = None) -> FileState:
+    """size, modification time and digest of a file, reusing the digest of previous if
+    the file has the same size and modification time
+    """
+    stat = path.stat()
+    if previous and (previous.size, previous.mtime_ns) == (
+        stat.st_size,
+        stat.st_mtime_ns,
+    ):
+        return previous
+
+    digest = hashlib.blake2b(digest_size=16)
+    with metrics.stage("hash"), open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return FileState(stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+
+def stage_key(**inputs: t.Any) -> str:
+    """hash of the inputs of a stage, which must be json serializable"""
+    data = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+class Manifest:
+    """Input file and stage keys of a video, stored as json.
+
+    a stage is begun before it runs and finished after, so a stage that was
+    interrupted is not taken as up to date.
+
+    Args:
+        path: path of the json file, read if it exists
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.input: t.Optional[FileState] = None
+        # key of each stage, and whether the stage finished with it
+        self.stages: t.Dict[str, t.Dict[str, t.Any]] = {}
+
+        if path.exists():
+            try:
+                data = json.loads(path.read_text())
+                if data["version"] == VERSION:
+                    self.input = FileState(**data["input"]) if data["input"] else None
+                    self.stages = data["stages"]
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"ignoring the broken manifest {path}: {e}")
+
+    def input_digest(self, path: Path) -> str:
+        """digest of the input file at path, which is recorded.
+
+        the digest recorded last is returned if the file is gone, e.g. a downloaded
+        video removed after its ocr, so its outputs are kept up to date without it.
+        """
+        if self.input and not path.exists():
+            return self.input.digest
+
+        self.input = file_state(path, self.input)
+        return self.input.digest
+
+    def key(self, stage: str) -> t.Optional[str]:
+        """key the stage last began with"""
+        return self.stages.get(stage, {}).get("key")
+
+    def is_current(self, stage: str, key: str, output: Path) -> bool:
+        """whether stage finished with key and its output still exists"""
+        return self.stages.get(stage) == {"key": key, "done": True} and output.exists()
+
+    def begin(self, stage: str, key: str) -> None:
+        self.stages[stage] = {"key": key, "done": False}
+        self.save()
+
+    def finish(self, stage: str, key: str) -> None:
+        self.stages[stage] = {"key": key, "done": True}
+        self.save()
+
+    def save(self) -> None:
+        data = {
+            "version": VERSION,
+            "input": asdict(self.input) if self.input else None,
+            "stages": self.stages,
+        }
+        # replace the manifest at once, so a crash leaves the old or the new one
+        partial = self.path.with_suffix(".part")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial.write_text(json.dumps(data, indent=2) + "\n")
+        os.replace(partial, self.path)
+
+
+class VideoStages:
+    """Run only the stages of a video whose inputs changed since they last finished.
+
+    Args:
+        video: video with video_file and output_file set
+        engine: backend the video is run with, its settings and version are inputs
+            of ocr
+        lang: language recognized
+        force: run every stage, however up to date
+    """
+
+    def __init__(
+        self, video: "Video", engine: OCRBackend, lang: str = "ja", force: bool = False
+    ):
+        if not video.video_file or not video.output_file:
+            raise ValueError("video_file and output_file must be set")
+
+        self.video = video
+        self.force = force
+        self.manifest = Manifest(video.manifest_file)
+        self.ocr_key = stage_key(
+            video=self.manifest.input_digest(video.video_file),
+            settings=video.settings(lang),
+            engine=engine.settings_key(),
+            engine_version=engine.engine_version(),
+            version=package_version(),
+        )
+
+    def ocr_current(self) -> bool:
+        """whether ocr finished with the current inputs and is not forced to run"""
+        return not self.force and self.manifest.is_current(
+            "ocr", self.ocr_key, self.video.checkpoint_file
+        )
+
+    def needs_ocr(self) -> bool:
+        """whether ocr must run, begins it if so.
+
+        if not, the frames of the video are streamed from the checkpoint of the run
+        that finished with the same inputs. a checkpoint of a run with other inputs
+        is removed, since its frames may not match the video anymore.
+        """
+        video = self.video
+        checkpoint_file = video.checkpoint_file
+        if self.ocr_current():
+            logger.info(
+                f"skipping ocr of {video.video_file}, its inputs did not change."
+            )
+            metrics.incr("stages_skipped")
+            video.checkpoint = Checkpoint(checkpoint_file, {})
+            return False
+
+        previous = self.manifest.key("ocr")
+        if checkpoint_file.exists() and (
+            self.force or (previous and previous != self.ocr_key)
+        ):
+            logger.info(f"inputs of {video.video_file} changed, starting ocr over.")
+            checkpoint_file.unlink()
+
+        self.manifest.begin("ocr", self.ocr_key)
+        return True
+
+    def ocr_done(self) -> None:
+        self.manifest.finish("ocr", self.ocr_key)
+
+    def write(self, parquet: bool = False, tracks: bool = False) -> t.List[Path]:
+        """write the output files whose inputs changed, returns the paths written"""
+        video = self.video
+        outputs: t.Dict[str, t.Tuple[Path, t.Callable[[], Path]]] = {
+            "json": (video.output_file, video.to_json)
+        }
+        if parquet:
+            outputs["parquet"] = (
+                video.output_file.with_suffix(".parquet"),
+                video.to_parquet,
+            )
+        if tracks:
+            outputs["tracks"] = (
+                video.output_file.with_suffix(".tracks.json"),
+                video.to_tracks,
+            )
+
+        written = []
+        for stage, (path, write) in outputs.items():
+            key = stage_key(ocr=self.ocr_key, stage=stage)
+            if not self.force and self.manifest.is_current(stage, key, path):
+                metrics.incr("stages_skipped")
+                continue
+
+            self.manifest.begin(stage, key)
+            written.append(write())
+            self.manifest.finish(stage, key)
+
+        return written
@@ -0,0 +1,156 @@
+"""
+per-stage timings and counters of a run.
+
+instrumented code records into the module level `metrics`, which is disabled by
+default. while disabled, `metrics.stage` returns a shared no-op context manager and
+`metrics.incr` returns right away, so instrumentation costs next to nothing.
+"""
+
+import contextlib
+import cProfile
+import json
+import resource
+import sys
+import threading
+import time
+import typing as t
+from collections import defaultdict
+from pathlib import Path
+
+from video_ocr.config import get_logger
+
+logger = get_logger(__name__)
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class _Stage:
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Timings and counters, safe to record from several threads."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.seconds: t.Dict[str, float] = defaultdict(float)
+        self.calls: t.Dict[str, int] = defaultdict(int)
+        self.counters: t.Dict[str, int] = defaultdict(int)
+
+    def stage(self, name: str) -> t.ContextManager:
+        """time the block as part of stage `name`"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Stage(self, name)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.seconds[name] += seconds
+            self.calls[name] += 1
+
+    def incr(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += n
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "stages": {
+                name: {"seconds": seconds, "calls": self.calls[name]}
+                for name, seconds in self.seconds.items()
+            },
+            "counters": dict(self.counters),
+            "peak_rss_bytes": peak_rss(),
+            "peak_rss_children_bytes": peak_rss(children=True),
+        }
+
+
+metrics = Metrics()
+
+
+def peak_rss(children: bool = False) -> int:
+    """peak resident set size in bytes of this process, or of its largest finished child"""
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+@contextlib.contextmanager
+def recording(output: t.Optional[Path]) -> t.Iterator[Metrics]:
+    """enable metrics for the block and write them to output as JSON, if output is given"""
+    if output is None:
+        yield metrics
+        return
+
+    metrics.reset()
+    metrics.enabled = True
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.enabled = False
+        result = {"wall_seconds": time.perf_counter() - start, **metrics.to_dict()}
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(result, indent=2) + "\n")
+        logger.info(f"wrote metrics to {output}.")
+
+
+@contextlib.contextmanager
+def profiling(output: t.Optional[Path], profiler: str = "cprofile") -> t.Iterator[None]:
+    """profile the block and write the result to output, if output is given.
+
+    cprofile writes stats readable by `pstats`, pyinstrument writes an html report.
+    """
+    if output is None:
+        yield
+        return
+
+    if profiler not in PROFILERS:
+        raise ValueError(f"profiler must be one of {PROFILERS}, got {profiler}")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ValueError(
+                "pyinstrument is not installed, install it with `pip install pyinstrument`"
+            ) from e
+
+        instrument = Profiler()
+        instrument.start()
+        try:
+            yield
+        finally:
+            instrument.stop()
+            output.write_text(instrument.output_html())
+    else:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(str(output))
+
+    logger.info(f"wrote {profiler} profile to {output}.")
@@ -1,117 +1,195 @@
 """
-reference:
-mainly copied from : https://github.com/RhetTbull/textinator/blob/3aae89d0eea18aa44cd8304f30b50bc49b33b134/src/macvision.py
-also credits: https://github.com/straussmaximilian/ocrmac/blob/main/ocrmac/ocrmac.py
+ocr backends and their registry.
+
+backends are imported lazily by `get_backend`, so platform specific dependencies,
+e.g. pyobjc for Vision, are only needed when the backend is actually used. the
+registry itself lives in `video_ocr.backends`, which imports nothing heavy, and is
+re-exported here.
 """
 
+import importlib
 import typing as t
 from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
 
-import objc
-import Quartz
-import Vision
-from Foundation import NSURL, NSDictionary, NSLog
-from serde import serde
+from video_ocr.backends import (
+    _BACKENDS,
+    available_backends,
+    default_backend,
+    register_backend,  # noqa: F401
+)
+from video_ocr.metrics import metrics
 
 
-@serde
+# a plain dataclass, which serde (de)serializes as well, so ocr workers, which only
+# pickle results, do not import serde
 @dataclass(frozen=True)
 class OCRResult:
+    # without a __dict__ per instance, as long videos have millions of observations
+    __slots__ = ("text", "confidence", "bbox")
+
     text: str
     confidence: float
-    bbox: t.Tuple[float, float, float, float]  # x, y, weight, height
+    # x, y, weight, height. normalized to 0-1, origin at the bottom-left of the image
+    bbox: t.Tuple[float, float, float, float]
 
+    def __reduce__(self):
+        # the default pickling of slots sets attributes, which frozen instances refuse
+        return (OCRResult, (self.text, self.confidence, self.bbox))
 
-def detect_text(
-    image_path: str,
-    recognition_level: str = "accurate",
-    orientation: t.Optional[int] = None,
-    languages: t.Optional[t.List[str]] = None,
-) -> t.List[OCRResult]:
-    """process image with VNRecognizeTextRequest and return results
 
-    This code originally developed for https://github.com/RhetTbull/osxphotos
+class OCRBackend:
+    """Base class of ocr engines.
+
+    Subclasses implement `detect`, and may override `detect_batch` to amortize work
+    over many frames. a backend is created once per process and reused for every
+    frame, so expensive setup, e.g. configured requests or engine handles, belongs in
+    the backend and not in each call.
 
     Args:
-        image_path: path to image to process
         recognition_level: "accurate" or "fast"
-        orientation: orientation of image, 1-8, see https://developer.apple.com/documentation/imageio/kcgimagepropertyorientation
         languages: list of languages to recognize, e.g. ["en-US", "ja"]
-
+        orientation: orientation of image, 1-8, see https://developer.apple.com/documentation/imageio/kcgimagepropertyorientation
     """
 
-    if languages is None:
-        languages = ["en-US"]
-    input_url = NSURL.fileURLWithPath_(image_path)
+    name: t.ClassVar[str] = ""
+    # whether grayscale images are recognized as well as BGR ones
+    accepts_gray: t.ClassVar[bool] = False
 
-    """
-    with pipes() as (out, err):
-    # capture stdout and stderr from system calls
-    # otherwise, Quartz.CIImage.imageWithContentsOfURL_
-    # prints to stderr something like:
-    # 2020-09-20 20:55:25.538 python[73042:5650492] Creating client/daemon connection: B8FE995E-3F27-47F4-9FA8-559C615FD774
-    # 2020-09-20 20:55:25.652 python[73042:5650492] Got the query meta data reply for: com.apple.MobileAsset.RawCamera.Camera, response: 0
-        input_image = Quartz.CIImage.imageWithContentsOfURL_(input_url)
-    """
-    image = Quartz.CIImage.imageWithContentsOfURL_(input_url)
-
-    with objc.autorelease_pool():
-        vision_options = NSDictionary.dictionaryWithDictionary_({})
-        if orientation is None:
-            vision_handler = (
-                Vision.VNImageRequestHandler.alloc().initWithCIImage_options_(
-                    image, vision_options
-                )
-            )
-        elif 1 <= orientation <= 8:
-            vision_handler = Vision.VNImageRequestHandler.alloc().initWithCIImage_orientation_options_(
-                image, orientation, vision_options
-            )
-        else:
-            raise ValueError("orientation must be between 1 and 8")
-        results: t.List[OCRResult] = []
-        handler = make_request_handler(results)
-        vision_request = (
-            Vision.VNRecognizeTextRequest.alloc().initWithCompletionHandler_(handler)
+    def __init__(
+        self,
+        recognition_level: str = "accurate",
+        languages: t.Optional[t.List[str]] = None,
+        orientation: t.Optional[int] = None,
+    ):
+        if languages is None:
+            languages = ["en-US"]
+
+        self.recognition_level = recognition_level
+        self.languages = languages
+        self.orientation = orientation
+
+    def settings_key(self) -> str:
+        """settings that change the results of the backend, used as part of cache keys"""
+        return f"{self.name}:{self.recognition_level}:{','.join(self.languages)}:{self.orientation}"
+
+    def engine_version(self) -> str:
+        """version of the engine, whose results may change with it, see `video_ocr.manifest`"""
+        return ""
+
+    def detect(self, image: np.ndarray) -> t.List[OCRResult]:
+        """detect text in a BGR or grayscale image array as returned by cv2"""
+        raise NotImplementedError
+
+    def detect_batch(self, images: t.Sequence[np.ndarray]) -> t.List[t.List[OCRResult]]:
+        """detect text in many images, returns results in the same order"""
+        return [self.detect(image) for image in images]
+
+    def detect_file(self, path: t.Union[str, Path]) -> t.List[OCRResult]:
+        return self.detect(read_image(path))
+
+    def close(self) -> None:
+        """free engine handles, the backend is not used anymore"""
+
+    def __enter__(self) -> "OCRBackend":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_image(path: t.Union[str, Path]) -> np.ndarray:
+    image = cv2.imread(str(path))
+    if image is None:
+        raise ValueError(f"could not read image: {path}")
+
+    return image
+
+
+def get_backend_class(name: str) -> t.Type[OCRBackend]:
+    if name not in _BACKENDS:
+        raise ValueError(
+            f"unknown ocr backend: {name}. available: {available_backends()}"
         )
 
-        vision_request.setRecognitionLanguages_(languages)
-        vision_request.setUsesLanguageCorrection_(True)
+    backend = _BACKENDS[name]
+    if isinstance(backend, str):
+        module_name, class_name = backend.split(":")
+        backend = getattr(importlib.import_module(module_name), class_name)
+        _BACKENDS[name] = backend
 
-        if recognition_level == "fast":
-            vision_request.setRecognitionLevel_(1)
-        else:
-            vision_request.setRecognitionLevel_(0)
+    return backend
 
-        success, error = vision_handler.performRequests_error_([vision_request], None)
-        if not success:
-            raise ValueError(f"Vision request failed: {error}")
 
-        return results
+def get_backend(name: t.Optional[str] = None, **kwargs) -> OCRBackend:
+    """create a backend by name, see `OCRBackend` for kwargs"""
+    return get_backend_class(name or default_backend())(**kwargs)
 
 
-def make_request_handler(results):
-    """results: list to store results"""
-    if not isinstance(results, list):
-        raise ValueError("results must be a list")
+def run_batch(
+    engine: OCRBackend, images: t.Sequence[np.ndarray]
+) -> t.List[t.List[OCRResult]]:
+    """`engine.detect_batch`, recorded in metrics"""
+    with metrics.stage("ocr"):
+        results = engine.detect_batch(images)
+    metrics.incr("frames_ocr", len(images))
+    metrics.incr("pixels_ocr", sum(image.shape[0] * image.shape[1] for image in images))
 
-    def handler(request, error):
-        if error:
-            NSLog(f"Error! {error}")
-        else:
-            observations = request.results()
+    return results
 
-            for observation in observations:
-                bbox = observation.boundingBox()
-                w, h = bbox.size.width, bbox.size.height
-                x, y = bbox.origin.x, bbox.origin.y
 
-                results.append(
-                    OCRResult(
-                        text=observation.text(),
-                        confidence=observation.confidence(),
-                        bbox=[x, y, w, h],
-                    )
-                )
+def detect_text(
+    image: t.Union[str, Path, np.ndarray],
+    recognition_level: str = "accurate",
+    orientation: t.Optional[int] = None,
+    languages: t.Optional[t.List[str]] = None,
+    backend: t.Optional[str] = None,
+) -> t.List[OCRResult]:
+    """detect text in an image with a backend created for this call
+
+    Args:
+        image: path to image, or BGR/grayscale image array as returned by cv2, to process
+        recognition_level: "accurate" or "fast"
+        orientation: orientation of image, 1-8, see https://developer.apple.com/documentation/imageio/kcgimagepropertyorientation
+        languages: list of languages to recognize, e.g. ["en-US", "ja"]
+        backend: name of the backend, defaults to `default_backend()`
+    """
+    with get_backend(
+        backend,
+        recognition_level=recognition_level,
+        languages=languages,
+        orientation=orientation,
+    ) as engine:
+        if isinstance(image, np.ndarray):
+            return engine.detect(image)
+        return engine.detect_file(image)
+
+
+def detect_text_batch(
+    images: t.Sequence[t.Union[str, Path, np.ndarray]],
+    recognition_level: str = "accurate",
+    orientation: t.Optional[int] = None,
+    languages: t.Optional[t.List[str]] = None,
+    backend: t.Optional[str] = None,
+) -> t.List[t.List[OCRResult]]:
+    """detect text in many images with one backend, returns results in the same order.
 
-    return handler
+    the backend and its configured requests or engine handles are set up once for all
+    images, see `OCRBackend.detect_batch`, which is what makes this faster than
+    calling `detect_text` per image. see `detect_text` for the arguments.
+    """
+    with get_backend(
+        backend,
+        recognition_level=recognition_level,
+        languages=languages,
+        orientation=orientation,
+    ) as engine:
+        return engine.detect_batch(
+            [
+                image if isinstance(image, np.ndarray) else read_image(image)
+                for image in images
+            ]
+        )
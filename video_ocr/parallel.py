@@ -0,0 +1,249 @@
+"""
+sample a single video on many processes.
+
+the frames of the video are split into segments, each decoded and sampled by a worker
+process that seeks to its first frame, and the sampled frames are yielded in order.
+segment boundaries are on the sample grid, so every sampled frame belongs to exactly
+one segment, and are moved to keyframes where the decoder reports them, so a worker
+does not decode frames before its segment only to reach it. the last segment reads to
+the end of the video, since containers may report fewer frames than they have.
+
+a worker returns the sampled frames of its segment at once, so segments are also
+limited to `SEGMENT_SAMPLES` sampled frames, which bounds the frames in memory to
+that many per segment in flight, however small the step.
+"""
+
+import itertools
+import math
+import typing as t
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from video_ocr.config import get_logger
+from video_ocr.decode import open_video
+from video_ocr.metrics import metrics
+from video_ocr.sampling import FrameSampler, SampledFrame, SamplingStats
+
+logger = get_logger(__name__)
+
+SEGMENT_SECONDS = 60.0  # length of segments of a worker, if not given in frames
+SEGMENT_SAMPLES = 16  # sampled frames of a segment at most, if not given in frames
+
+
+def keyframe_indices(video_file: Path) -> t.List[int]:
+    """indices of keyframes of the video, read from packets without decoding them.
+
+    needs PyAV, returns an empty list without it.
+    """
+    try:
+        import av
+    except ImportError:
+        return []
+
+    with av.open(str(video_file)) as container:
+        stream = container.streams.video[0]
+        rate = stream.average_rate or stream.guessed_rate
+        if not rate:
+            return []
+
+        start = stream.start_time or 0
+        indices = [
+            round(float((packet.pts - start) * stream.time_base * rate))
+            for packet in container.demux(stream)
+            if packet.is_keyframe and packet.pts is not None
+        ]
+
+    return sorted(indices)
+
+
+def plan_segments(
+    total_frames: int,
+    step: int,
+    segment_frames: int,
+    keyframes: t.Sequence[int] = (),
+) -> t.List[t.Tuple[int, t.Optional[int]]]:
+    """split frames into ranges of about segment_frames, starting on the sample grid.
+
+    each boundary is moved to the nearest keyframe, if any are given, and then up to
+    the next sampled frame. the last range has no end, it reads to the end of the
+    video however many frames it has.
+    """
+    count = max(math.ceil(total_frames / max(segment_frames, 1)), 1)
+    boundaries = [0]
+    for k in range(1, count):
+        boundary = total_frames * k // count
+        if keyframes:
+            boundary = min(keyframes, key=lambda keyframe: abs(keyframe - boundary))
+        boundary = math.ceil(boundary / step) * step
+
+        if boundaries[-1] < boundary < total_frames:
+            boundaries.append(boundary)
+
+    return list(zip(boundaries, [*boundaries[1:], None]))
+
+
+def sample_segment(  # noqa: PLR0913
+    video_file: Path,
+    start: int,
+    end: t.Optional[int],
+    step: int,
+    seek: bool = False,
+    decoder: str = "cv2",
+    gray: bool = False,
+    width: t.Optional[int] = None,
+) -> t.Tuple[t.List[SampledFrame], SamplingStats]:
+    """sampled frames of the frames in [start, end), or from start to the end of the
+    video if end is None, grabbing every frame, or seeking to each sampled frame if
+    seek is set.
+    """
+    vid = open_video(video_file, decoder, gray, width)
+    stats = SamplingStats()
+    frames = []
+
+    try:
+        first = math.ceil(start / step) * step
+        indices: t.Iterable[int]
+        if end is None:
+            indices = itertools.count(first, step) if seek else itertools.count(start)
+        else:
+            indices = range(first, end, step) if seek else range(start, end)
+        position = 0  # index of the frame the next grab decodes
+        last = start - 1  # index of the last frame grabbed
+
+        for index in indices:
+            if index != position:
+                vid.seek(index)
+                stats.seeks += 1
+            position = index + 1
+
+            if not vid.grab():
+                break
+            last = index
+            stats.total_frames += 1
+
+            if index % step:
+                stats.grabbed += 1
+                continue
+
+            image = vid.retrieve()
+            if image is None:
+                break
+            stats.decoded += 1
+            frames.append(SampledFrame(index, vid.timestamp(), image))
+    finally:
+        vid.release()
+
+    if seek:
+        stats.total_frames = (last + 1 if end is None else end) - start
+    return frames, stats
+
+
+class ParallelSampler(FrameSampler):
+    """Sample a video like `FrameSampler`, decoding segments of it on worker processes.
+
+    falls back to sampling on the current process if the frame count of the video is
+    unknown.
+
+    Args:
+        video_file: path to the video
+        workers: number of worker processes
+        segment_frames: number of frames of a segment, defaults to `SEGMENT_SECONDS`,
+            or `SEGMENT_SAMPLES` sampled frames if that is shorter
+        **kwargs: step, interval, strategy, decoder, gray and width of `FrameSampler`
+    """
+
+    def __init__(
+        self,
+        video_file: Path,
+        workers: int = 2,
+        segment_frames: t.Optional[int] = None,
+        **kwargs,
+    ):
+        super().__init__(video_file, **kwargs)
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+
+        self.workers = workers
+        self.segment_frames = segment_frames
+
+    def __iter__(self) -> t.Iterator[SampledFrame]:
+        vid = open_video(self.video_file, self.decoder, self.gray, self.width)
+        try:
+            fps = vid.fps
+            total_frames = vid.total_frames
+        finally:
+            vid.release()
+
+        if total_frames <= 0:
+            logger.info(
+                f"frame count of {self.video_file} is unknown, not splitting it."
+            )
+            yield from super().__iter__()
+            return
+
+        step = self.get_step(fps)
+        strategy = self.choose_strategy(step, total_frames)
+        segment_frames = self.segment_frames or max(
+            min(round(SEGMENT_SECONDS * fps), SEGMENT_SAMPLES * step), 1
+        )
+        keyframes = keyframe_indices(self.video_file) if self.decoder == "pyav" else []
+        segments = plan_segments(total_frames, step, segment_frames, keyframes)
+
+        logger.info(
+            f"sampling every {step} frames of {self.video_file} by {strategy} "
+            f"in {len(segments)} segments on {self.workers} processes"
+        )
+        self.stats = SamplingStats()
+        queued = iter(segments)
+        in_flight: t.Deque[Future] = deque()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+
+            def submit() -> None:
+                segment = next(queued, None)
+                if segment is not None:
+                    in_flight.append(
+                        pool.submit(
+                            sample_segment,
+                            self.video_file,
+                            *segment,
+                            step,
+                            seek=strategy == "seek",
+                            decoder=self.decoder,
+                            gray=self.gray,
+                            width=self.width,
+                        )
+                    )
+
+            # keep a segment queued per worker, so workers do not wait for the consumer
+            for _ in range(2 * self.workers):
+                submit()
+
+            try:
+                while in_flight:
+                    with metrics.stage("decode"):
+                        frames, stats = in_flight.popleft().result()
+                    submit()
+
+                    for name in ("total_frames", "grabbed", "decoded", "seeks"):
+                        setattr(
+                            self.stats,
+                            name,
+                            getattr(self.stats, name) + getattr(stats, name),
+                        )
+                    for frame in frames:
+                        self.stats.sampled += 1
+                        yield frame
+            finally:
+                for future in in_flight:
+                    future.cancel()
+                metrics.incr("frames_grabbed", self.stats.grabbed)
+                metrics.incr("frames_decoded", self.stats.decoded)
+                metrics.incr("frames_sampled", self.stats.sampled)
+
+        stats = self.stats
+        logger.info(
+            f"sampled {stats.sampled} of {stats.total_frames} frames, "
+            f"decoded {stats.decoded} frames with {stats.seeks} seeks."
+        )
@@ -0,0 +1,220 @@
+"""
+download videos and run ocr on them in one pipeline.
+
+videos are downloaded by a pool of threads, decoded by `BatchRunner` threads and sent
+to its ocr processes, with bounded buffers between the stages, so downloads of the
+next videos overlap with decoding and ocr of the current ones, and disk and memory
+use stay bounded however long the playlist is.
+"""
+
+import shutil
+import typing as t
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from video_ocr.config import get_logger
+from video_ocr.execute import BatchRunner
+from video_ocr.manifest import VideoStages
+from video_ocr.ocr import OCRBackend, get_backend
+from video_ocr.video import Video
+
+logger = get_logger(__name__)
+
+
+class Downloader:
+    """Base class of sources of videos by id."""
+
+    def download(self, video_id: str, path: Path) -> None:
+        raise NotImplementedError
+
+
+class YouTubeDownloader(Downloader):
+    """Download videos from youtube.
+
+    Args:
+        resolution: worst/best or an itag, see `Video.download_video`
+    """
+
+    def __init__(self, resolution: str = "worst"):
+        self.resolution = resolution
+
+    def download(self, video_id: str, path: Path) -> None:
+        Video(video_file=path).download_video(video_id, resolution=self.resolution)
+
+
+class DirectoryDownloader(Downloader):
+    """Copy videos from a directory of files named by video id, e.g. `<id>.mp4`.
+
+    a stand-in for youtube, for tests and for videos downloaded by other means.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def download(self, video_id: str, path: Path) -> None:
+        files = sorted(self.directory.glob(f"{video_id}.*"))
+        if not files:
+            raise ValueError(f"no video of {video_id} in {self.directory}")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(files[0], path)
+
+
+class PlaylistRunner:
+    """Download videos and run ocr on them with a `BatchRunner`.
+
+    each video is saved to `<directory>/<video id>/`: the downloaded video as
+    `video.mp4`, and results as `video.json`. like `video-ocr batch`, only the stages
+    of a video whose inputs changed since they last finished run, see `VideoStages`,
+    and videos already downloaded are not downloaded again.
+
+    Args:
+        runner: runs ocr on downloaded videos
+        downloader: source of videos
+        directory: directory to save videos and results to
+        make_video: creates the video to run ocr on from the paths of a video and its
+            output file
+        download_workers: number of threads downloading videos
+        max_downloaded: number of videos downloaded ahead of ocr, defaults to twice
+            the number of download workers
+        force: run ocr and write the output files of every video, however up to date
+        keep_videos: keep downloaded videos after their ocr finished
+        parquet: also write the results of each video as parquet
+        tracks: also write the text tracks of each video
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        runner: BatchRunner,
+        downloader: Downloader,
+        directory: Path,
+        make_video: t.Callable[[Path, Path], Video],
+        download_workers: int = 4,
+        max_downloaded: t.Optional[int] = None,
+        force: bool = False,
+        keep_videos: bool = True,
+        parquet: bool = False,
+        tracks: bool = False,
+    ):
+        self.runner = runner
+        self.downloader = downloader
+        self.directory = directory
+        self.make_video = make_video
+        self.download_workers = download_workers
+        self.max_downloaded = max_downloaded or 2 * download_workers
+        self.force = force
+        self.keep_videos = keep_videos
+        self.parquet = parquet
+        self.tracks = tracks
+
+    def video_file(self, video_id: str) -> Path:
+        return self.directory / video_id / "video.mp4"
+
+    def output_file(self, video_id: str) -> Path:
+        return self.directory / video_id / "video.json"
+
+    def _make_video(self, video_id: str) -> Video:
+        video = self.make_video(self.video_file(video_id), self.output_file(video_id))
+        # the backend of the runner is an input of ocr
+        video.backend = self.runner.backend
+        return video
+
+    def _write(self, stages: VideoStages) -> None:
+        stages.write(parquet=self.parquet, tracks=self.tracks)
+        video_file = stages.video.video_file
+        if not self.keep_videos and video_file and video_file.exists():
+            video_file.unlink()
+
+    def pending(self, video_ids: t.Iterable[str], engine: OCRBackend) -> t.List[str]:
+        """ids of videos to download, in order and without duplicates.
+
+        a video removed after its ocr is not downloaded again while its ocr is up to
+        date, judged by the digest of the video in its manifest, only its output files
+        are written.
+        """
+        pending = []
+        for video_id in dict.fromkeys(video_ids):
+            video = self._make_video(video_id)
+            if not video.video_file.exists() and video.manifest_file.exists():
+                stages = VideoStages(video, engine, self.runner.lang, self.force)
+                if stages.ocr_current():
+                    logger.info(f"skipping {video_id}, already done.")
+                    stages.needs_ocr()
+                    self._write(stages)
+                    continue
+            pending.append(video_id)
+
+        return pending
+
+    def _download(self, video_id: str) -> Video:
+        video_file = self.video_file(video_id)
+        if not video_file.exists():
+            # download next to the final path, so an interrupted download is not reused
+            partial = video_file.with_suffix(".part")
+            self.downloader.download(video_id, partial)
+            partial.replace(video_file)
+
+        return self._make_video(video_id)
+
+    def iter_downloads(self, video_ids: t.Iterable[str]) -> t.Iterator[Video]:
+        """download videos on threads, yielding each video as its download finishes.
+
+        at most `max_downloaded` videos are downloading or waiting to be yielded.
+        videos that failed to download are logged and skipped.
+        """
+        ids = iter(video_ids)
+        downloads: t.Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+            try:
+                while True:
+                    while len(downloads) < self.max_downloaded:
+                        video_id = next(ids, None)
+                        if video_id is None:
+                            break
+                        downloads[pool.submit(self._download, video_id)] = video_id
+
+                    if not downloads:
+                        return
+
+                    done, _ = wait(downloads, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        video_id = downloads.pop(future)
+                        try:
+                            video = future.result()
+                        except Exception as e:
+                            logger.error(f"failed to download {video_id}: {e}")
+                            continue
+                        yield video
+            finally:
+                for future in downloads:
+                    future.cancel()
+
+    def run(self, video_ids: t.Iterable[str]) -> t.Iterator[Video]:
+        """download and run ocr on videos, yielding each video ocr ran on.
+
+        output files of each video are written before it is yielded. videos whose ocr
+        is up to date are not yielded, only their output files that are not.
+        """
+        with get_backend(self.runner.backend, languages=[self.runner.lang]) as engine:
+            pending = self.pending(video_ids, engine)
+            logger.info(f"running {len(pending)} videos...")
+            # stages of videos sent to ocr, by output file
+            stages: t.Dict[Path, VideoStages] = {}
+
+            def iter_videos() -> t.Iterator[Video]:
+                for video in self.iter_downloads(pending):
+                    video_stages = VideoStages(
+                        video, engine, self.runner.lang, self.force
+                    )
+                    if video_stages.needs_ocr():
+                        stages[video.output_file] = video_stages
+                        yield video
+                    else:
+                        self._write(video_stages)
+
+            for video in self.runner.run(iter_videos()):
+                video_stages = stages.pop(video.output_file)
+                video_stages.ocr_done()
+                self._write(video_stages)
+                yield video
@@ -2,14 +2,12 @@ import typing as t
 from dataclasses import dataclass, field
 from pathlib import Path
 
-import googleapiclient.discovery
-import googleapiclient.errors
 from serde import serde
 from serde.json import from_json, to_json
 
 import video_ocr as vo
-from video_ocr import get_key
 from video_ocr.config import get_logger
+from video_ocr.fetch import PlaylistFetcher
 
 logger = get_logger(__name__)
 
@@ -24,53 +22,41 @@ class Playlist:
     def get_json_file() -> Path:
         return vo.config.DATA_DIR / "playlist.json"
 
-    def __get_api(self) -> googleapiclient.discovery.Resource:
-        YOUTUBE_API_KEY = get_key("YOUTUBE_API_KEY")
+    def get_playlist(
+        self, fetcher: t.Optional[PlaylistFetcher] = None, refresh: bool = False
+    ) -> t.Optional[t.List[dict]]:
+        """fetch the items of the playlist, None if the request failed"""
+        playlists = self.get_playlists([self.playlist_id], fetcher, refresh)
+        if not playlists:
+            return None
 
-        if not YOUTUBE_API_KEY:
-            raise Exception("YOUTUBE_API_KEY is not set")
+        self.items = playlists[0].items
+        return self.items
 
-        api_service_name = "youtube"
-        api_version = "v3"
-
-        youtube = googleapiclient.discovery.build(
-            api_service_name, api_version, developerKey=YOUTUBE_API_KEY
-        )
-
-        return youtube
-
-    def get_playlist(self, max_results: int = 500) -> t.Optional[t.List[dict]]:
-        youtube = self.__get_api()
-        next_page_token = None
-
-        items = []
-
-        while True:
-            logger.info("requesting playlist items...")
-            request = youtube.playlistItems().list(
-                part="snippet,contentDetails",
-                playlistId=self.playlist_id,
-                maxResults=max_results,
-                pageToken=next_page_token,
-            )
-
-            try:
-                response = request.execute()
-            except googleapiclient.errors.HttpError as e:
-                logger.error("HttpError when requesting playlist items:")
-                logger.error(e)
-                return None
-
-            items.extend(response["items"])
-
-            next_page_token = response.get("nextPageToken")
-
-            if not next_page_token:
-                logger.info("finish requesting playlist items.")
-                break
-
-        self.items = items
-        return items
+    @classmethod
+    def get_playlists(
+        cls,
+        playlist_ids: t.Iterable[str],
+        fetcher: t.Optional[PlaylistFetcher] = None,
+        refresh: bool = False,
+    ) -> t.List["Playlist"]:
+        """fetch many playlists at once, leaving out the ones whose requests failed.
+
+        see `PlaylistFetcher`, a new one is used and closed unless fetcher is given.
+        """
+        own_fetcher = fetcher is None
+        fetcher = fetcher or PlaylistFetcher()
+        try:
+            items = fetcher.run(playlist_ids, refresh)
+        finally:
+            if own_fetcher:
+                fetcher.close()
+
+        return [
+            cls(playlist_id, playlist_items)
+            for playlist_id, playlist_items in items.items()
+            if playlist_items is not None
+        ]
 
     def first_video_id_item(self, video_id):
         for item in self.items:
@@ -93,8 +79,9 @@ class Playlist:
         return output
 
     @classmethod
-    def from_json(cls) -> "Playlist":
-        json_file = cls.get_json_file()
+    def from_json(cls, json_file: t.Optional[Path] = None) -> "Playlist":
+        if not json_file:
+            json_file = cls.get_json_file()
 
         with open(json_file) as f:
             s = f.read()
@@ -0,0 +1,148 @@
+"""
+skip ocr on frames that have no text in them.
+
+a frame is scored by the density of edges in blobs shaped like lines of text in a
+downscaled copy, a fraction of the cost of ocr. frames scoring below the threshold are
+taken to have no text and never sent to ocr. text too small or too faint to make such
+blobs is missed, so the threshold trades recall for speed; `calibrate` measures how
+much against full ocr of a sample of frames.
+"""
+
+import typing as t
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from video_ocr.config import DEFAULT_TEXT_THRESHOLD, get_logger
+from video_ocr.ocr import OCRBackend, run_batch
+from video_ocr.roi import DETECT_WIDTH, EDGE_THRESHOLD, edge_blobs
+from video_ocr.stream import batched
+
+logger = get_logger(__name__)
+
+MIN_LINE_HEIGHT = 0.01  # of a blob of text, relative to the frame height
+MAX_LINE_HEIGHT = 0.25
+MIN_FILL = 0.1  # fraction of edge pixels in the bounding box of a blob of text
+
+# thresholds reported by `calibrate` by default
+THRESHOLDS = (0.0, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05)
+
+
+def text_score(
+    image: np.ndarray,
+    width: int = DETECT_WIDTH,
+    edge_threshold: int = EDGE_THRESHOLD,
+) -> float:
+    """fraction of pixels of a downscaled copy that are edges of text-like blobs.
+
+    blobs of edges, see `edge_blobs`, too tall, e.g. faces, or too sparse in edges,
+    e.g. outlines, are left out.
+    """
+    edges, count, labels, stats = edge_blobs(image, width, edge_threshold)
+    height, width = edges.shape
+    if count <= 1:
+        return 0.0
+
+    # edge pixels of each blob
+    edge_counts = np.bincount(labels[edges > 0], minlength=count)
+    blob_height = stats[:, cv2.CC_STAT_HEIGHT]
+    box_area = stats[:, cv2.CC_STAT_WIDTH] * blob_height
+    text_like = (
+        (blob_height >= MIN_LINE_HEIGHT * height)
+        & (blob_height <= MAX_LINE_HEIGHT * height)
+        & (edge_counts >= MIN_FILL * box_area)
+    )
+    text_like[0] = False  # background
+
+    return float(edge_counts[text_like].sum() / (height * width))
+
+
+@dataclass
+class PrefilterStats:
+    frames: int = 0  # frames scored
+    skipped: int = 0  # frames taken to have no text
+
+    @property
+    def skip_ratio(self) -> float:
+        return self.skipped / self.frames if self.frames else 0.0
+
+
+class TextPrefilter:
+    """Find frames without text before sending them to ocr.
+
+    Args:
+        threshold: lowest `text_score` of a frame that may have text
+    """
+
+    def __init__(self, threshold: float = DEFAULT_TEXT_THRESHOLD):
+        if threshold < 0:
+            raise ValueError("threshold must not be negative")
+
+        self.threshold = threshold
+        self.stats = PrefilterStats()
+
+    def has_text(self, image: np.ndarray) -> bool:
+        self.stats.frames += 1
+        if text_score(image) >= self.threshold:
+            return True
+
+        self.stats.skipped += 1
+        return False
+
+    def log_stats(self) -> None:
+        stats = self.stats
+        logger.info(
+            f"skipped ocr on {stats.skipped} of {stats.frames} frames "
+            f"({stats.skip_ratio:.1%}) as without text."
+        )
+
+
+@dataclass
+class CalibrationPoint:
+    threshold: float
+    precision: float  # of frames passed to ocr, the fraction with text
+    recall: float  # of frames with text, the fraction passed to ocr
+    skip_ratio: float  # fraction of frames not passed to ocr
+
+
+def score_frames(
+    images: t.Iterable[np.ndarray], engine: OCRBackend, batch_size: int = 4
+) -> t.Tuple[t.List[float], t.List[bool]]:
+    """text scores of images, and whether full ocr by engine finds text in them"""
+    scores: t.List[float] = []
+    has_text: t.List[bool] = []
+    for batch in batched(images, batch_size):
+        scores.extend(text_score(image) for image in batch)
+        has_text.extend(bool(results) for results in run_batch(engine, batch))
+
+    return scores, has_text
+
+
+def calibrate(
+    scores: t.Sequence[float],
+    has_text: t.Sequence[bool],
+    thresholds: t.Sequence[float] = THRESHOLDS,
+) -> t.List[CalibrationPoint]:
+    """precision and recall of the prefilter at each threshold, given the scores of
+    frames and whether full ocr found text in them.
+    """
+    if len(scores) != len(has_text):
+        raise ValueError("scores and has_text must have the same length")
+
+    score_array = np.asarray(scores, dtype=float)
+    truth = np.asarray(has_text, dtype=bool)
+    points = []
+    for threshold in thresholds:
+        passed = score_array >= threshold
+        true_positives = int(np.count_nonzero(passed & truth))
+        points.append(
+            CalibrationPoint(
+                threshold=threshold,
+                precision=true_positives / max(int(passed.sum()), 1),
+                recall=true_positives / int(truth.sum()) if truth.any() else 1.0,
+                skip_ratio=1 - float(passed.mean()) if len(passed) else 0.0,
+            )
+        )
+
+    return points
@@ -0,0 +1,250 @@
+"""
+crop frames to the regions text is in before ocr.
+
+regions are either given, e.g. a subtitle band at the bottom of the frame, or detected
+per frame from the density of edges in a downscaled copy. only the cropped, and
+optionally downscaled, patches are sent to ocr, and the bboxes of their results are
+mapped back to the full frame.
+"""
+
+import typing as t
+
+import cv2
+import numpy as np
+
+from video_ocr.config import get_logger
+from video_ocr.ocr import OCRResult
+
+logger = get_logger(__name__)
+
+# x, y, width, height. normalized to 0-1, origin at the top-left of the frame
+Region = t.Tuple[float, float, float, float]
+# x, y, width, height in pixels, origin at the top-left of the frame
+Rect = t.Tuple[int, int, int, int]
+
+DETECT_WIDTH = 320  # width of the copy text regions are detected in
+EDGE_THRESHOLD = 48  # morphological gradient of an edge pixel
+MIN_AREA = 0.001  # smallest area of a detected region, relative to the frame
+PADDING = 0.01  # padding around detected regions, relative to the frame
+MAX_REGIONS = 8  # more detected regions are merged into one
+
+
+def parse_region(s: str) -> Region:
+    """parse "x,y,w,h" of a normalized region"""
+    try:
+        x, y, w, h = (float(v) for v in s.split(","))
+    except ValueError as e:
+        raise ValueError(f"region must be x,y,w,h, got {s!r}") from e
+
+    # allow for rounding errors of values like 0.8 + 0.2
+    if (
+        not (0 <= x < 1 and 0 <= y < 1 and 0 < w and 0 < h)
+        or max(x + w, y + h) > 1 + 1e-9
+    ):
+        raise ValueError(f"region must lie within 0-1 and not be empty, got {s!r}")
+    return (x, y, w, h)
+
+
+def to_rect(region: Region, shape: t.Tuple[int, ...]) -> Rect:
+    """pixels of a normalized region in a frame of shape"""
+    height, width = shape[:2]
+    left, top = int(region[0] * width), int(region[1] * height)
+    right = min(max(round((region[0] + region[2]) * width), left + 1), width)
+    bottom = min(max(round((region[1] + region[3]) * height), top + 1), height)
+
+    return (left, top, right - left, bottom - top)
+
+
+def _overlap(a: Rect, b: Rect) -> bool:
+    return (
+        a[0] <= b[0] + b[2]
+        and b[0] <= a[0] + a[2]
+        and a[1] <= b[1] + b[3]
+        and b[1] <= a[1] + a[3]
+    )
+
+
+def _union(a: Rect, b: Rect) -> Rect:
+    left, top = min(a[0], b[0]), min(a[1], b[1])
+    right, bottom = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (left, top, right - left, bottom - top)
+
+
+def merge_rects(rects: t.List[Rect]) -> t.List[Rect]:
+    """merge overlapping rects until none overlap"""
+    merged: t.List[Rect] = []
+    for rect in rects:
+        current = rect
+        while True:
+            overlapping = [m for m in merged if _overlap(m, current)]
+            if not overlapping:
+                break
+            for m in overlapping:
+                merged.remove(m)
+                current = _union(current, m)
+        merged.append(current)
+
+    return sorted(merged, key=lambda r: (r[1], r[0]))
+
+
+class EdgeBlobs(t.NamedTuple):
+    """blobs of edges in a downscaled copy of a frame, see `edge_blobs`"""
+
+    edges: np.ndarray  # nonzero on edge pixels
+    count: int  # of blobs, including the background as label 0
+    labels: np.ndarray  # label of the blob of each pixel
+    stats: np.ndarray  # of each blob, indexed by cv2.CC_STAT_*
+
+
+def edge_blobs(
+    image: np.ndarray,
+    width: int = DETECT_WIDTH,
+    edge_threshold: int = EDGE_THRESHOLD,
+) -> EdgeBlobs:
+    """blobs of edges of a copy of a frame downscaled to width.
+
+    edges are closed horizontally, so characters of a line join into one blob.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = min(width / gray.shape[1], 1.0)
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    gradient = cv2.morphologyEx(
+        small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    )
+    _, edges = cv2.threshold(gradient, edge_threshold, 255, cv2.THRESH_BINARY)
+    joined = cv2.morphologyEx(
+        edges,
+        cv2.MORPH_CLOSE,
+        cv2.getStructuringElement(cv2.MORPH_RECT, (max(small.shape[1] // 40, 3), 3)),
+    )
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(joined)
+    return EdgeBlobs(edges, count, labels, stats)
+
+
+def detect_text_regions(  # noqa: PLR0913
+    image: np.ndarray,
+    width: int = DETECT_WIDTH,
+    edge_threshold: int = EDGE_THRESHOLD,
+    min_area: float = MIN_AREA,
+    padding: float = PADDING,
+    max_regions: int = MAX_REGIONS,
+) -> t.List[Region]:
+    """regions of a frame dense with edges, e.g. lines of text.
+
+    the bounding boxes of large enough blobs of edges are returned, see `edge_blobs`.
+    """
+    blobs = edge_blobs(image, width, edge_threshold)
+    height, width = blobs.edges.shape
+    count, stats = blobs.count, blobs.stats
+
+    pad_x, pad_y = round(padding * width), round(padding * height)
+    rects = []
+    for x, y, w, h, _ in stats[1:count]:
+        if w * h < min_area * width * height:
+            continue
+        left, top = max(x - pad_x, 0), max(y - pad_y, 0)
+        right, bottom = min(x + w + pad_x, width), min(y + h + pad_y, height)
+        rects.append((int(left), int(top), int(right - left), int(bottom - top)))
+
+    rects = merge_rects(rects)
+    if len(rects) > max_regions:
+        union = rects[0]
+        for rect in rects[1:]:
+            union = _union(union, rect)
+        rects = [union]
+
+    return [(x / width, y / height, w / width, h / height) for x, y, w, h in rects]
+
+
+def remap(result: OCRResult, rect: Rect, shape: t.Tuple[int, ...]) -> OCRResult:
+    """result of a patch cut at rect, with its bbox relative to the full frame"""
+    height, width = shape[:2]
+    left, top, w, h = rect
+    x, y, bw, bh = result.bbox
+
+    # bboxes have their origin at the bottom-left, rects at the top-left
+    bottom = height - (top + h)
+    return OCRResult(
+        text=result.text,
+        confidence=result.confidence,
+        bbox=(
+            (left + x * w) / width,
+            (bottom + y * h) / height,
+            bw * w / width,
+            bh * h / height,
+        ),
+    )
+
+
+class Crop(t.NamedTuple):
+    """where a patch sent to ocr was cut from"""
+
+    image: int  # position of the frame in the images passed to `RegionCropper.crop`
+    rect: Rect
+    shape: t.Tuple[int, ...]  # shape of the frame
+
+
+class RegionCropper:
+    """Cut frames into patches of text regions, and merge the ocr results of patches.
+
+    Args:
+        regions: normalized regions to crop, see `Region`
+        auto: detect regions of each frame with `detect_text_regions` instead.
+            frames without any are not sent to ocr
+        scale: factor to downscale patches by, 1 keeps the full resolution
+    """
+
+    def __init__(
+        self,
+        regions: t.Optional[t.Sequence[Region]] = None,
+        auto: bool = False,
+        scale: float = 1.0,
+    ):
+        if regions and auto:
+            raise ValueError("regions can not be given with auto")
+        if not 0 < scale <= 1:
+            raise ValueError("scale must be within (0, 1]")
+
+        self.regions = list(regions or [(0.0, 0.0, 1.0, 1.0)])
+        self.auto = auto
+        self.scale = scale
+
+    def crop(
+        self, images: t.Sequence[np.ndarray]
+    ) -> t.Tuple[t.List[np.ndarray], t.List[Crop]]:
+        """patches to send to ocr, and where each patch was cut from"""
+        patches = []
+        crops = []
+        for i, image in enumerate(images):
+            regions = detect_text_regions(image) if self.auto else self.regions
+            rects = merge_rects([to_rect(region, image.shape) for region in regions])
+            for rect in rects:
+                left, top, w, h = rect
+                patch = image[top : top + h, left : left + w]
+                if self.scale < 1:
+                    patch = cv2.resize(
+                        patch,
+                        (max(round(w * self.scale), 1), max(round(h * self.scale), 1)),
+                        interpolation=cv2.INTER_AREA,
+                    )
+                patches.append(patch)
+                crops.append(Crop(i, rect, image.shape))
+
+        return patches, crops
+
+    def merge(
+        self,
+        results: t.Sequence[t.List[OCRResult]],
+        crops: t.Sequence[Crop],
+        count: int,
+    ) -> t.List[t.List[OCRResult]]:
+        """results of `count` images, from the results of their patches"""
+        merged: t.List[t.List[OCRResult]] = [[] for _ in range(count)]
+        for patch_results, crop in zip(results, crops):
+            merged[crop.image].extend(
+                remap(result, crop.rect, crop.shape) for result in patch_results
+            )
+
+        return merged
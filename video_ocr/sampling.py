@@ -0,0 +1,252 @@
+"""
+frame sampling for videos.
+
+`cv2.VideoCapture.read()` is `grab()` (demux and decode the next frame) followed by
+`retrieve()` (convert the decoded frame into a BGR numpy array). Sampling only needs
+the conversion for frames that are kept, so skipped frames are only grabbed.
+When samples are far apart, seeking straight to each sample skips even the grabs
+in between, at the cost of decoding forward from the preceding keyframe.
+
+frames are decoded by a `VideoReader` of `video_ocr.decode`, cv2 by default, which
+offers the same `grab()`/`retrieve()` split.
+
+`AdaptiveSampler` samples densely while the picture changes and sparsely while it
+does not, instead of every n-th frame.
+"""
+
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from video_ocr.config import STRATEGIES, get_logger
+from video_ocr.decode import VideoReader, open_video
+from video_ocr.dedup import DEFAULT_THRESHOLD, changed_pixels, signature
+from video_ocr.metrics import metrics
+
+logger = get_logger(__name__)
+
+# if sampled frames are at least this many frames apart, `auto` seeks to each sample
+# instead of grabbing every frame in between. typical keyframe intervals are
+# 2-10 seconds, and a seek decodes forward from the last keyframe, so seeking only
+# pays off when samples are further apart than that.
+SEEK_THRESHOLD = 300
+
+
+class SampledFrame(t.NamedTuple):
+    index: int  # frame index in the video
+    timestamp: float  # seconds from the start of the video
+    image: np.ndarray  # BGR image, or grayscale if decoded so
+
+
+@dataclass
+class SamplingStats:
+    total_frames: int = 0  # frames in the video
+    sampled: int = 0  # frames returned to the caller
+    grabbed: int = 0  # frames grabbed but not converted to an image
+    decoded: int = 0  # frames converted to an image, `read()` or `retrieve()`
+    seeks: int = 0
+
+    @property
+    def decodes_saved(self) -> int:
+        """number of frame conversions saved compared to `read()` on every frame"""
+        return max(self.total_frames - self.decoded, 0)
+
+
+class FrameSampler:
+    """Iterate over every `step`-th frame, or one frame every `interval` seconds, of a video.
+
+    Args:
+        video_file: path to the video
+        step: sample every `step`-th frame
+        interval: sample one frame every `interval` seconds, overrides `step`
+        strategy: "grab" to grab every frame and only retrieve sampled ones,
+            "seek" to seek to each sampled frame, "auto" to choose by sampling density.
+            use `AdaptiveSampler` for "adaptive".
+        decoder: decoder of `video_ocr.decode.DECODERS`
+        gray: decode sampled frames to grayscale images
+        width: decode sampled frames downscaled to this width
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        video_file: Path,
+        step: int = 100,
+        interval: t.Optional[float] = None,
+        strategy: str = "auto",
+        decoder: str = "cv2",
+        gray: bool = False,
+        width: t.Optional[int] = None,
+    ):
+        if strategy not in STRATEGIES or strategy == "adaptive":
+            raise ValueError(f"strategy must be one of {STRATEGIES}, got {strategy}")
+        if step < 1:
+            raise ValueError("step must be a positive integer")
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self.video_file = video_file
+        self.step = step
+        self.interval = interval
+        self.strategy = strategy
+        self.decoder = decoder
+        self.gray = gray
+        self.width = width
+        self.stats = SamplingStats()
+
+    def get_step(self, fps: float) -> int:
+        if self.interval is None:
+            return self.step
+
+        if fps <= 0:
+            raise ValueError(
+                f"could not get fps of {self.video_file}, needed to sample by interval."
+            )
+        return max(round(self.interval * fps), 1)
+
+    def choose_strategy(self, step: int, total_frames: int) -> str:
+        if self.strategy != "auto":
+            return self.strategy
+
+        # seeking relies on the frame count, which some containers do not report
+        if total_frames > 0 and step >= SEEK_THRESHOLD:
+            return "seek"
+        return "grab"
+
+    def __iter__(self) -> t.Iterator[SampledFrame]:
+        vid = open_video(self.video_file, self.decoder, self.gray, self.width)
+        self.stats = SamplingStats()
+
+        try:
+            fps = vid.fps
+            total_frames = vid.total_frames
+            step = self.get_step(fps)
+            strategy = self.choose_strategy(step, total_frames)
+
+            logger.info(
+                f"sampling every {step} frames of {self.video_file} by {strategy} "
+                f"with {vid.name}"
+            )
+            if strategy == "seek":
+                frames = self._iter_seek(vid, step, fps, total_frames)
+            else:
+                frames = self._iter_grab(vid, step, fps)
+
+            while True:
+                with metrics.stage("decode"):
+                    frame = next(frames, None)
+                if frame is None:
+                    break
+
+                self.stats.sampled += 1
+                yield frame
+        finally:
+            vid.release()
+            metrics.incr("frames_grabbed", self.stats.grabbed)
+            metrics.incr("frames_decoded", self.stats.decoded)
+            metrics.incr("frames_sampled", self.stats.sampled)
+
+        stats = self.stats
+        logger.info(
+            f"sampled {stats.sampled} of {stats.total_frames} frames, "
+            f"decoded {stats.decoded} frames ({stats.decodes_saved} decodes saved) "
+            f"with {stats.seeks} seeks."
+        )
+
+    def _iter_grab(
+        self, vid: VideoReader, step: int, fps: float
+    ) -> t.Iterator[SampledFrame]:
+        index = 0
+
+        while vid.grab():
+            self.stats.total_frames += 1
+
+            if index % step == 0:
+                image = vid.retrieve()
+                if image is None:
+                    break
+
+                self.stats.decoded += 1
+                yield SampledFrame(index, vid.timestamp(), image)
+            else:
+                self.stats.grabbed += 1
+
+            index += 1
+
+    def _iter_seek(
+        self, vid: VideoReader, step: int, fps: float, total_frames: int
+    ) -> t.Iterator[SampledFrame]:
+        self.stats.total_frames = total_frames
+
+        for index in range(0, total_frames, step):
+            # the very first frame does not need a seek
+            if index:
+                vid.seek(index)
+                self.stats.seeks += 1
+
+            # frame count of the container may overestimate the number of frames
+            image = vid.retrieve() if vid.grab() else None
+            if image is None:
+                break
+
+            self.stats.decoded += 1
+            yield SampledFrame(index, vid.timestamp(), image)
+
+
+class AdaptiveSampler(FrameSampler):
+    """Sample densely around scene changes and sparsely elsewhere.
+
+    Frames are probed every `min_interval` seconds and compared by the signature used
+    for deduplication. A probe is sampled if it changed from the previous probe, if the
+    previous probe changed, so the settled picture after a change is sampled too,
+    or if `max_interval` seconds passed since the last sample.
+
+    Args:
+        video_file: path to the video
+        min_interval: seconds between probes, the shortest interval between samples
+        max_interval: longest interval in seconds between samples
+        threshold: number of changed signature pixels of a probe still treated as unchanged
+        **kwargs: decoder, gray and width of `FrameSampler`
+    """
+
+    def __init__(
+        self,
+        video_file: Path,
+        min_interval: float = 0.25,
+        max_interval: float = 4.0,
+        threshold: int = DEFAULT_THRESHOLD,
+        **kwargs,
+    ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("intervals must satisfy 0 < min_interval <= max_interval")
+
+        super().__init__(video_file, interval=min_interval, strategy="grab", **kwargs)
+        self.max_interval = max_interval
+        self.threshold = threshold
+
+    def _iter_grab(
+        self, vid: VideoReader, step: int, fps: float
+    ) -> t.Iterator[SampledFrame]:
+        max_step = max(round(self.max_interval * fps), step)
+        previous: t.Optional[np.ndarray] = None
+        previous_changed = False
+        last_index = 0
+
+        for probe in super()._iter_grab(vid, step, fps):
+            current = signature(probe.image)
+            changed = (
+                previous is not None
+                and changed_pixels(previous, current) > self.threshold
+            )
+
+            if (
+                previous is None
+                or changed
+                or previous_changed
+                or probe.index - last_index >= max_step
+            ):
+                last_index = probe.index
+                yield probe
+
+            previous, previous_changed = current, changed
@@ -0,0 +1,136 @@
+"""
+pass frames to worker processes through shared memory instead of pickling them.
+
+a `FrameRing` is a block of shared memory cut into fixed-size slots. the process that
+made it copies the images of a chunk into a free slot, and sends workers only their
+offsets and shapes, which `read_chunk` turns into numpy views of the same memory,
+without a copy. a slot is released once the worker returned its results, and writers
+wait for a free slot while all are in use, which bounds the memory of frames in
+flight.
+
+readers must be child processes of the writer, e.g. of a `ProcessPoolExecutor`, which
+share its resource tracker, so the memory is unlinked once, by the writer.
+"""
+
+import threading
+import typing as t
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+ALIGNMENT = 64  # bytes, images start on cache lines
+
+
+class FrameRef(t.NamedTuple):
+    offset: int  # bytes from the start of the shared memory
+    shape: t.Tuple[int, ...]
+    dtype: str
+
+
+class ChunkRef(t.NamedTuple):
+    """images of a chunk in a slot, what is sent to workers instead of the images"""
+
+    name: str  # of the shared memory
+    slot: int
+    frames: t.List[FrameRef]
+
+
+def _aligned(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+class FrameRing:
+    """Slots of frames in shared memory, written by this process and read by its children.
+
+    Args:
+        slots: number of slots, e.g. the number of chunks in flight
+        slot_bytes: size of a slot, chunks with more bytes of images do not fit
+    """
+
+    def __init__(self, slots: int, slot_bytes: int):
+        if slots < 1:
+            raise ValueError("slots must be a positive integer")
+        if slot_bytes < ALIGNMENT:
+            raise ValueError(f"slot_bytes must be at least {ALIGNMENT}")
+
+        self.slots = slots
+        self.slot_bytes = _aligned(slot_bytes)
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=slots * self.slot_bytes
+        )
+        self.free: t.Deque[int] = deque(range(slots))
+        self.condition = threading.Condition()
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def fits(self, images: t.Sequence[np.ndarray]) -> bool:
+        return sum(_aligned(image.nbytes) for image in images) <= self.slot_bytes
+
+    def acquire(self, timeout: t.Optional[float] = None) -> int:
+        """index of a free slot, waiting for one to be released while all are in use"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.free, timeout):
+                raise TimeoutError(f"no slot was released within {timeout} seconds")
+            return self.free.popleft()
+
+    def release(self, slot: int) -> None:
+        """free slot for the next chunk, once no reader uses its images anymore"""
+        with self.condition:
+            self.free.append(slot)
+            self.condition.notify()
+
+    def write(self, slot: int, images: t.Sequence[np.ndarray]) -> ChunkRef:
+        """copy images into slot, the only copy of frames on their way to readers"""
+        if not self.fits(images):
+            raise ValueError(
+                f"images do not fit into a slot of {self.slot_bytes} bytes"
+            )
+
+        offset = slot * self.slot_bytes
+        frames = []
+        for image in images:
+            view = np.ndarray(
+                image.shape, image.dtype, buffer=self.memory.buf, offset=offset
+            )
+            view[...] = image
+            frames.append(FrameRef(offset, image.shape, image.dtype.str))
+            offset += _aligned(image.nbytes)
+
+        return ChunkRef(self.name, slot, frames)
+
+    def put(
+        self, images: t.Sequence[np.ndarray], timeout: t.Optional[float] = None
+    ) -> ChunkRef:
+        """write images into the next free slot, see `acquire`"""
+        slot = self.acquire(timeout)
+        try:
+            return self.write(slot, images)
+        except BaseException:
+            self.release(slot)
+            raise
+
+    def close(self) -> None:
+        """free the shared memory, once readers are done with it"""
+        self.memory.close()
+        self.memory.unlink()
+
+
+# shared memory of rings attached by this process, by name
+_attached: t.Dict[str, shared_memory.SharedMemory] = {}
+
+
+def read_chunk(chunk: ChunkRef) -> t.List[np.ndarray]:
+    """views of the images of a chunk, valid until the writer releases its slot"""
+    memory = _attached.get(chunk.name)
+    if memory is None:
+        memory = _attached[chunk.name] = shared_memory.SharedMemory(name=chunk.name)
+
+    return [
+        np.ndarray(
+            frame.shape, np.dtype(frame.dtype), buffer=memory.buf, offset=frame.offset
+        )
+        for frame in chunk.frames
+    ]
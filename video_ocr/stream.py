@@ -0,0 +1,156 @@
+"""
+helpers to stream items between threads.
+"""
+
+import queue
+import threading
+import typing as t
+
+T = t.TypeVar("T")
+
+_DONE = object()
+
+
+class _Error(t.NamedTuple):
+    error: BaseException
+
+
+def prefetch(iterable: t.Iterable[T], maxsize: int = 8) -> t.Iterator[T]:
+    """iterate over `iterable` on a background thread, buffering at most `maxsize` items.
+
+    the producer blocks while the buffer is full, so a slow consumer bounds memory.
+    exceptions raised by the producer are re-raised in the consumer.
+    """
+    if maxsize < 1:
+        raise ValueError("maxsize must be a positive integer")
+
+    buffer: "queue.Queue[t.Any]" = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    iterator = iter(iterable)
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Error(e))
+        finally:
+            # release resources held by generators, e.g. an open video capture
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Error):
+                raise item.error
+            yield item
+    finally:
+        # consumer stopped early or finished, let the producer exit
+        stop.set()
+        thread.join()
+
+
+def interleave(
+    iterables: t.Iterable[t.Iterable[T]], workers: int, maxsize: int = 8
+) -> t.Iterator[T]:
+    """iterate over each of `iterables` on one of `workers` background threads.
+
+    items of the same iterable keep their order, items of different ones are yielded
+    as they are ready. at most `maxsize` items are buffered, and `iterables` itself is
+    advanced by the threads, so it may block, e.g. on a download.
+    exceptions raised by the producers are re-raised in the consumer.
+    """
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    if maxsize < 1:
+        raise ValueError("maxsize must be a positive integer")
+
+    buffer: "queue.Queue[t.Any]" = queue.Queue(maxsize)
+    stop = threading.Event()
+    lock = threading.Lock()
+    sources = iter(iterables)
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            while not stop.is_set():
+                with lock:
+                    iterable = next(sources, _DONE)
+                if iterable is _DONE:
+                    return
+
+                iterator = iter(iterable)  # type: ignore
+                try:
+                    for item in iterator:
+                        if not put(item):
+                            return
+                finally:
+                    close = getattr(iterator, "close", None)
+                    if close:
+                        close()
+        except BaseException as e:
+            put(_Error(e))
+        finally:
+            put(_DONE)
+
+    threads = [threading.Thread(target=produce, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        running = workers
+        while running:
+            item = buffer.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            if isinstance(item, _Error):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def batched(iterable: t.Iterable[T], size: int) -> t.Iterator[t.List[T]]:
+    """split `iterable` into lists of `size` items, the last one may be shorter"""
+    if size < 1:
+        raise ValueError("size must be a positive integer")
+
+    batch: t.List[T] = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
@@ -0,0 +1,254 @@
+"""
+link text observations across consecutive frames into text tracks.
+
+a caption on screen for many sampled frames is observed once per frame. tracks join
+observations whose bboxes overlap and whose texts are similar into one entry with the
+time it was on screen, which is smaller to store, faster to search, and can be exported
+as subtitles.
+"""
+
+import difflib
+import typing as t
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from serde import serde
+from serde.json import to_json
+
+from video_ocr.config import FORMATS, IOU_THRESHOLD, MAX_GAP, SIMILARITY, get_logger
+from video_ocr.ocr import OCRResult
+
+if t.TYPE_CHECKING:
+    from video_ocr.video import Frame
+
+logger = get_logger(__name__)
+
+
+@serde
+@dataclass
+class TextTrack:
+    text: str  # most frequent text of the observations
+    start: float  # timestamp of the first frame the text is in
+    end: float  # timestamp of the first frame after the text is gone
+    first_frame: int
+    last_frame: int
+    confidence: float  # mean confidence of the observations
+    bbox: t.Tuple[float, float, float, float]  # mean bbox, see `OCRResult`
+    observations: int
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """intersection over union of each pair of bboxes, as x, y, width, height rows"""
+    a_left, a_bottom, a_width, a_height = (a[:, i : i + 1] for i in range(4))
+    b_left, b_bottom, b_width, b_height = (b[:, i] for i in range(4))
+
+    width = np.minimum(a_left + a_width, b_left + b_width) - np.maximum(a_left, b_left)
+    height = np.minimum(a_bottom + a_height, b_bottom + b_height) - np.maximum(
+        a_bottom, b_bottom
+    )
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    union = a_width * a_height + b_width * b_height - intersection
+
+    return np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union > 0
+    )
+
+
+def similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+@dataclass
+class _Track:
+    first_frame: int
+    start: float
+    last_frame: int = 0
+    last_seen: float = 0.0
+    last: t.Optional[OCRResult] = None
+    texts: t.Counter[str] = field(default_factory=Counter)
+    confidence: float = 0.0  # sum over observations
+    bbox: np.ndarray = field(default_factory=lambda: np.zeros(4))  # sum
+    observations: int = 0
+    missed: int = 0  # frames missed since last seen
+    gone: t.Optional[float] = None  # timestamp of the first frame missed
+
+    def add(self, index: int, timestamp: float, result: OCRResult) -> None:
+        self.last_frame = index
+        self.last_seen = timestamp
+        self.last = result
+        self.texts[result.text] += 1
+        self.confidence += result.confidence
+        self.bbox += result.bbox
+        self.observations += 1
+        self.missed = 0
+        self.gone = None
+
+    def to_track(self, end: float) -> TextTrack:
+        n = self.observations
+        return TextTrack(
+            text=self.texts.most_common(1)[0][0],
+            start=self.start,
+            end=end,
+            first_frame=self.first_frame,
+            last_frame=self.last_frame,
+            confidence=self.confidence / n,
+            bbox=tuple(float(v) for v in self.bbox / n),  # type: ignore
+            observations=n,
+        )
+
+
+class TrackBuilder:
+    """Link observations of frames, fed in order, into text tracks.
+
+    observations are matched to the tracks of the previous frames by the IoU of their
+    bboxes, best overlap first, if their texts are similar enough. feed frames without
+    text too when they are known, so tracks end when their text is gone.
+
+    Args:
+        iou_threshold: minimum IoU of the bbox of a track and a matching observation
+        similarity: minimum similarity of the text of a track and a matching observation
+        max_gap: number of frames a track may be missing from and still continue
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = IOU_THRESHOLD,
+        similarity: float = SIMILARITY,
+        max_gap: int = MAX_GAP,
+    ):
+        self.iou_threshold = iou_threshold
+        self.similarity = similarity
+        self.max_gap = max_gap
+        self.active: t.List[_Track] = []
+        self.tracks: t.List[TextTrack] = []
+        self.last_timestamp: t.Optional[float] = None
+        self.step = 0.0  # seconds between the last two frames
+
+    def add(self, frame: "Frame") -> None:
+        results = frame.results
+        matched: t.Set[int] = set()
+        used: t.Set[int] = set()
+
+        if self.active and results:
+            iou = iou_matrix(
+                np.array([track.last.bbox for track in self.active]),  # type: ignore
+                np.array([result.bbox for result in results]),
+            )
+            rows, cols = np.nonzero(iou >= self.iou_threshold)
+            for i in np.argsort(-iou[rows, cols], kind="stable"):
+                row, col = int(rows[i]), int(cols[i])
+                if row in matched or col in used:
+                    continue
+
+                track = self.active[row]
+                if similarity(track.last.text, results[col].text) >= self.similarity:  # type: ignore
+                    track.add(frame.index, frame.timestamp, results[col])
+                    matched.add(row)
+                    used.add(col)
+
+        active = []
+        for i, track in enumerate(self.active):
+            if i not in matched:
+                track.missed += 1
+                if track.gone is None:
+                    track.gone = frame.timestamp
+                if track.missed > self.max_gap:
+                    self.tracks.append(track.to_track(track.gone))
+                    continue
+            active.append(track)
+
+        for col, result in enumerate(results):
+            if col not in used:
+                track = _Track(first_frame=frame.index, start=frame.timestamp)
+                track.add(frame.index, frame.timestamp, result)
+                active.append(track)
+        self.active = active
+
+        if self.last_timestamp is not None:
+            self.step = frame.timestamp - self.last_timestamp
+        self.last_timestamp = frame.timestamp
+
+    def finish(self) -> t.List[TextTrack]:
+        """close tracks still on screen, returns all tracks by start"""
+        for track in self.active:
+            # tracks in the last frame last until the frame that would come next
+            end = track.gone if track.gone is not None else track.last_seen + self.step
+            self.tracks.append(track.to_track(end))
+        self.active = []
+
+        return sorted(self.tracks, key=lambda track: (track.start, track.first_frame))
+
+
+def build_tracks(
+    frames: t.Iterable["Frame"],
+    iou_threshold: float = IOU_THRESHOLD,
+    similarity: float = SIMILARITY,
+    max_gap: int = MAX_GAP,
+) -> t.List[TextTrack]:
+    """text tracks of frames, in order, see `TrackBuilder`"""
+    builder = TrackBuilder(iou_threshold, similarity, max_gap)
+    frames_count = 0
+    for frame in frames:
+        builder.add(frame)
+        frames_count += 1
+
+    tracks = builder.finish()
+    logger.info(
+        f"linked observations of {frames_count} frames into {len(tracks)} tracks."
+    )
+    return tracks
+
+
+def format_timestamp(seconds: float, separator: str = ",") -> str:
+    """HH:MM:SS,mmm of srt, or HH:MM:SS.mmm of vtt with separator "." """
+    millis = round(seconds * 1000)
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def to_srt(tracks: t.Iterable[TextTrack]) -> str:
+    cues = []
+    for i, track in enumerate(tracks, 1):
+        start, end = format_timestamp(track.start), format_timestamp(track.end)
+        cues.append(f"{i}\n{start} --> {end}\n{track.text}\n")
+
+    return "\n".join(cues)
+
+
+def to_vtt(tracks: t.Iterable[TextTrack]) -> str:
+    cues = ["WEBVTT\n"]
+    for track in tracks:
+        start = format_timestamp(track.start, ".")
+        end = format_timestamp(track.end, ".")
+        cues.append(f"{start} --> {end}\n{track.text}\n")
+
+    return "\n".join(cues)
+
+
+def dumps(tracks: t.List[TextTrack], fmt: str = "json") -> str:
+    """tracks as json with one track per line, srt or vtt"""
+    if fmt == "srt":
+        return to_srt(tracks)
+    if fmt == "vtt":
+        return to_vtt(tracks)
+    if fmt == "json":
+        return "[" + ",".join("\n    " + to_json(track) for track in tracks) + "\n]\n"
+
+    raise ValueError(f"format must be one of {FORMATS}, got {fmt}")
+
+
+def write_tracks(
+    tracks: t.List[TextTrack], path: Path, fmt: t.Optional[str] = None
+) -> Path:
+    """write tracks to path, in the format of its suffix unless fmt is given"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(dumps(tracks, fmt or path.suffix.lstrip(".")))
+
+    return path
@@ -1,14 +1,37 @@
+import json
 import typing as t
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from pathlib import Path
 
 import cv2
-from pytube import YouTube
-from serde import field, serde
-from serde.json import to_json
+import numpy as np
+from serde import field, serde, to_dict
+from serde.json import from_json, to_json
 
+from video_ocr.cache import OCRCache
+from video_ocr.checkpoint import Checkpoint
 from video_ocr.config import get_logger
-from video_ocr.ocr import OCRResult, detect_text
+from video_ocr.dedup import DEFAULT_THRESHOLD, DedupStats, FrameDeduplicator
+from video_ocr.metrics import metrics
+from video_ocr.ocr import (
+    OCRBackend,
+    OCRResult,
+    default_backend,
+    get_backend,
+    get_backend_class,
+    run_batch,
+)
+from video_ocr.parallel import ParallelSampler
+from video_ocr.prefilter import PrefilterStats, TextPrefilter
+from video_ocr.roi import Crop, Region, RegionCropper
+from video_ocr.sampling import (
+    AdaptiveSampler,
+    FrameSampler,
+    SampledFrame,
+    SamplingStats,
+)
+from video_ocr.stream import batched, prefetch
+from video_ocr.tracks import TextTrack, build_tracks, write_tracks
 
 logger = get_logger(__name__)
 
@@ -16,8 +39,10 @@ logger = get_logger(__name__)
 @serde
 @dataclass
 class Frame:
-    frame_file: Path
+    index: int  # frame index in the video
+    timestamp: float  # seconds from the start of the video
     results: t.List[OCRResult]
+    frame_file: t.Optional[Path] = None  # only set if frames are saved
 
 
 # @serde
@@ -27,12 +52,47 @@ class Video:
     video_file: t.Optional[Path] = None
     frames_dir: t.Optional[Path] = None
     frame_rate: int = 100
+    backend: str = field(default_factory=default_backend)  # see `video_ocr.ocr`
+    interval: t.Optional[float] = None  # seconds between frames, overrides frame_rate
+    sampling: str = field(default="auto", skip=True)  # see `FrameSampler`
+    # bounds of seconds between frames for adaptive sampling, see `AdaptiveSampler`
+    min_interval: float = field(default=0.25, skip=True)
+    max_interval: float = field(default=4.0, skip=True)
+    scene_threshold: int = field(default=DEFAULT_THRESHOLD, skip=True)
+    save_frames: bool = field(default=False, skip=True)  # write frames to frames_dir
+    decoder: str = field(default="cv2", skip=True)  # see `video_ocr.decode`
+    gray: bool = field(
+        default=False, skip=True
+    )  # decode to grayscale, if the backend accepts it
+    decode_width: t.Optional[int] = field(
+        default=None, skip=True
+    )  # downscale on decode
+    # processes decoding segments of the video, see `ParallelSampler`
+    decode_processes: int = field(default=1, skip=True)
+    # reuse ocr results of frames within this threshold of the last unique frame, see `FrameDeduplicator`
+    dedup_threshold: t.Optional[int] = field(default=None, skip=True)
+    # skip ocr on frames with a text score below this, see `TextPrefilter`
+    text_threshold: t.Optional[float] = field(default=None, skip=True)
+    # regions of frames to send to ocr, see `RegionCropper`
+    roi: t.Optional[t.List[Region]] = field(default=None, skip=True)
+    auto_roi: bool = field(default=False, skip=True)  # detect regions of each frame
+    roi_scale: float = field(default=1.0, skip=True)  # downscale regions by this factor
+    # keep frames with text in `frames`. without it, frames are only written to the
+    # checkpoint and streamed from it, so memory does not grow with the video
+    keep_frames: bool = field(default=True, skip=True)
     frames: t.List[Frame] = field(default_factory=list)
+    sampling_stats: t.Optional[SamplingStats] = field(default=None, skip=True)
+    dedup_stats: t.Optional[DedupStats] = field(default=None, skip=True)
+    prefilter_stats: t.Optional[PrefilterStats] = field(default=None, skip=True)
+    # checkpoint of the last run_ocr, frames are streamed from it by to_json
+    checkpoint: t.Optional[Checkpoint] = field(default=None, skip=True)
 
     frame_prefix: t.ClassVar[str] = "frame-"  # prefix for frame files
 
     @classmethod
     def get_resolutions(cls, video_id: str) -> list:
+        from pytube import YouTube
+
         yt = YouTube(f"https://www.youtube.com/watch?v={video_id}")
 
         # for ocr, we only need the video
@@ -43,6 +103,8 @@ class Video:
         if not self.video_file:
             raise ValueError("video_file is not set. needed to save downloaded video.")
 
+        from pytube import YouTube
+
         yt = YouTube(f"https://www.youtube.com/watch?v={video_id}")
         logger.info(f"downloading video: {yt.title}")
 
@@ -63,64 +125,431 @@ class Video:
             output_path=self.video_file.parent, filename=self.video_file.name
         )
 
-    def gen_frame_files(self):
-        if not self.frames_dir.exists():
-            self.frames_dir.mkdir(parents=True)
-
-        vid = cv2.VideoCapture(str(self.video_file))
-        index = 0
+    @property
+    def checkpoint_file(self) -> Path:
+        if not self.output_file:
+            raise ValueError("output_file is not set. needed to checkpoint results.")
+
+        return self.output_file.with_suffix(".jsonl")
+
+    @property
+    def manifest_file(self) -> Path:
+        """what the output files were made from, see `video_ocr.manifest`"""
+        if not self.output_file:
+            raise ValueError("output_file is not set. needed to record a manifest.")
+
+        return self.output_file.with_suffix(".manifest.json")
+
+    def settings(self, lang: str) -> t.Dict[str, t.Any]:
+        """settings that change which frames are sampled and their ocr results"""
+        return {
+            "frame_rate": self.frame_rate,
+            "interval": self.interval,
+            "sampling": self.sampling,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "scene_threshold": self.scene_threshold,
+            "decoder": self.decoder,
+            "gray": self.gray,
+            "decode_width": self.decode_width,
+            "backend": self.backend,
+            "dedup_threshold": self.dedup_threshold,
+            "text_threshold": self.text_threshold,
+            "roi": self.roi,
+            "auto_roi": self.auto_roi,
+            "roi_scale": self.roi_scale,
+            "lang": lang,
+        }
+
+    def open_checkpoint(self, lang: str, resume: bool = True) -> t.Set[int]:
+        """start checkpointing results next to output_file, returns indices of frames done"""
+        self.checkpoint = Checkpoint(self.checkpoint_file, self.settings(lang))
+        return self.checkpoint.open(resume=resume)
+
+    def start_ocr(self, lang: str = "ja", resume: bool = True) -> "OCRState":
+        """state of ocr on the frames of this video, checkpointed if output_file is set"""
+        done = self.open_checkpoint(lang, resume) if self.output_file else set()
+        return OCRState(self, done)
+
+    def cropper(self) -> t.Optional[RegionCropper]:
+        """cropper of frames before ocr, None if whole frames are sent as they are"""
+        if not (self.roi or self.auto_roi or self.roi_scale != 1):
+            return None
+
+        return RegionCropper(self.roi, auto=self.auto_roi, scale=self.roi_scale)
+
+    def get_frame_file(self, index: int) -> Path:
+        if not self.frames_dir:
+            raise ValueError("frames_dir is not set. needed to save frames.")
+
+        return self.frames_dir / f"{self.frame_prefix}{index}.png"
+
+    def iter_frames(self) -> t.Iterator[SampledFrame]:
+        """decode and yield sampled frames, also writing them to frames_dir if save_frames is set"""
+        if self.save_frames:
+            self.get_frame_file(0).parent.mkdir(parents=True, exist_ok=True)
+
+        decoding = {
+            "decoder": self.decoder,
+            "gray": self.gray and get_backend_class(self.backend).accepts_gray,
+            "width": self.decode_width,
+        }
+        sampler: FrameSampler
+        if self.sampling == "adaptive":
+            if self.decode_processes > 1:
+                logger.warning(
+                    "adaptive sampling decodes on a single process, "
+                    "ignoring decode_processes."
+                )
+            sampler = AdaptiveSampler(
+                self.video_file,
+                min_interval=self.min_interval,
+                max_interval=self.max_interval,
+                threshold=self.scene_threshold,
+                **decoding,
+            )
+        elif self.decode_processes > 1:
+            sampler = ParallelSampler(
+                self.video_file,
+                workers=self.decode_processes,
+                step=self.frame_rate,
+                interval=self.interval,
+                strategy=self.sampling,
+                **decoding,
+            )
+        else:
+            sampler = FrameSampler(
+                self.video_file,
+                step=self.frame_rate,
+                interval=self.interval,
+                strategy=self.sampling,
+                **decoding,
+            )
+        for frame in sampler:
+            if self.save_frames:
+                with metrics.stage("imwrite"):
+                    cv2.imwrite(str(self.get_frame_file(frame.index)), frame.image)
+
+            yield frame
+
+        self.sampling_stats = sampler.stats
+
+    def gen_frame_files(self) -> SamplingStats:
+        """write sampled frames to frames_dir without running ocr"""
+        save_frames, self.save_frames = self.save_frames, True
 
         logger.info("start converting image to frames...")
-        while vid.isOpened():
-            ret, frame = vid.read()
-
-            # end of video
-            if not ret:
-                break
-
-            if index % self.frame_rate == 0:
-                file_name = f"{self.frame_prefix}{index}.png"
-                frame_path = self.frames_dir / file_name
-
-                cv2.imwrite(str(frame_path), frame)
+        try:
+            for _ in self.iter_frames():
+                pass
+        finally:
+            self.save_frames = save_frames
+        logger.info("finished converting image to frames.")
 
-            index += 1
+        return self.sampling_stats
+
+    def run_ocr(  # noqa: PLR0913
+        self,
+        lang="ja",
+        queue_size: int = 8,
+        batch_size: int = 4,
+        cache: t.Optional[OCRCache] = None,
+        resume: bool = True,
+        engine: t.Optional[OCRBackend] = None,
+        before_batch: t.Optional[t.Callable[[], None]] = None,
+    ) -> t.List[Frame]:
+        """run ocr on sampled frames, decoding on a background thread.
+
+        at most `queue_size` decoded frames are buffered between decoding and ocr,
+        and frames are passed to the backend `batch_size` at a time.
+        if dedup_threshold is set, duplicate frames reuse the results of the last unique frame.
+        if cache is given, results of frames found in it are reused.
+        if output_file is set, results are checkpointed as each frame finishes, and
+        with resume, frames already in the checkpoint are skipped.
+        if engine is given, e.g. to reuse one set up for many videos, it runs ocr
+        instead of a new backend of this video. before_batch is called before each batch
+        of frames, and stops the run if it raises.
+        returns the frames with text, or an empty list if keep_frames is not set.
+        """
+        if not self.video_file:
+            raise ValueError("video_file is not set. needed to run ocr.")
+
+        state = self.start_ocr(lang, resume)
+        # a backend created here is closed when the run ends
+        owned = engine is None
+        engine = engine or get_backend(self.backend, languages=[lang])
+
+        logger.info(f"start OCR on frames with {engine.name} backend...")
+        frames = prefetch(self.iter_frames(), queue_size)
+        try:
+            for batch in batched(frames, batch_size):
+                if before_batch:
+                    before_batch()
+                images, positions, crops = state.split(batch)
+
+                if not images:
+                    results = []
+                elif cache:
+                    results = cache.detect_batch(engine, images)
+                else:
+                    results = run_batch(engine, images)
+
+                state.collect(batch, positions, results, crops)
+        except BaseException:
+            # frames collected so far stay in the checkpoint, to resume from
+            if self.checkpoint:
+                self.checkpoint.close()
+            raise
+        finally:
+            frames.close()  # type: ignore
+            if owned:
+                engine.close()
 
-        logger.info("finished converting image to frames.")
-        vid.release()
-        cv2.destroyAllWindows()
+        logger.info("completed OCR on frames.")
 
-    def run_ocr(self, lang="ja") -> t.List[Frame]:
-        if not self.frames_dir:
-            raise ValueError("frames_dir is not set. needed to run ocr.")
+        if cache:
+            cache.log_stats()
 
-        frames = []
+        return state.finish()
 
-        # glob all frames and sort by name
-        frame_files = list(self.frames_dir.glob(f"{self.frame_prefix}*.png"))
+    def iter_saved_frames(self) -> t.Iterator[Frame]:
+        """frames with text, streamed from the checkpoint if there is one"""
+        for frame in self.iter_all_frames():
+            if frame.results:
+                yield frame
 
-        # sort by number in filename
-        frame_files = sorted(frame_files, key=lambda f: int(f.stem.split("-")[-1]))
+    def iter_all_frames(self) -> t.Iterator[Frame]:
+        """every sampled frame, also those without text, if there is a checkpoint"""
+        if not self.checkpoint:
+            yield from self.frames
+            return
 
-        logger.info("start OCR on frames...")
-        for frame_file in frame_files:
-            results = detect_text(str(frame_file), languages=[lang])
+        yield from self.checkpoint.iter_frames()
 
-            if results:
-                frames.append(Frame(frame_file=frame_file, results=results))
+    def build_tracks(self, **kwargs) -> t.List[TextTrack]:
+        """text tracks of the frames, see `video_ocr.tracks.TrackBuilder` for kwargs"""
+        return build_tracks(self.iter_all_frames(), **kwargs)
 
-        logger.info("completed OCR on frames.")
+    def to_tracks(self, path: t.Optional[Path] = None, **kwargs) -> Path:
+        """write text tracks, to video.tracks.json next to output_file by default.
 
-        self.frames = frames
+        the format is chosen by the suffix of path, see `video_ocr.tracks.write_tracks`.
+        """
+        if path is None:
+            if not self.output_file:
+                raise ValueError("output_file is not set. needed to write tracks.")
+            path = self.output_file.with_suffix(".tracks.json")
 
-        return frames
+        with metrics.stage("tracks"):
+            tracks = self.build_tracks(**kwargs)
+        return write_tracks(tracks, path)
 
     def to_json(self) -> Path:
+        """write the video with one frame per line, streaming frames from the checkpoint"""
         if not self.output_file.parent.exists():
             self.output_file.parent.mkdir(parents=True)
 
-        s = to_json(self, indent=4)
-        with open(self.output_file, "w") as f:
-            f.write(s)
+        header = to_dict(replace(self, frames=[]))
+        del header["frames"]
+
+        with metrics.stage("serialize"), open(self.output_file, "w") as f:
+            f.write("{\n")
+            for key, value in header.items():
+                f.write(f"    {json.dumps(key)}: {json.dumps(value)},\n")
+
+            f.write('    "frames": [')
+            for i, frame in enumerate(self.iter_saved_frames()):
+                f.write(("," if i else "") + "\n        " + to_json(frame))
+            f.write("\n    ]\n}\n")
 
         return self.output_file
+
+    def to_parquet(self, path: t.Optional[Path] = None) -> Path:
+        """write one row per text observation, next to output_file by default.
+
+        see `video_ocr.columnar`, needs pyarrow.
+        """
+        try:
+            from video_ocr.columnar import write_parquet
+        except ImportError as e:
+            raise ValueError(
+                "pyarrow is not installed, install it with `pip install video-ocr[parquet]`"
+            ) from e
+
+        if path is None:
+            if not self.output_file:
+                raise ValueError("output_file is not set. needed to write parquet.")
+            path = self.output_file.with_suffix(".parquet")
+
+        with metrics.stage("serialize"):
+            write_parquet(self.iter_saved_frames(), path)
+        return path
+
+    @classmethod
+    def from_json(cls, output_file: Path) -> "Video":
+        with open(output_file) as f:
+            s = f.read()
+
+        video = from_json(cls, s)
+        video.output_file = output_file
+        return video
+
+    @classmethod
+    def load_frames(cls, output_file: Path) -> "Video":
+        """video to read frames of a previous run from, see `iter_all_frames`.
+
+        frames are streamed from the checkpoint next to output_file if there is one,
+        which also has frames without text. otherwise output_file is read.
+        """
+        video = cls(output_file=output_file)
+        if video.checkpoint_file.exists():
+            video.checkpoint = Checkpoint(video.checkpoint_file, {})
+            return video
+
+        return cls.from_json(output_file)
+
+
+# positions of frames in the checkpoint, and of frames without text, see `OCRState.split`
+DONE = -2
+NO_TEXT = -3
+
+
+class OCRState:
+    """Per-video bookkeeping of ocr over consecutive batches of sampled frames.
+
+    `split` and `collect` must be called for batches in the order of the frames,
+    since duplicate frames reuse the results of the frames before them.
+    Collected frames are appended to the checkpoint of the video, if it has one, and
+    frames with text are kept in memory if keep_frames of the video is set.
+    """
+
+    def __init__(self, video: Video, done: t.Optional[t.Set[int]] = None):
+        if not video.keep_frames and not video.checkpoint:
+            raise ValueError(
+                "output_file is not set. needed to stream frames without keep_frames."
+            )
+
+        self.video = video
+        # indices of frames already in the checkpoint of the video
+        self.done = done or set()
+        self.deduplicator = (
+            FrameDeduplicator(video.dedup_threshold)
+            if video.dedup_threshold is not None
+            else None
+        )
+        self.prefilter = (
+            TextPrefilter(video.text_threshold)
+            if video.text_threshold is not None
+            else None
+        )
+        self.cropper = video.cropper()
+        # results of the last collected frame, which duplicates at the start of the
+        # next batch reuse
+        self.last_results: t.List[OCRResult] = []
+        self.frames: t.List[Frame] = []
+
+    def split(
+        self, batch: t.List[SampledFrame]
+    ) -> t.Tuple[t.List[np.ndarray], t.List[int], t.Optional[t.List[Crop]]]:
+        """images to send to ocr, for each frame in batch the position among unique frames
+        of the frame whose results it uses, and where images were cropped from.
+
+        position -1 means the results of the previous batch, `DONE` that the frame is
+        already in the checkpoint, and `NO_TEXT` that the prefilter found no text in it.
+        without a cropper, the images are the unique frames and crops is None.
+        """
+        unique = []
+        positions = []
+        reference = -1  # position of the last unique frame, which duplicates reuse
+        for sampled in batch:
+            if sampled.index in self.done:
+                # the next frame is compared to a frame we have no results of
+                if self.deduplicator:
+                    self.deduplicator.reference = None
+                positions.append(DONE)
+                metrics.incr("frames_resumed")
+                continue
+
+            with metrics.stage("dedup"):
+                duplicate = bool(
+                    self.deduplicator and self.deduplicator.is_duplicate(sampled.image)
+                )
+            if duplicate:
+                metrics.incr("frames_skipped")
+                positions.append(reference)
+                continue
+
+            with metrics.stage("prefilter"):
+                has_text = not self.prefilter or self.prefilter.has_text(sampled.image)
+            if has_text:
+                unique.append(sampled.image)
+                reference = len(unique) - 1
+            else:
+                metrics.incr("frames_no_text")
+                reference = NO_TEXT
+            positions.append(reference)
+
+        if self.cropper is None:
+            return unique, positions, None
+
+        with metrics.stage("roi"):
+            patches, crops = self.cropper.crop(unique)
+        return patches, positions, crops
+
+    def collect(
+        self,
+        batch: t.List[SampledFrame],
+        positions: t.List[int],
+        results: t.List[t.List[OCRResult]],
+        crops: t.Optional[t.List[Crop]] = None,
+    ) -> None:
+        """add frames of batch with text, given the ocr results of images from `split`"""
+        unique_results = results
+        if crops is not None and self.cropper:
+            unique_results = self.cropper.merge(
+                results, crops, max(positions, default=-1) + 1
+            )
+
+        for sampled, position in zip(batch, positions):
+            if position == DONE:
+                continue
+
+            if position == NO_TEXT:
+                results = []
+            elif position >= 0:
+                results = unique_results[position]
+            else:
+                results = self.last_results
+            frame = Frame(
+                index=sampled.index,
+                timestamp=sampled.timestamp,
+                results=results,
+                frame_file=self.video.get_frame_file(sampled.index)
+                if self.video.save_frames
+                else None,
+            )
+
+            if self.video.checkpoint:
+                with metrics.stage("checkpoint"):
+                    self.video.checkpoint.append(frame)
+            if results and self.video.keep_frames:
+                self.frames.append(frame)
+            self.last_results = results
+
+    def finish(self) -> t.List[Frame]:
+        """set collected frames to the video"""
+        if self.deduplicator:
+            self.deduplicator.log_stats()
+            self.video.dedup_stats = self.deduplicator.stats
+        if self.prefilter:
+            self.prefilter.log_stats()
+            self.video.prefilter_stats = self.prefilter.stats
+
+        if self.video.checkpoint:
+            self.video.checkpoint.close()
+            # frames of the previous runs are only in the checkpoint
+            if self.done and self.video.keep_frames:
+                self.frames = list(self.video.iter_saved_frames())
+
+        self.video.frames = self.frames
+        return self.frames
@@ -0,0 +1,38 @@
+"""
+entry points of ocr worker processes of `video_ocr.execute.BatchRunner`.
+
+workers started by spawn import the module of the functions they run, so these live
+apart from `video_ocr.execute`, which imports the whole pipeline.
+"""
+
+import time
+import typing as t
+
+import numpy as np
+
+from video_ocr.ocr import OCRBackend, OCRResult, get_backend
+from video_ocr.shm import ChunkRef, read_chunk
+
+# backend of the worker process, created once by `init_worker`
+_engine: t.Optional[OCRBackend] = None
+
+
+def init_worker(backend: str, languages: t.List[str]) -> None:
+    global _engine  # noqa: PLW0603
+    _engine = get_backend(backend, languages=languages)
+
+
+def detect_chunk(
+    images: t.List[np.ndarray],
+) -> t.Tuple[t.List[t.List[OCRResult]], float]:
+    """results of images, and seconds the worker spent on ocr"""
+    assert _engine is not None, "worker is not initialized"
+
+    start = time.perf_counter()
+    results = _engine.detect_batch(images)
+    return results, time.perf_counter() - start
+
+
+def detect_shared(chunk: ChunkRef) -> t.Tuple[t.List[t.List[OCRResult]], float]:
+    """`detect_chunk` of images in shared memory, read without copying them"""
+    return detect_chunk(read_chunk(chunk))
@@ -0,0 +1,591 @@
+"""
+run ocr on many machines, pulling one video at a time from a durable queue.
+
+a coordinator adds a task per video to a `WorkQueue`, a sqlite database, and serves
+it over http with `QueueServer`. workers lease tasks through a `QueueClient`, or from
+the database directly if they share its machine. a video is run by one worker, so at
+most as many workers as there are videos are busy.
+
+a lease expires unless the worker holding it sends heartbeats, so the task of a
+worker that was killed or cut off goes back to the queue, and is retried until it
+was leased `max_attempts` times. tasks run with the checkpoint of their video, so a
+retry resumes from the frames the previous attempt finished, and a task run twice
+writes the same output files. workers need to reach the video and output paths of
+tasks, e.g. on a shared filesystem.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import typing as t
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from video_ocr.cache import OCRCache
+from video_ocr.config import DEFAULT_LEASE, DEFAULT_PORT, MAX_ATTEMPTS, get_logger
+from video_ocr.fetch import ConnectionPool
+from video_ocr.manifest import VideoStages
+from video_ocr.metrics import metrics
+from video_ocr.ocr import OCRBackend, get_backend
+from video_ocr.video import Video
+
+logger = get_logger(__name__)
+
+STATES = ("pending", "leased", "done", "failed")
+
+
+@dataclass
+class Task:
+    id: int
+    key: str  # unique name of the task, see `WorkQueue.put`
+    payload: t.Dict[str, t.Any]
+    attempts: int  # leases of the task, this one included
+    token: str  # of this lease, a task leased again gets a new one
+
+
+class WorkQueue:
+    """Durable queue of tasks in sqlite, shared by threads and processes of a machine.
+
+    Args:
+        path: path of the database
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # transactions are begun explicitly, so a task is leased by one process only
+        self.conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                token TEXT,
+                worker TEXT,
+                lease_until REAL,
+                error TEXT
+            )
+            """
+        )
+
+    @contextlib.contextmanager
+    def _transaction(self) -> t.Iterator[sqlite3.Connection]:
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def put(
+        self,
+        key: str,
+        payload: t.Dict[str, t.Any],
+        max_attempts: int = MAX_ATTEMPTS,
+        replace: bool = False,
+    ) -> bool:
+        """add a task, returns whether it was queued.
+
+        a task with the same key that is done or failed is queued again with payload
+        and its attempts reset, one that is pending or leased only with replace. a
+        replaced lease is lost, see `heartbeat`.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be a positive integer")
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT state FROM tasks WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO tasks (key, payload, max_attempts) VALUES (?, ?, ?)",
+                    (key, json.dumps(payload), max_attempts),
+                )
+                return True
+            if row[0] in ("pending", "leased") and not replace:
+                return False
+
+            conn.execute(
+                """
+                UPDATE tasks SET payload = ?, max_attempts = ?, state = 'pending',
+                    attempts = 0, token = NULL, worker = NULL, lease_until = NULL,
+                    error = NULL
+                WHERE key = ?
+                """,
+                (json.dumps(payload), max_attempts, key),
+            )
+        return True
+
+    def payloads(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """payload of each task, by key"""
+        with self.lock:
+            return {
+                key: json.loads(payload)
+                for key, payload in self.conn.execute("SELECT key, payload FROM tasks")
+            }
+
+    def lease(self, worker: str, seconds: float = DEFAULT_LEASE) -> t.Optional[Task]:
+        """lease the oldest pending task, or one whose lease expired, None if there is none"""
+        now = time.time()
+        with self._transaction() as conn:
+            # expired leases of tasks without attempts left fail them
+            conn.execute(
+                """
+                UPDATE tasks SET state = 'failed', token = NULL, error = 'lease expired'
+                WHERE state = 'leased' AND lease_until < ? AND attempts >= max_attempts
+                """,
+                (now,),
+            )
+            row = conn.execute(
+                """
+                SELECT id, key, payload, attempts FROM tasks
+                WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            task_id, key, payload, attempts = row
+            token = uuid.uuid4().hex
+            conn.execute(
+                """
+                UPDATE tasks SET state = 'leased', attempts = ?, token = ?, worker = ?,
+                    lease_until = ?
+                WHERE id = ?
+                """,
+                (attempts + 1, token, worker, now + seconds, task_id),
+            )
+
+        return Task(task_id, key, json.loads(payload), attempts + 1, token)
+
+    def _update_leased(self, task: Task, assignments: str, values: tuple) -> bool:
+        """update task if its lease is still held, returns whether it was"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE tasks SET {assignments} "
+                "WHERE id = ? AND token = ? AND state = 'leased'",
+                (*values, task.id, task.token),
+            )
+        return cursor.rowcount > 0
+
+    def heartbeat(self, task: Task, seconds: float = DEFAULT_LEASE) -> bool:
+        """extend the lease of task, returns False if it is no longer held"""
+        return self._update_leased(task, "lease_until = ?", (time.time() + seconds,))
+
+    def complete(self, task: Task) -> bool:
+        """mark task done, returns False if its lease is no longer held"""
+        return self._update_leased(
+            task, "state = 'done', token = NULL, lease_until = NULL, error = NULL", ()
+        )
+
+    def fail(self, task: Task, error: str) -> bool:
+        """give up the lease of task after an error, it is retried if it has attempts left.
+
+        returns False if its lease is no longer held.
+        """
+        return self._update_leased(
+            task,
+            """
+            state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+            token = NULL, lease_until = NULL, error = ?
+            """,
+            (error,),
+        )
+
+    def retry_failed(self) -> int:
+        """give failed tasks their attempts again, returns the number of tasks"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET state = 'pending', attempts = 0 WHERE state = 'failed'"
+            )
+        return cursor.rowcount
+
+    def stats(self) -> t.Dict[str, int]:
+        """number of tasks in each state"""
+        with self.lock:
+            counts = dict(
+                self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state")
+            )
+        return {state: counts.get(state, 0) for state in STATES}
+
+    def errors(self) -> t.Dict[str, str]:
+        """last error of each failed task, by key"""
+        with self.lock:
+            return dict(
+                self.conn.execute("SELECT key, error FROM tasks WHERE state = 'failed'")
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class _QueueHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections of workers alive
+
+    server: "QueueServer"
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send(200, self.server.queue.stats())
+        else:
+            self.send(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        queue = self.server.queue
+        try:
+            request = json.loads(body)
+            if self.path == "/lease":
+                task = queue.lease(request["worker"], request["seconds"])
+                self.send(200, asdict(task) if task else None)
+            elif self.path == "/heartbeat":
+                held = queue.heartbeat(Task(**request["task"]), request["seconds"])
+                self.send(200, held)
+            elif self.path == "/complete":
+                self.send(200, queue.complete(Task(**request["task"])))
+            elif self.path == "/fail":
+                self.send(200, queue.fail(Task(**request["task"]), request["error"]))
+            else:
+                self.send(404, {"error": f"not found: {self.path}"})
+        except (ValueError, KeyError, TypeError) as e:
+            self.send(400, {"error": f"bad request: {e!r}"})
+
+    def send(self, status: int, body: t.Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class QueueServer(ThreadingHTTPServer):
+    """Serve a `WorkQueue` over http, to `QueueClient`s of workers on other machines.
+
+    Args:
+        queue: queue to serve
+        host: address to listen on, e.g. 0.0.0.0 for all interfaces
+        port: port to listen on, 0 picks a free one
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, queue: WorkQueue, host: str = "127.0.0.1", port: int = DEFAULT_PORT
+    ):
+        super().__init__((host, port), _QueueHandler)
+        self.queue = queue
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_until_done(self, poll_interval: float = 1.0) -> t.Dict[str, int]:
+        """serve until no task is pending or leased, returns the final `stats`"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        logger.info(f"serving the queue {self.queue.path} at {self.url}")
+
+        last = None
+        try:
+            while True:
+                stats = self.queue.stats()
+                if stats != last:
+                    logger.info(f"tasks: {stats}")
+                    last = stats
+                if not stats["pending"] and not stats["leased"]:
+                    return stats
+                time.sleep(poll_interval)
+        finally:
+            self.shutdown()
+            thread.join()
+
+
+class QueueClient:
+    """A `WorkQueue` served by a `QueueServer`, with the same methods as workers use.
+
+    Args:
+        url: url of the server, e.g. http://coordinator:8765
+        timeout: seconds to wait for a response
+    """
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url
+        self.pool = ConnectionPool(url, timeout)
+
+    def _request(self, method: str, path: str, request: t.Any = None) -> t.Any:
+        body = json.dumps(request).encode() if request is not None else None
+        response = self.pool.request(
+            method, path, {}, {"Content-Type": "application/json"}, body
+        )
+        if response.status != 200:
+            raise ValueError(
+                f"{response.status} from the queue at {self.url}: "
+                f"{response.body[:200].decode(errors='replace')}"
+            )
+        return json.loads(response.body)
+
+    def lease(self, worker: str, seconds: float = DEFAULT_LEASE) -> t.Optional[Task]:
+        task = self._request("POST", "/lease", {"worker": worker, "seconds": seconds})
+        return Task(**task) if task else None
+
+    def heartbeat(self, task: Task, seconds: float = DEFAULT_LEASE) -> bool:
+        return self._request(
+            "POST", "/heartbeat", {"task": asdict(task), "seconds": seconds}
+        )
+
+    def complete(self, task: Task) -> bool:
+        return self._request("POST", "/complete", {"task": asdict(task)})
+
+    def fail(self, task: Task, error: str) -> bool:
+        return self._request("POST", "/fail", {"task": asdict(task), "error": error})
+
+    def stats(self) -> t.Dict[str, int]:
+        return self._request("GET", "/stats")
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+Queue = t.Union[WorkQueue, QueueClient]
+
+
+def open_queue(location: str) -> Queue:
+    """the queue served at an http(s) url, or in a sqlite file"""
+    if location.startswith(("http://", "https://")):
+        return QueueClient(location)
+    return WorkQueue(Path(location))
+
+
+@dataclass
+class VideoTask:
+    """payload of a task, to run ocr on a video and write its output files"""
+
+    video_file: str
+    output_file: str
+    fields: t.Dict[str, t.Any]  # other fields of the `Video`
+    lang: str = "ja"
+    batch_size: int = 4
+    resume: bool = True  # retries always resume
+    parquet: bool = False
+    tracks: bool = False
+    force: bool = False  # run every stage on the first attempt, see `VideoStages`
+
+    def make_video(self) -> Video:
+        fields = dict(self.fields)
+        if fields.get("roi"):
+            # regions are tuples, which json turned into lists
+            fields["roi"] = [tuple(region) for region in fields["roi"]]
+
+        return Video(
+            video_file=Path(self.video_file),
+            output_file=Path(self.output_file),
+            keep_frames=False,
+            **fields,
+        )
+
+
+class _LeaseLost(Exception):
+    """the lease of a task expired, so another worker may be running it"""
+
+
+class QueueWorker:
+    """Lease tasks of `VideoTask`s from a queue and run them until the queue is empty.
+
+    Args:
+        queue: queue to lease tasks from
+        name: name of the worker in leases, defaults to the host and process id
+        lease_seconds: seconds a lease lasts, heartbeats renew it three times as often
+        poll_interval: seconds to wait before leasing again while other workers hold
+            all tasks, whose leases may expire
+        cache: cache to reuse ocr results of identical frames from
+        queue_size: number of decoded frames buffered ahead of ocr
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        queue: Queue,
+        name: t.Optional[str] = None,
+        lease_seconds: float = DEFAULT_LEASE,
+        poll_interval: float = 1.0,
+        cache: t.Optional[OCRCache] = None,
+        queue_size: int = 8,
+    ):
+        if lease_seconds <= 0:
+            raise ValueError("lease_seconds must be positive")
+
+        self.queue = queue
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.cache = cache
+        self.queue_size = queue_size
+        # backends are set up once and reused for every task
+        self.engines: t.Dict[t.Tuple[str, str], OCRBackend] = {}
+
+    def run(self, max_tasks: t.Optional[int] = None) -> int:
+        """run tasks until none is pending or leased, returns the number of tasks done"""
+        done = 0
+        while max_tasks is None or done < max_tasks:
+            task = self.queue.lease(self.name, self.lease_seconds)
+            if task is None:
+                stats = self.queue.stats()
+                if not stats["pending"] and not stats["leased"]:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+
+            if self.run_task(task):
+                done += 1
+
+        logger.info(f"worker {self.name} finished {done} tasks.")
+        return done
+
+    def run_task(self, task: Task) -> bool:
+        """run task while renewing its lease, returns whether it was done"""
+        logger.info(f"running {task.key}, attempt {task.attempts}...")
+        lost = threading.Event()
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(task, lost, stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            self.process(VideoTask(**task.payload), task.attempts > 1, lost)
+        except _LeaseLost:
+            logger.warning(f"lost the lease of {task.key}, stopped running it.")
+            return False
+        except Exception as e:
+            logger.error(f"failed {task.key} on attempt {task.attempts}: {e}")
+            metrics.incr("tasks_failed")
+            self.queue.fail(task, f"{type(e).__name__}: {e}")
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if not self.queue.complete(task):
+            logger.warning(f"lost the lease of {task.key} before it was done.")
+            return False
+        metrics.incr("tasks_done")
+        return True
+
+    def _heartbeat(self, task: Task, lost: threading.Event, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                held = self.queue.heartbeat(task, self.lease_seconds)
+            except (OSError, ValueError) as e:
+                # e.g. the server restarted, the lease holds until it expires
+                logger.warning(f"failed to renew the lease of {task.key}: {e}")
+                continue
+            if not held:
+                lost.set()
+                return
+
+    def engine(self, backend: str, lang: str) -> OCRBackend:
+        if (backend, lang) not in self.engines:
+            self.engines[backend, lang] = get_backend(backend, languages=[lang])
+        return self.engines[backend, lang]
+
+    def close(self) -> None:
+        for engine in self.engines.values():
+            engine.close()
+        self.engines.clear()
+
+    def process(self, task: VideoTask, retry: bool, lost: threading.Event) -> None:
+        """run ocr on the video of task and write its output files, skipping those whose
+        inputs did not change, see `VideoStages`.
+
+        stops between batches of frames once the lease of the task is lost, so two
+        workers do not append to the same checkpoint for long.
+        """
+
+        def check_lease() -> None:
+            if lost.is_set():
+                raise _LeaseLost(task.output_file)
+
+        video = task.make_video()
+        engine = self.engine(video.backend, task.lang)
+        stages = VideoStages(video, engine, task.lang, force=task.force and not retry)
+        if stages.needs_ocr():
+            video.run_ocr(
+                task.lang,
+                queue_size=self.queue_size,
+                batch_size=task.batch_size,
+                cache=self.cache,
+                resume=task.resume or retry,
+                engine=engine,
+                before_batch=check_lease,
+            )
+            stages.ocr_done()
+        stages.write(parquet=task.parquet, tracks=task.tracks)
+
+
+def _run_worker(
+    location: str, cache_bytes: t.Optional[int], kwargs: t.Dict[str, t.Any]
+) -> int:
+    queue = open_queue(location)
+    cache = OCRCache(max_bytes=cache_bytes) if cache_bytes else None
+    worker = QueueWorker(queue, cache=cache, **kwargs)
+    try:
+        return worker.run()
+    finally:
+        worker.close()
+        if cache:
+            cache.log_stats()
+            cache.close()
+        queue.close()
+
+
+def run_workers(
+    location: str, workers: int = 1, cache_bytes: t.Optional[int] = None, **kwargs
+) -> int:
+    """run `QueueWorker`s on processes until the queue at location is empty.
+
+    Args:
+        location: url the queue is served at, or path of its database
+        workers: number of worker processes, e.g. one per cpu
+        cache_bytes: size cap of the ocr cache of each worker, None to not cache
+        kwargs: see `QueueWorker`
+
+    returns the number of tasks done.
+    """
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    if workers == 1:
+        return _run_worker(location, cache_bytes, kwargs)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(
+            pool.map(
+                _run_worker,
+                [location] * workers,
+                [cache_bytes] * workers,
+                [kwargs] * workers,
+            )
+        )